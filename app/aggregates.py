@@ -0,0 +1,181 @@
+# app/aggregates.py
+"""
+Cached totals for the parent/admin summaries.
+
+SharedAggregate keeps one row per child and day: count, total and unpaid
+total (in paise) of that child's shared transactions, hot or archived
+(archiving moves a row between tables and leaves its day's totals alone).
+The writes that change those numbers (sharing, marking paid) adjust the row
+inside their own transaction with an atomic upsert, so the cache is exact
+and shared by every app process.
+
+Parent and family totals are rollups of the child rows over the days in the
+period (joined to User for the parent/family link, so re-parenting a child
+needs no cache change). Only the partial days at the edges of a period are
+summed from raw transactions, read through unified_transactions().
+
+    python -m app.aggregates --check      # compare the cache with the raw rows
+    python -m app.aggregates --rebuild
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import delete, func, insert, case
+from sqlmodel import Session, select
+from app.db import engine, upsert_add
+from app.models import SharedAggregate, User
+
+
+# ----------------------------
+# Write side (call inside the writer's transaction, before commit)
+# ----------------------------
+def _apply(session, deltas):
+    """deltas: {(user_id, day): [count, paise, unpaid_paise]} added to the cached rows."""
+    deltas = {k: v for k, v in deltas.items() if any(v)}
+    if not deltas:
+        return
+    rows = [{"user_id": u, "day": d, "count": c, "paise": p, "unpaid_paise": up}
+            for (u, d), (c, p, up) in deltas.items()]
+    upsert_add(session, SharedAggregate, rows, keys=("user_id", "day"), add=("count", "paise", "unpaid_paise"))
+
+
+def _deltas(rows, sign, unpaid_only=False):
+    deltas = defaultdict(lambda: [0, 0, 0])
+    for user_id, dt, paise, paid in rows:
+        d = deltas[(user_id, dt.date())]
+        paise = paise or 0
+        if not unpaid_only:
+            d[0] += sign
+            d[1] += sign * paise
+        if not paid:
+            d[2] += sign * paise
+    return deltas
+
+
+def shared(session, txns):
+    """Transactions that just became shared."""
+    _apply(session, _deltas([(t.user_id, t.date, t.amount_paise, t.paid) for t in txns], +1))
+
+
+def paid(session, txns):
+    """Transactions that just went from unpaid to paid; only shared ones are in the cache."""
+    _apply(session, _deltas([(t.user_id, t.date, t.amount_paise, False) for t in txns if t.shared], -1,
+                            unpaid_only=True))
+
+
+# ----------------------------
+# Read side
+# ----------------------------
+def _full_days(start: datetime, end: datetime):
+    """First and last day wholly inside [start, end], or None."""
+    first = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last = end.date() if end.time() == time.max else end.date() - timedelta(days=1)
+    return (first, last) if first <= last else None
+
+
+def totals(session, start: datetime, end: datetime, parent_id: int | None = None, family_id: int | None = None):
+    """
+    Shared spending with Transaction.date between start and end (inclusive),
+    per child of `parent_id` and/or member of `family_id`:
+    {user_id: {"count", "paise", "unpaid_paise"}}.
+    """
+    start, end = start.replace(tzinfo=None), end.replace(tzinfo=None)  # transaction dates are naive
+
+    def scoped(q):
+        if parent_id is not None:
+            q = q.where(User.parent_id == parent_id)
+        if family_id is not None:
+            q = q.where(User.family_id == family_id)
+        return q
+
+    out = defaultdict(lambda: {"count": 0, "paise": 0, "unpaid_paise": 0})
+
+    def add(rows):
+        for user_id, count, paise, unpaid in rows:
+            node = out[user_id]
+            node["count"] += count or 0
+            node["paise"] += paise or 0
+            node["unpaid_paise"] += unpaid or 0
+
+    from app.archive import unified_transactions  # app.archive imports this module
+    txn = unified_transactions()
+    raw = select(
+        txn.c.user_id, func.count(), func.sum(txn.c.amount_paise),
+        func.sum(case((txn.c.paid == False, txn.c.amount_paise), else_=0)),
+    ).join(User, User.id == txn.c.user_id).where(txn.c.shared == True).group_by(txn.c.user_id)
+
+    days = _full_days(start, end)
+    if days is None:
+        add(session.exec(scoped(raw.where(txn.c.date.between(start, end)))).all())
+        return dict(out)
+
+    first, last = days
+    add(session.exec(scoped(
+        select(SharedAggregate.user_id, func.sum(SharedAggregate.count), func.sum(SharedAggregate.paise),
+               func.sum(SharedAggregate.unpaid_paise))
+        .join(User, User.id == SharedAggregate.user_id)
+        .where(SharedAggregate.day.between(first, last))
+        .group_by(SharedAggregate.user_id)
+    )).all())
+    # the partial days at either edge come from the transactions themselves
+    head_end = datetime.combine(first, time.min)
+    tail_start = datetime.combine(last + timedelta(days=1), time.min)
+    if start < head_end:
+        add(session.exec(scoped(raw.where(txn.c.date >= start, txn.c.date < head_end))).all())
+    if tail_start <= end:
+        add(session.exec(scoped(raw.where(txn.c.date >= tail_start, txn.c.date <= end))).all())
+    return dict(out)
+
+
+# ----------------------------
+# Maintenance
+# ----------------------------
+def _computed(session):
+    from app.archive import unified_transactions
+    txn = unified_transactions()
+    return session.exec(
+        select(txn.c.user_id, func.date(txn.c.date), func.count(), func.sum(txn.c.amount_paise),
+               func.sum(case((txn.c.paid == False, txn.c.amount_paise), else_=0)))
+        .where(txn.c.shared == True)
+        .group_by(txn.c.user_id, func.date(txn.c.date))
+    ).all()
+
+
+def rebuild():
+    """Recompute the whole cache from hot and archived rows in one transaction (migration 0008, repairs)."""
+    with Session(engine) as session:
+        session.execute(delete(SharedAggregate))
+        rows = [{"user_id": u, "day": d if not isinstance(d, str) else datetime.fromisoformat(d).date(),
+                 "count": c, "paise": p or 0, "unpaid_paise": up or 0}
+                for u, d, c, p, up in _computed(session)]
+        if rows:
+            session.execute(insert(SharedAggregate), rows)
+        session.commit()
+    return {"rows": len(rows)}
+
+
+def check():
+    """Cache rows that differ from the raw transactions, as {(user_id, day): (cached, actual)}."""
+    with Session(engine) as session:
+        actual = {(u, str(d)): (c, p or 0, up or 0) for u, d, c, p, up in _computed(session)}
+        cached = {(a.user_id, a.day.isoformat()): (a.count, a.paise, a.unpaid_paise)
+                  for a in session.exec(select(SharedAggregate)).all()}
+    zero = (0, 0, 0)
+    return {k: (cached.get(k, zero), actual.get(k, zero))
+            for k in set(actual) | set(cached) if cached.get(k, zero) != actual.get(k, zero)}
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Check or rebuild the cached summary aggregates")
+    p.add_argument("--rebuild", action="store_true")
+    args = p.parse_args(argv)
+    if args.rebuild:
+        print(rebuild())
+    diff = check()
+    print("Aggregates match the transactions" if not diff else f"{len(diff)} aggregate rows differ: {diff}")
+    return 1 if diff else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
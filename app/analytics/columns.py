@@ -0,0 +1,70 @@
+# app/analytics/columns.py
+"""
+Live column fetch for the aggregation engine.
+
+Selects only the columns a report needs as plain tuples (no ORM objects)
+and turns them into NumPy arrays shaped like a Snapshot, so
+app/analytics/engine.py can run the same group-bys on either source.
+Merchants are fetched as dictionary ids (small ints, not strings); only the
+distinct ids in the result are resolved to display names.
+"""
+
+import numpy as np
+from sqlalchemy import func
+from sqlmodel import Session, select
+from app.db import engine
+from app.merchants import names_for
+
+EPOCH_DAY = np.datetime64("1970-01-01", "D")
+
+
+class ColumnSet:
+    def __init__(self, cols, merchants, rows):
+        self.cols = cols
+        self.merchants = merchants
+        self.rows = rows
+
+    def __getitem__(self, name):
+        return self.cols[name]
+
+
+def _expressions(source):
+    return {
+        "id": source.c.id,
+        "user_id": source.c.user_id,
+        "date": source.c.date,
+        "day": func.date(source.c.date),
+        "paise": source.c.amount_paise,
+        "merchant": source.c.merchant_id,
+        "merchant_text": source.c.merchant,
+    }
+
+
+def _to_array(field, values, merchants):
+    if field == "day":
+        return (np.array(values, dtype="datetime64[D]") - EPOCH_DAY).astype(np.int32)
+    if field in ("id", "user_id", "paise"):
+        return np.fromiter((v or 0 for v in values), dtype=np.int64, count=len(values))
+    if field == "merchant":
+        index = {}
+        codes = np.fromiter((index.setdefault(m, len(index)) for m in values), dtype=np.int32,
+                            count=len(values))
+        names = names_for(index)
+        merchants.extend(names.get(mid) for mid in index)  # dict keeps first-seen order == code order
+        return codes
+    return list(values)  # "date"/"merchant_text": raw values, only used to build response rows
+
+
+def fetch(source, conditions, fields, order_by=None):
+    """Run one narrow SELECT over `source` (a table or unified view) and return a ColumnSet."""
+    exprs = _expressions(source)
+    q = select(*[exprs[f] for f in fields]).where(*conditions)
+    if order_by is not None:
+        q = q.order_by(order_by)
+    with Session(engine) as session:
+        rows = session.exec(q).all()
+
+    transposed = list(zip(*rows)) if rows else [()] * len(fields)
+    merchants = []
+    cols = {f: _to_array(f, list(values), merchants) for f, values in zip(fields, transposed)}
+    return ColumnSet(cols, merchants, len(rows))
@@ -0,0 +1,106 @@
+# app/analytics/engine.py
+"""
+Vectorized group-bys over transaction columns.
+
+Every function takes a column source `cols` (anything indexable by column
+name returning NumPy arrays: a Snapshot or a live ColumnSet) and a boolean
+row mask, and returns the same JSON shape as the SQL report it replaces.
+
+Amounts are int64 paise and every sum is exact. np.bincount adds through
+float64 weights, which is exact for integers while the running total stays
+below 2**53 paise; past that bound groups are summed in int64 with a stable
+sort and np.add.reduceat. Totals are converted to rupees only for the response.
+"""
+
+import numpy as np
+from app.money import rupees
+
+EPOCH_DAY = np.datetime64("1970-01-01", "D")
+
+
+def user_mask(cols, user_id):
+    return cols["user_id"] == user_id
+
+
+def all_rows(cols):
+    return np.ones(cols.rows, dtype=bool)
+
+
+def total(paise):
+    return rupees(np.asarray(paise, dtype=np.int64).sum()) if len(paise) else 0
+
+
+FLOAT_EXACT = 2 ** 53
+
+
+def _grouped(keys, paise):
+    """(unique keys ascending, exact int64 sum of paise per key)."""
+    if len(keys) == 0:
+        return keys[:0], np.zeros(0, dtype=np.int64)
+    if int(np.abs(paise).sum()) < FLOAT_EXACT:
+        uniq, inverse = np.unique(keys, return_inverse=True)
+        sums = np.bincount(inverse, weights=paise, minlength=len(uniq))
+        return uniq, sums.astype(np.int64)
+    order = np.argsort(keys, kind="stable")
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return keys[starts], np.add.reduceat(paise[order].astype(np.int64, copy=False), starts)
+
+
+def daily_totals(cols, mask):
+    days, totals = _grouped(cols["day"][mask], cols["paise"][mask])
+    dates = (EPOCH_DAY + days.astype("timedelta64[D]")).astype(str)
+    return [{"date": d, "total": rupees(t)} for d, t in zip(dates, totals)]
+
+
+def monthly_totals(cols, mask):
+    months = (EPOCH_DAY + cols["day"][mask].astype("timedelta64[D]")).astype("datetime64[M]")
+    uniq, totals = _grouped(months.astype(np.int64), cols["paise"][mask])
+    labels = uniq.astype("datetime64[M]").astype(str)
+    return [{"month": m, "total": rupees(t)} for m, t in zip(labels, totals)]
+
+
+def vendor_totals(cols, merchants, mask):
+    codes, totals = _grouped(cols["merchant"][mask], cols["paise"][mask])
+    rows = [{"merchant": merchants[c], "total": rupees(t)} for c, t in zip(codes, totals)]
+    # same order as SQL GROUP BY merchant: NULL first, then by name
+    rows.sort(key=lambda r: (r["merchant"] is not None, r["merchant"] or ""))
+    return rows
+
+
+def top_vendors(cols, merchants, mask, limit):
+    rows = vendor_totals(cols, merchants, mask)
+    rows.sort(key=lambda r: r["total"], reverse=True)
+    return rows[:limit]
+
+
+def merchant_categories(merchants, rules):
+    """
+    Category per merchant dictionary entry using the MerchantRule substring
+    match (first rule wins, else "Others"). Done once per distinct merchant
+    instead of once per transaction.
+    """
+    names = []
+    index = {}
+    codes = np.empty(len(merchants), dtype=np.int32)
+    for i, merchant in enumerate(merchants):
+        upper = (merchant or "").upper()
+        name = next((cat.name for rule, cat in rules if rule.pattern in upper), "Others")
+        if name not in index:
+            index[name] = len(names)
+            names.append(name)
+        codes[i] = index[name]
+    return codes, names
+
+
+def category_totals(cols, merchants, rules, mask):
+    cat_of_merchant, names = merchant_categories(merchants, rules)
+    cats = cat_of_merchant[cols["merchant"][mask]]
+    if len(cats) == 0:
+        return []
+    uniq, totals = _grouped(cats, cols["paise"][mask])
+    by_cat = dict(zip(uniq.tolist(), totals))
+    # report categories in the order they first occur, like the per-row loop did
+    _, first = np.unique(cats, return_index=True)
+    order = uniq[np.argsort(first)]
+    return [{"category": names[c], "total": rupees(by_cat[c])} for c in order]
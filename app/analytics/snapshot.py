@@ -0,0 +1,359 @@
+# app/analytics/snapshot.py
+"""
+Per-family columnar snapshots of transactions for the report endpoints.
+
+Each family gets a directory under GPAY_ANALYTICS_DIR (default ./analytics):
+
+    family_12/manifest.json      rows, last_id, generation, merchant/category dictionaries
+    family_12/gen_3/id.bin       int64   ┐
+                    user_id.bin  int64   │
+                    day.bin      int32   │ one raw little-endian array per column,
+                    paise.bin    int64   │ memory-mapped read-only by the report engine
+                    merchant.bin int32   │ (codes into the manifest dictionaries;
+                                         │  merchant codes map to Merchant ids)
+                    category.bin int16   │
+                    flags.bin    uint8   ┘ bit 0 paid, bit 1 shared
+
+Rows are kept in id order. A refresh appends rows with id > last_id (an O(new
+rows) file append) and rewrites the one-byte flags column. Paid/shared flags
+can only change in the hot table (archived rows are frozen), so they are
+re-read from the family's hot rows plus the archive partitions that took rows
+since the previous refresh -- not from the whole history. Deleting rows
+needs a rebuild into a new generation directory: deleters call
+mark_dirty(family_id, removed=True), and rows showing up below last_id (ids
+committed out of order) force one too. The manifest is replaced atomically
+last, so readers always see a consistent prefix.
+
+Reports never read a snapshot marked dirty (see mark_dirty); they fall back
+to SQL and a background refresh brings it up to date. Opt in with
+GPAY_ANALYTICS=1.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import union_all
+from sqlmodel import Session, select
+from app.db import engine
+from app.archive import archive_table, unified_transactions
+from app.merchants import names_for
+from app.models import ArchivePartition, Transaction
+
+ENABLED = os.environ.get("GPAY_ANALYTICS", "0") == "1"
+ROOT = os.environ.get("GPAY_ANALYTICS_DIR", "analytics")
+EPOCH = date(1970, 1, 1)
+FETCH_CHUNK = 20000
+LOCK_STALE_S = 600
+FLAGS_OVERLAP_S = 600  # partitions archived into this long before the last refresh are re-read
+MANIFEST_VERSION = 3  # 2: merchant codes keyed by Merchant id, 3: integer paise
+
+COLUMNS = {
+    "id": np.dtype("<i8"),
+    "user_id": np.dtype("<i8"),
+    "day": np.dtype("<i4"),
+    "paise": np.dtype("<i8"),
+    "merchant": np.dtype("<i4"),
+    "category": np.dtype("<i2"),
+    "flags": np.dtype("u1"),
+}
+FLAG_PAID = 1
+FLAG_SHARED = 2
+
+_locks = {}
+_open = {}  # family_id -> (manifest mtime, Snapshot)
+
+
+class Snapshot:
+    """Read-only, memory-mapped view of one family's columns."""
+
+    def __init__(self, path, manifest):
+        self.manifest = manifest
+        self.rows = manifest["rows"]
+        self.merchants = manifest["merchants"]
+        self.categories = manifest["categories"]
+        gen = os.path.join(path, f"gen_{manifest['generation']}")
+        self.cols = {}
+        for name, dtype in COLUMNS.items():
+            if self.rows:
+                self.cols[name] = np.memmap(os.path.join(gen, f"{name}.bin"), dtype=dtype, mode="r",
+                                            shape=(self.rows,))
+            else:
+                self.cols[name] = np.zeros(0, dtype=dtype)
+
+    def __getitem__(self, name):
+        return self.cols[name]
+
+
+# ----------------------------
+# Paths / markers
+# ----------------------------
+def family_dir(family_id: int) -> str:
+    return os.path.join(ROOT, f"family_{family_id}")
+
+
+def _manifest_path(family_id):
+    return os.path.join(family_dir(family_id), "manifest.json")
+
+
+def _read_manifest(family_id):
+    try:
+        with open(_manifest_path(family_id), encoding="utf8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(family_id, manifest):
+    path = _manifest_path(family_id)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, path)
+
+
+def mark_dirty(family_id: int | None, removed: bool = False):
+    """
+    Call after writes that add/remove rows; reports fall back to SQL until
+    refreshed. removed=True (rows deleted) makes the next refresh a rebuild.
+    """
+    if not ENABLED or family_id is None:
+        return
+    os.makedirs(family_dir(family_id), exist_ok=True)
+    if removed:
+        open(os.path.join(family_dir(family_id), "rebuild"), "w").close()
+    open(os.path.join(family_dir(family_id), "dirty"), "w").close()
+
+
+def is_dirty(family_id):
+    return os.path.exists(os.path.join(family_dir(family_id), "dirty"))
+
+
+class _FileLock:
+    """Cross-process lock via O_EXCL, portable to Windows dev boxes; stale locks are broken."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def acquire(self):
+        try:
+            self.fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(self.path) > LOCK_STALE_S:
+                    os.remove(self.path)
+                    return self.acquire()
+            except FileNotFoundError:
+                return self.acquire()
+            return False
+
+    def release(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            os.remove(self.path)
+            self.fd = None
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def snapshot_for(family_id: int | None):
+    """The family's snapshot, or None when analytics are off, missing or stale."""
+    if not ENABLED or family_id is None or is_dirty(family_id):
+        return None
+    try:
+        mtime = os.path.getmtime(_manifest_path(family_id))
+    except FileNotFoundError:
+        return None
+    cached = _open.get(family_id)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    manifest = _read_manifest(family_id)
+    if manifest is None or manifest.get("version") != MANIFEST_VERSION:
+        return None
+    snap = Snapshot(family_dir(family_id), manifest)
+    _open[family_id] = (mtime, snap)
+    return snap
+
+
+# ----------------------------
+# Building
+# ----------------------------
+def _day(dt):
+    d = dt.date() if isinstance(dt, datetime) else dt
+    return (d - EPOCH).days
+
+
+def _fetch(session, family_id, after_id):
+    txn = unified_transactions()
+    q = (
+        select(txn.c.id, txn.c.user_id, txn.c.date, txn.c.amount_paise, txn.c.merchant_id, txn.c.category,
+               txn.c.paid, txn.c.shared)
+        .where(txn.c.family_id == family_id, txn.c.id > after_id)
+        .order_by(txn.c.id)
+    )
+    return session.exec(q).yield_per(FETCH_CHUNK).partitions()
+
+
+def _encode(rows, manifest, lookups):
+    merchant_ids, categories = manifest["merchant_ids"], manifest["categories"]
+    known = len(merchant_ids)
+    m_index, c_index = lookups
+
+    def code(value, index, values):
+        c = index.get(value)
+        if c is None:
+            c = index[value] = len(values)
+            values.append(value)
+        return c
+
+    n = len(rows)
+    out = {name: np.empty(n, dtype=dtype) for name, dtype in COLUMNS.items()}
+    for i, r in enumerate(rows):
+        out["id"][i] = r[0]
+        out["user_id"][i] = r[1]
+        out["day"][i] = _day(r[2])
+        out["paise"][i] = r[3] or 0
+        out["merchant"][i] = code(r[4], m_index, merchant_ids)
+        out["category"][i] = code(r[5], c_index, categories)
+        out["flags"][i] = (FLAG_PAID if r[6] else 0) | (FLAG_SHARED if r[7] else 0)
+    names = names_for(merchant_ids[known:])
+    manifest["merchants"].extend(names.get(mid) for mid in merchant_ids[known:])
+    return out
+
+
+def _append(gen_dir, session, family_id, manifest):
+    lookups = ({m: i for i, m in enumerate(manifest["merchant_ids"])},
+               {c: i for i, c in enumerate(manifest["categories"])})
+    files = {}
+    for name, dtype in COLUMNS.items():
+        path = os.path.join(gen_dir, f"{name}.bin")
+        f = files[name] = open(path, "ab")
+        # drop bytes a crashed refresh wrote past the last published manifest
+        f.truncate(manifest["rows"] * dtype.itemsize)
+    added = 0
+    try:
+        for chunk in _fetch(session, family_id, manifest["last_id"]):
+            cols = _encode(chunk, manifest, lookups)
+            for name, arr in cols.items():
+                files[name].write(arr.tobytes())
+            added += len(chunk)
+            manifest["last_id"] = int(cols["id"][-1])
+    finally:
+        for f in files.values():
+            f.close()
+    manifest["rows"] += added
+    return added
+
+
+def _current_flags(session, family_id, last_id, since):
+    """(id, flags) of the rows whose flags may have changed since `since` (naive UTC; None: all)."""
+    hot = Transaction.__table__
+    q = select(ArchivePartition.month)
+    if since is not None:
+        q = q.where(ArchivePartition.updated_at >= since)
+    tables = [hot, *(archive_table(m) for m in session.exec(q).all())]
+    parts = [select(t.c.id, t.c.paid, t.c.shared).where(t.c.family_id == family_id, t.c.id <= last_id)
+             for t in tables]
+    txn = union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+    rows = session.exec(select(txn.c.id, txn.c.paid, txn.c.shared).order_by(txn.c.id)).all()
+    ids = np.fromiter((r[0] for r in rows), dtype=COLUMNS["id"], count=len(rows))
+    flags = np.fromiter(((FLAG_PAID if r[1] else 0) | (FLAG_SHARED if r[2] else 0) for r in rows),
+                        dtype=COLUMNS["flags"], count=len(rows))
+    return ids, flags
+
+
+def _rebuild(family_id, session, old_manifest):
+    generation = (old_manifest["generation"] + 1) if old_manifest else 1
+    gen_dir = os.path.join(family_dir(family_id), f"gen_{generation}")
+    shutil.rmtree(gen_dir, ignore_errors=True)
+    os.makedirs(gen_dir)
+    manifest = {"version": MANIFEST_VERSION, "family_id": family_id, "generation": generation, "rows": 0,
+                "last_id": 0, "merchant_ids": [], "merchants": [], "categories": []}
+    _append(gen_dir, session, family_id, manifest)
+    return manifest
+
+
+def refresh_family(family_id: int, full: bool = False):
+    """Bring a family's snapshot up to date. Safe to call from any worker/thread."""
+    if not ENABLED or family_id is None:
+        return None
+    os.makedirs(family_dir(family_id), exist_ok=True)
+    thread_lock = _locks.setdefault(family_id, threading.Lock())
+    file_lock = _FileLock(os.path.join(family_dir(family_id), "refresh.lock"))
+    with thread_lock:
+        if not file_lock.acquire():
+            return None  # another worker is refreshing it right now
+        try:
+            return _refresh_locked(family_id, full)
+        finally:
+            file_lock.release()
+
+
+def _refresh_locked(family_id, full):
+    t0 = time.perf_counter()
+    started = datetime.utcnow()
+    for marker in ("dirty", "rebuild"):
+        path = os.path.join(family_dir(family_id), marker)
+        if os.path.exists(path):
+            os.remove(path)  # writes landing during the refresh will set it again
+            full = full or marker == "rebuild"
+
+    manifest = _read_manifest(family_id)
+    with Session(engine) as session:
+        mode = "append"
+        if full or manifest is None or manifest.get("version") != MANIFEST_VERSION:
+            mode = "rebuild"
+            manifest = _rebuild(family_id, session, manifest)
+        else:
+            gen_dir = os.path.join(family_dir(family_id), f"gen_{manifest['generation']}")
+            _append(gen_dir, session, family_id, manifest)
+            since = manifest.get("flags_at")
+            since = datetime.fromisoformat(since) - timedelta(seconds=FLAGS_OVERLAP_S) if since else None
+            ids, changed = _current_flags(session, family_id, manifest["last_id"], since)
+            snap_ids = np.memmap(os.path.join(gen_dir, "id.bin"), dtype=COLUMNS["id"], mode="r",
+                                 shape=(manifest["rows"],)) if manifest["rows"] else np.zeros(0, COLUMNS["id"])
+            pos = np.searchsorted(snap_ids, ids)
+            if (pos >= len(snap_ids)).any() or not np.array_equal(snap_ids[pos], ids):
+                mode = "rebuild"  # rows committed below last_id after it was read
+                del snap_ids
+                manifest = _rebuild(family_id, session, manifest)
+            else:
+                del snap_ids
+                flags = np.fromfile(os.path.join(gen_dir, "flags.bin"), dtype=COLUMNS["flags"],
+                                    count=manifest["rows"])
+                flags[pos] = changed
+                tmp = os.path.join(gen_dir, "flags.bin.tmp")
+                flags.tofile(tmp)
+                os.replace(tmp, os.path.join(gen_dir, "flags.bin"))
+
+    manifest["flags_at"] = started.isoformat()
+    manifest["built_at"] = datetime.utcnow().isoformat()
+    _write_manifest(family_id, manifest)
+    _drop_old_generations(family_id, manifest["generation"])
+    return {"family_id": family_id, "mode": mode, "rows": manifest["rows"],
+            "ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def _drop_old_generations(family_id, keep):
+    for name in os.listdir(family_dir(family_id)):
+        if name.startswith("gen_") and name != f"gen_{keep}":
+            shutil.rmtree(os.path.join(family_dir(family_id), name), ignore_errors=True)
+
+
+def refresh_dirty():
+    """Scheduled job: refresh every snapshot that has been marked dirty."""
+    if not ENABLED or not os.path.isdir(ROOT):
+        return []
+    done = []
+    for name in os.listdir(ROOT):
+        if name.startswith("family_"):
+            family_id = int(name.split("_", 1)[1])
+            if is_dirty(family_id):
+                done.append(refresh_family(family_id))
+    return done
@@ -4,18 +4,28 @@ from app.auth import get_current_user
 from app.db import get_session
 from app.models import User,  DeletionRequest, Family
 from app.utils.permissions import require_superadmin
+from app import deletions
 
 router = APIRouter()
 
 @router.post("/admin/request_delete")
 def request_delete(entity_type: str, entity_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     require_superadmin(current_user)
+    if entity_type not in deletions.ENTITY_TYPES:
+        raise HTTPException(status_code=400, detail="entity_type must be user or family")
+    target = session.get(User if entity_type == "user" else Family, entity_id)
+    if target is None:
+        raise HTTPException(status_code=404, detail=f"{entity_type.capitalize()} not found")
+    if (entity_type == "user" and entity_id == current_user.id) or \
+            (entity_type == "family" and entity_id == current_user.family_id):
+        raise HTTPException(status_code=400, detail="Cannot request deletion of your own account or family")
     # Check not already pending
     pending = session.exec(
         select(DeletionRequest).where(
             DeletionRequest.entity_type == entity_type,
             DeletionRequest.entity_id == entity_id,
-            DeletionRequest.executed == False
+            DeletionRequest.executed == False,
+            DeletionRequest.status != "failed"
         )
     ).first()
     if pending:
@@ -23,28 +33,38 @@ def request_delete(entity_type: str, entity_id: int, current_user: User = Depend
     req = DeletionRequest(entity_type=entity_type, entity_id=entity_id, requested_by_id=current_user.id)
     session.add(req)
     session.commit()
-    return {"message": "Deletion request submitted"}
+    return {"message": "Deletion request submitted", "request_id": req.id}
 
 
 @router.post("/admin/approve_delete/{request_id}")
-def approve_delete(request_id: int, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
+def approve_delete(request_id: int, background_tasks: BackgroundTasks, current_user: User = Depends(get_current_user),
+                   session: Session = Depends(get_session)):
     require_superadmin(current_user)
     req = session.get(DeletionRequest, request_id)
     if not req or req.executed:
         raise HTTPException(status_code=404)
+    if req.status != "pending":
+        raise HTTPException(status_code=400, detail=f"Deletion already {req.status}")
     if current_user.role != "superadmin" or current_user.id == req.requested_by_id or current_user.id in req.approval_ids:
         raise HTTPException(status_code=403)
-    req.approval_ids.append(current_user.id)
+    req.approval_ids = [*req.approval_ids, current_user.id]  # reassign: in-place changes to a JSON column are not saved
     session.add(req)
-    # If 2 approvals (not including requester), execute delete
+    # If 2 approvals (not including requester), hand the delete to the background executor
     if len(req.approval_ids) >= 2:
-        # Delete entity based on type (user/family)
-        if req.entity_type == "user":
-            user = session.get(User, req.entity_id)
-            if user: session.delete(user)
-        elif req.entity_type == "family":
-            family = session.get(Family, req.entity_id)
-            if family: session.delete(family)
-        req.executed = True
+        deletions.approve(session, req)
+        background_tasks.add_task(deletions.run_pending)
     session.commit()
-    return {"message": "Approval registered, deletion occurred" if req.executed else "Approval registered"}
+    queued = req.status == "approved"
+    return {"message": "Approval registered, deletion queued" if queued else "Approval registered",
+            "request_id": req.id, "status": req.status}
+
+
+@router.get("/admin/deletions/{request_id}")
+def deletion_status(request_id: int, current_user: User = Depends(get_current_user),
+                    session: Session = Depends(get_session)):
+    """Status and rows deleted so far (per table) of a deletion request"""
+    require_superadmin(current_user)
+    req = session.get(DeletionRequest, request_id)
+    if not req:
+        raise HTTPException(status_code=404)
+    return deletions.describe(req)
@@ -5,6 +5,11 @@ def require_admin(request: Request):
     if not data or data.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Not admin")
 
+def require_superadmin(request: Request):
+    data = request.state.user_data
+    if not data or data.get("role") != "superadmin":
+        raise HTTPException(status_code=403, detail="Superadmin privilege required")
+
 def require_parent_or_spouse(request):
     user = request.state.user_data
     if not user:
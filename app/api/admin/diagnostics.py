@@ -0,0 +1,49 @@
+# app/api/admin/diagnostics.py
+from fastapi import APIRouter, Request
+from app import diagnostics, scheduler
+from app.api.admin.common import require_superadmin
+
+router = APIRouter()
+
+
+# -------------------------------
+# DIAGNOSTICS STATUS
+# -------------------------------
+@router.get("/diagnostics")
+def get_diagnostics(request: Request):
+    require_superadmin(request)
+    return diagnostics.status()
+
+
+# -------------------------------
+# TOGGLE DIAGNOSTICS AT RUNTIME
+# -------------------------------
+@router.post("/diagnostics")
+async def set_diagnostics(request: Request, payload: dict):
+    """Turn stall detection / profiling on or off without a redeploy (process-wide, so superadmin only)."""
+    require_superadmin(request)
+    return diagnostics.configure(
+        enabled=payload.get("enabled"),
+        lag_ms=payload.get("lag_ms"),
+        profile_routes=payload.get("profile_routes"),
+        profile_header=payload.get("profile_header"),
+        profile_interval_ms=payload.get("profile_interval_ms"),
+    )
+
+
+# -------------------------------
+# STARTUP TIMINGS
+# -------------------------------
+@router.get("/diagnostics/startup")
+def get_startup_report(request: Request):
+    require_superadmin(request)
+    return getattr(request.app.state, "startup_report", [])
+
+
+# -------------------------------
+# BACKGROUND JOBS
+# -------------------------------
+@router.get("/diagnostics/jobs")
+def get_jobs(request: Request):
+    require_superadmin(request)
+    return scheduler.status()
@@ -4,6 +4,8 @@ from sqlmodel import Session, select
 from sqlalchemy import func
 from app.db import engine
 from app.models import Transaction, User
+from app.archive import unified_transactions
+from app.analytics import engine as analytics, columns
 from app.api.admin.common import require_admin
 
 router = APIRouter()
@@ -14,9 +16,10 @@ router = APIRouter()
 @router.get("/system")
 def admin_system(request: Request):
     require_admin(request)
+    txn = unified_transactions()
     with Session(engine) as session:
         total_users = session.exec(select(func.count(User.id))).one()
-        total_txn = session.exec(select(func.count(Transaction.id))).one()
+        total_txn = session.exec(select(func.count(txn.c.id))).one()
         total_unpaid = session.exec(select(func.count(Transaction.id)).where(Transaction.paid == False)).one()
 
     return {
@@ -32,15 +35,9 @@ def admin_system(request: Request):
 @router.get("/merchants")
 def admin_merchants(request: Request):
     require_admin(request)
-    with Session(engine) as session:
-        q = (
-            select(Transaction.merchant, func.sum(Transaction.amount))
-            .group_by(Transaction.merchant)
-            .order_by(func.sum(Transaction.amount).desc())
-            .limit(20)
-        )
-        rows = session.exec(q).all()
-    return [{"merchant": r[0], "total": r[1]} for r in rows]
+    txn = unified_transactions()
+    cols = columns.fetch(txn, [], ("paise", "merchant"), order_by=txn.c.id)
+    return analytics.top_vendors(cols, cols.merchants, analytics.all_rows(cols), 20)
 
 
 # -------------------------------
@@ -49,18 +46,9 @@ def admin_merchants(request: Request):
 @router.get("/daily")
 def admin_daily(request: Request):
     require_admin(request)
-    with Session(engine) as session:
-        q = (
-            select(
-                func.strftime("%Y-%m-%d", Transaction.date).label("day"),
-                func.sum(Transaction.amount)
-            )
-            .group_by("day")
-            .order_by("day")
-        )
-        rows = session.exec(q).all()
-
-    return [{"date": r[0], "total": r[1]} for r in rows]
+    txn = unified_transactions()
+    cols = columns.fetch(txn, [], ("day", "paise"), order_by=txn.c.id)
+    return analytics.daily_totals(cols, analytics.all_rows(cols))
 
 
 # -------------------------------
@@ -69,15 +57,6 @@ def admin_daily(request: Request):
 @router.get("/monthly")
 def admin_monthly(request: Request):
     require_admin(request)
-    with Session(engine) as session:
-        q = (
-            select(
-                func.strftime("%Y-%m", Transaction.date).label("month"),
-                func.sum(Transaction.amount)
-            )
-            .group_by("month")
-            .order_by("month")
-        )
-        rows = session.exec(q).all()
-
-    return [{"month": r[0], "total": r[1]} for r in rows]
+    txn = unified_transactions()
+    cols = columns.fetch(txn, [], ("day", "paise"), order_by=txn.c.id)
+    return analytics.monthly_totals(cols, analytics.all_rows(cols))
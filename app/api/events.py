@@ -0,0 +1,49 @@
+# app/api/events.py
+
+import asyncio
+import os
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+from app.auth import get_current_user
+from app import events
+
+HEARTBEAT_S = float(os.environ.get("GPAY_SSE_HEARTBEAT_S", "15"))
+# streams end after this long and the browser reconnects (with Last-Event-ID, so nothing is lost);
+# this also bounds how long a graceful shutdown waits for open streams
+MAX_STREAM_S = float(os.environ.get("GPAY_SSE_MAX_S", "300"))
+
+router = APIRouter()
+
+
+@router.get("/events")
+async def event_stream(request: Request):
+    """Server-Sent Events for the current user and their family (see app/events.py)"""
+    user = get_current_user(request)
+    channels = [events.user_channel(user.id)]
+    if user.family_id is not None:
+        channels.append(events.family_channel(user.family_id))
+    last_id = request.headers.get("Last-Event-ID")
+    sub = events.broker().subscribe(channels, int(last_id) if last_id and last_id.isdigit() else None)
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + MAX_STREAM_S
+        try:
+            yield f"retry: 5000\nevent: ready\ndata: {{\"channels\": {len(channels)}}}\n\n"
+            while loop.time() < deadline:
+                try:
+                    item = await sub.get(min(HEARTBEAT_S, max(deadline - loop.time(), 0.01)))
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
+                    continue
+                yield events.format_sse(item)
+                if sub.overflowed:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+        finally:
+            events.broker().unsubscribe(sub)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
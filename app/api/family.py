@@ -6,8 +6,10 @@ from sqlmodel import select, Session  # CORRECT: use sqlmodel.Session, not reque
 
 from app.auth import get_current_user, generate_token, send_verification_email
 from app.db import get_session
-from app.utils.email import get_family_smtp
-from app.models import User, Transaction, TxnShareRequest, Family, Category
+from app.utils.email import get_family_smtp, send_verification_batch
+from starlette.concurrency import run_in_threadpool
+from app.models import User, Transaction, Family, Category
+from app import family_sync, provisioning
 
 from app.utils.permissions import (
     require_superadmin,
@@ -34,25 +36,17 @@ def get_family_transactions(
         )
     ).all()
     return txns
-@router.post("/transactions/share")
-def share_transactions(
-    req: TxnShareRequest,
+
+@router.get("/transactions/family/sync")
+def sync_family_transactions(
+    since: int = 0,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
 ):
-    txns = session.exec(
-        select(Transaction).where(
-            Transaction.user_id == current_user.id,
-            Transaction.id.in_(req.txn_ids),
-            Transaction.shared == False,
-            Transaction.marked_for_deletion == False
-        )
-    ).all()
-    for txn in txns:
-        txn.shared = True
-        session.add(txn)
-    session.commit()
-    return {"shared": [txn.id for txn in txns]}
+    """Shared-feed changes after the `since` watermark; pass the returned `seq` next time"""
+    require_parent_or_spouse(current_user)
+    if current_user.family_id is None:
+        raise HTTPException(400, "You do not belong to a family")
+    return family_sync.changes(current_user.family_id, since)
 
 @router.post('/family/invite')
 def invite_family(
@@ -129,6 +123,20 @@ def invite_family(
         "expires": (datetime.utcnow() + timedelta(days=7)).isoformat()
     }
 
+@router.post('/family/invite/bulk')
+async def invite_family_bulk(request: Request, background_tasks: BackgroundTasks):
+    """/family/invite for a CSV or JSON list of members (email, role); one result per row"""
+    inviter = get_current_user(request)
+    require_parent_or_spouse(inviter)
+    require_verified(inviter)
+    if inviter.family_id is None:
+        raise HTTPException(400, "Create a family first")
+    rows = provisioning.parse_members(await request.body(), request.headers.get("content-type", ""))
+    results, invites = await run_in_threadpool(provisioning.provision, rows, provisioning.family_placement(inviter))
+    if invites:
+        background_tasks.add_task(send_verification_batch, invites, get_family_smtp(inviter.family_id))
+    return provisioning.summarize(results)
+
 @router.post("/family/create")
 def create_family(
     request: Request,
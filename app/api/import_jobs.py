@@ -0,0 +1,24 @@
+# app/api/import_jobs.py
+
+from fastapi import APIRouter, Request, HTTPException
+from app.auth import get_current_user
+from app import jobs
+
+router = APIRouter()
+
+
+@router.get("/import-jobs")
+def list_import_jobs(request: Request, limit: int = 20):
+    """The current user's most recent imports"""
+    user = get_current_user(request)
+    return jobs.recent(user, min(max(limit, 1), 100))
+
+
+@router.get("/import-jobs/{job_id}")
+def get_import_job(request: Request, job_id: str):
+    """Progress of one import: rows parsed, imported, duplicates"""
+    user = get_current_user(request)
+    job = jobs.get(user, job_id)
+    if job is None:
+        raise HTTPException(404, "Import job not found")
+    return job
@@ -2,14 +2,24 @@
 
 from fastapi import APIRouter, Request
 from sqlmodel import Session, select
-from sqlalchemy import func
 from app.db import engine
 from app.auth import get_current_user
-from app.models import Transaction, MerchantRule, Category
+from app.models import MerchantRule, Category
+from app.archive import unified_transactions
+from app.analytics import engine as analytics, snapshot, columns
 
 router = APIRouter()
 
 
+def user_columns(user, fields=("user_id", "day", "paise", "merchant")):
+    """Family snapshot when it is fresh, else the user's columns straight from SQL."""
+    snap = snapshot.snapshot_for(user.family_id)
+    if snap is not None:
+        return snap
+    txn = unified_transactions()
+    return columns.fetch(txn, [txn.c.user_id == user.id], fields, order_by=txn.c.id)
+
+
 # -------------------------------
 # DAILY REPORT
 # -------------------------------
@@ -17,20 +27,8 @@ router = APIRouter()
 def daily_report(request: Request):
     """User's total spending per day"""
     user = get_current_user(request)
-
-    with Session(engine) as session:
-        q = (
-            select(
-                func.strftime("%Y-%m-%d", Transaction.date).label("day"),
-                func.sum(Transaction.amount)
-            )
-            .where(Transaction.user_id == user.id)
-            .group_by("day")
-            .order_by("day")
-        )
-        rows = session.exec(q).all()
-
-    return [{"date": r[0], "total": r[1]} for r in rows]
+    cols = user_columns(user, ("user_id", "day", "paise"))
+    return analytics.daily_totals(cols, analytics.user_mask(cols, user.id))
 
 
 # -------------------------------
@@ -40,20 +38,8 @@ def daily_report(request: Request):
 def monthly_report(request: Request):
     """User's total spending per month"""
     user = get_current_user(request)
-
-    with Session(engine) as session:
-        q = (
-            select(
-                func.strftime("%Y-%m", Transaction.date).label("month"),
-                func.sum(Transaction.amount)
-            )
-            .where(Transaction.user_id == user.id)
-            .group_by("month")
-            .order_by("month")
-        )
-        rows = session.exec(q).all()
-
-    return [{"month": r[0], "total": r[1]} for r in rows]
+    cols = user_columns(user, ("user_id", "day", "paise"))
+    return analytics.monthly_totals(cols, analytics.user_mask(cols, user.id))
 
 
 # -------------------------------
@@ -63,30 +49,12 @@ def monthly_report(request: Request):
 def category_report(request: Request):
     """Category totals based on merchant rules"""
     user = get_current_user(request)
+    cols = user_columns(user, ("user_id", "paise", "merchant"))
 
     with Session(engine) as session:
-        txns = session.exec(
-            select(Transaction).where(Transaction.user_id == user.id)
-        ).all()
-
         rules = session.exec(select(MerchantRule, Category).join(Category)).all()
 
-    totals = {}
-
-    for t in txns:
-        merchant = (t.merchant or "").upper()
-        matched = False
-
-        for rule, cat in rules:
-            if rule.pattern in merchant:
-                totals[cat.name] = totals.get(cat.name, 0) + t.amount
-                matched = True
-                break
-
-        if not matched:
-            totals["Others"] = totals.get("Others", 0) + t.amount
-
-    return [{"category": k, "total": v} for k, v in totals.items()]
+    return analytics.category_totals(cols, cols.merchants, rules, analytics.user_mask(cols, user.id))
 
 
 # -------------------------------
@@ -96,13 +64,5 @@ def category_report(request: Request):
 def vendor_report(request: Request):
     """Total per vendor/merchant"""
     user = get_current_user(request)
-
-    with Session(engine) as session:
-        q = (
-            select(Transaction.merchant, func.sum(Transaction.amount))
-            .where(Transaction.user_id == user.id)
-            .group_by(Transaction.merchant)
-        )
-        rows = session.exec(q).all()
-
-    return [{"merchant": r[0], "total": r[1]} for r in rows]
+    cols = user_columns(user, ("user_id", "paise", "merchant"))
+    return analytics.vendor_totals(cols, cols.merchants, analytics.user_mask(cols, user.id))
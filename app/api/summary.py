@@ -2,11 +2,14 @@
 
 from fastapi import APIRouter, Request, Depends, HTTPException
 from datetime import datetime, timedelta
-from sqlmodel import Session, select
+from sqlmodel import Session
 from sqlalchemy import func
 from app.db import engine, get_session
 from app.auth import get_current_user
-from app.models import Transaction, Payment, User
+from app.models import Transaction, User
+from app.analytics import engine as analytics, columns
+from app.money import rupees
+from app import aggregates, ledger, settlement
 
 router = APIRouter()
 
@@ -17,22 +20,23 @@ def summary(request: Request, days: int = 7):
     end = datetime.utcnow().date()
     start = end - timedelta(days=days)
 
-    with Session(engine) as session:
-        q = (
-            select(Transaction)
-            .where(
-                Transaction.user_id == user.id,
-                Transaction.paid == False,
-                func.date(Transaction.date) >= start,
-                func.date(Transaction.date) <= end
-            )
-        )
-        rows = session.exec(q).all()
-
-    total = sum(t.amount for t in rows)
+    # hot table only: archived rows are paid by definition
+    txn = Transaction.__table__
+    cols = columns.fetch(
+        txn,
+        [
+            txn.c.user_id == user.id,
+            txn.c.paid == False,
+            func.date(txn.c.date) >= start,
+            func.date(txn.c.date) <= end
+        ],
+        ("id", "date", "paise", "merchant_text"),
+    )
+
+    total = analytics.total(cols["paise"])
     items = [
-        {"id": t.id, "date": t.date.isoformat(), "amount": t.amount, "merchant": t.merchant}
-        for t in rows
+        {"id": int(i), "date": d.isoformat(), "amount": rupees(p), "merchant": m}
+        for i, d, p, m in zip(cols["id"], cols["date"], cols["paise"], cols["merchant_text"])
     ]
 
     return {"unpaid": items, "total": total, "upi": "friend@upi", "name": "Friend"}
@@ -44,16 +48,17 @@ def mark_paid(request: Request, payload: dict):
     txn_ids = payload.get("txnIds", [])
 
     with Session(engine) as session:
-        updated = 0
+        changed = []
         for tid in txn_ids:
             t = session.get(Transaction, tid)
             if t and not t.paid:
                 t.paid = True
                 session.add(t)
-                updated += 1
+                changed.append(t)
+        ledger.paid(session, changed)
         session.commit()
 
-    return {"marked": updated}
+    return {"marked": len(changed)}
 
 @router.get("/admin/summary")
 def get_summary(
@@ -64,14 +69,49 @@ def get_summary(
 ):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
-    total = session.exec(
-        select(func.sum(Transaction.amount))
-        .join(User)
-        .where(
-            User.parent_id == current_user.id,
-            Transaction.shared == True,
-            Transaction.date.between(start_date, end_date)
-        )
-        .where(User.parent_id == current_user.id, User.family_id == current_user.family_id)
-    ).one_or_none()
-    return {"total": float(total[0]) if total and total[0] else 0}
+    # rollup of the cached per-child, per-day nodes (app/aggregates.py)
+    children = aggregates.totals(session, start_date, end_date,
+                                 parent_id=current_user.id, family_id=current_user.family_id)
+    return {
+        "total": rupees(sum(c["paise"] for c in children.values())),
+        "unpaid": rupees(sum(c["unpaid_paise"] for c in children.values())),
+        "children": [
+            {"user_id": uid, "count": c["count"], "total": rupees(c["paise"]), "unpaid": rupees(c["unpaid_paise"])}
+            for uid, c in sorted(children.items())
+        ],
+    }
+
+
+def _week_json(w, users):
+    totals = {c: sum(u[c] for u in users.values()) for c in settlement.TOTALS}
+    return {
+        "week": w["week"],
+        "start": w["start"].isoformat(),
+        "closed": w["closed"],
+        "count": totals["count"],
+        "total": rupees(totals["paise"]),
+        "shared": rupees(totals["shared_paise"]),
+        "unpaid": rupees(totals["unpaid_paise"]),
+    }
+
+@router.get("/statements")
+def weekly_statements(weeks: int = 8, current_user: User = Depends(get_current_user),
+                      session: Session = Depends(get_session)):
+    # closed weeks are frozen statements; only the open week is summed live (app/settlement.py)
+    weeks = min(max(weeks, 1), 104)
+    return [_week_json(w, w["users"]) for w in settlement.statements(session, weeks, user_id=current_user.id)]
+
+@router.get("/admin/statements")
+def family_statements(weeks: int = 8, current_user: User = Depends(get_current_user),
+                      session: Session = Depends(get_session)):
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    weeks = min(max(weeks, 1), 104)
+    result = []
+    for w in settlement.statements(session, weeks, family_id=current_user.family_id):
+        week = _week_json(w, w["users"])
+        week["members"] = [{"user_id": uid, **{k: v for k, v in _week_json(w, {uid: u}).items()
+                                              if k in ("count", "total", "shared", "unpaid")}}
+                           for uid, u in sorted(w["users"].items())]
+        result.append(week)
+    return result
@@ -6,8 +6,12 @@ from fastapi import APIRouter, Request, Depends, HTTPException
 from sqlalchemy.sql.functions import current_user
 from sqlmodel import Session, select
 from app.db import engine, get_session
-from app.models import Transaction, User, Payment
+from app.models import Transaction, User
 from app.auth import get_current_user
+from app.archive import unified_transactions
+from app.analytics import snapshot
+from app.money import to_paise, rupees
+from app import family_sync, events, aggregates, ledger, settlement
 
 router = APIRouter()
 
@@ -15,15 +19,19 @@ router = APIRouter()
 def list_transactions(request: Request, start: str = None, end: str = None):
     user = get_current_user(request)
 
+    # history: hot rows plus archived months
+    txn = unified_transactions()
     with Session(engine) as session:
-        q = select(Transaction).where(Transaction.user_id == user.id)
+        q = select(
+            txn.c.id, txn.c.date, txn.c.amount, txn.c.merchant, txn.c.category, txn.c.paid
+        ).where(txn.c.user_id == user.id)
 
         if start:
-            q = q.where(func.date(Transaction.date) >= datetime.fromisoformat(start).date())
+            q = q.where(func.date(txn.c.date) >= datetime.fromisoformat(start).date())
         if end:
-            q = q.where(func.date(Transaction.date) <= datetime.fromisoformat(end).date())
+            q = q.where(func.date(txn.c.date) <= datetime.fromisoformat(end).date())
 
-        rows = session.exec(q.order_by(Transaction.date.desc())).all()
+        rows = session.exec(q.order_by(txn.c.date.desc())).all()
 
     return [
         {
@@ -44,15 +52,17 @@ def archive_transactions(request: Request, payload: dict):
     ids = payload.get("ids", [])
 
     with Session(engine) as session:
-        updated = 0
+        changed = []
         for tid in ids:
             t = session.get(Transaction, tid)
-            if t and t.user_id == user.id:
+            if t and t.user_id == user.id and not t.paid:
                 t.paid = True
                 session.add(t)
-                updated += 1
+                changed.append(t)
 
+        ledger.paid(session, changed)
         session.commit()
+        updated = len(changed)
 
     return {"archived": updated}
 
@@ -103,7 +113,9 @@ def delete_transaction(txn_id: int, current_user: User = Depends(get_current_use
     if txn.shared:
         raise HTTPException(status_code=400, detail="Cannot delete shared transactions")
     session.delete(txn)
+    settlement.removed(session, [txn])  # unshared rows are in no family feed or shared aggregate
     session.commit()
+    snapshot.mark_dirty(txn.family_id, removed=True)
     return {"message": "Deleted successfully"}
 
 @router.post("/transactions/share")
@@ -122,6 +134,10 @@ def share_transactions(payload: dict, current_user: User = Depends(get_current_u
     for txn in txns:
         txn.shared = True
         session.add(txn)
+    family_sync.touch_many(session, txns)
+    aggregates.shared(session, txns)
+    if txns:
+        events.on_commit(session, events.user_channel(current_user.id), "transactions", {"shared": [t.id for t in txns]})
     session.commit()
     return {"message": f"Shared {len(txns)} transactions to parent"}
 
@@ -157,10 +173,10 @@ def admin_mark_paid(payload: dict, current_user: User = Depends(get_current_user
         raise HTTPException(status_code=403, detail="Not authorized")
 
     txn_ids = payload.get("txnIds", [])
-    updated = 0
+    changed = []
     for tid in txn_ids:
         txn = session.get(Transaction, tid)
-        if not txn:
+        if not txn or txn.paid:
             continue
         # verify txn belongs to a child user
         child = session.get(User, txn.user_id)
@@ -168,20 +184,37 @@ def admin_mark_paid(payload: dict, current_user: User = Depends(get_current_user
             continue
         txn.paid = True
         session.add(txn)
-        updated += 1
+        changed.append(txn)
 
+    ledger.paid(session, changed)
     session.commit()
-    return {"marked": updated}
+    return {"marked": len(changed)}
 
 @router.post("/api/admin/pay")
 def pay_user(payload: dict, current_user: User = Depends(get_current_user), session: Session = Depends(get_session)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403)
-    payee_id = payload["payee_id"]
-    amount = payload["amount"]
-    txn_refs = payload.get("txn_refs", [])
-    payment = Payment(payer_id=current_user.id, payee_id=payee_id, amount=amount, txn_refs=txn_refs)
-    session.add(payment)
+    try:
+        payee_id = int(payload["payee_id"])
+        amount_paise = to_paise(payload["amount"]) if payload.get("amount") not in (None, "") else None
+        txn_refs = [int(t) for t in payload.get("txn_refs", [])]
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="payee_id, amount and txn_refs must be numbers")
+    # payment, allocations and paid flags commit together or not at all
+    payment = ledger.record_payment(session, current_user, payee_id, amount_paise, txn_refs)
     session.commit()
-    return {"message": "Payment recorded"}
+    return {"message": "Payment recorded", "payment_id": payment.id, "amount": payment.amount,
+            "settled": payment.txn_refs}
+
+@router.get("/admin/balances")
+def payment_balances(payee_id: int = None, current_user: User = Depends(get_current_user),
+                     session: Session = Depends(get_session)):
+    """What the admin still owes each child: unpaid shared spending minus unallocated payments"""
+    if current_user.role != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    q = select(User.id).where(User.family_id == current_user.family_id)
+    q = q.where(User.id == payee_id) if payee_id is not None else q.where(User.parent_id == current_user.id)
+    payees = session.exec(q).all()
+    result = ledger.balances(session, current_user.id, payees)
+    return [{"payee_id": pid, **{k: rupees(v) for k, v in b.items()}} for pid, b in result.items()]
 
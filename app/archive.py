@@ -0,0 +1,172 @@
+# app/archive.py
+"""
+Cold-archive tier for transactions.
+
+Paid transactions older than GPAY_ARCHIVE_AFTER_DAYS (default 90) that the
+weekly settlement has closed (week_paid set, app/settlement.py) are moved
+out of the hot `transaction` table into one table per month of the
+transaction date (`transaction_archive_YYYYMM`), registered in
+ArchivePartition. Hot queries such as summary() only ever touch
+`transaction`; reports, history and the edge days of the admin summary read
+`unified_transactions()`, a UNION ALL over the hot table and every
+partition. The cached summary aggregates keep counting archived rows.
+
+Runs on a schedule (GPAY_ARCHIVE_INTERVAL_S, default hourly, 0 disables) or by hand:
+
+    python -m app.archive [--days 90] [--dry-run]
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import Column, Index, MetaData, Table, delete, insert, inspect, select as sa_select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from app.db import engine
+from app.models import Transaction, ArchivePartition
+from app import family_sync
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("GPAY_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_INTERVAL_S = float(os.environ.get("GPAY_ARCHIVE_INTERVAL_S", "3600"))
+PARTITION_CACHE_TTL = 60
+
+_archive_metadata = MetaData()
+_tables = {}
+_partitions = {"loaded_at": 0.0, "months": []}
+
+
+def table_name(month: str) -> str:
+    return f"transaction_archive_{month.replace('-', '')}"
+
+
+def month_of(dt: datetime) -> str:
+    return dt.strftime("%Y-%m")
+
+
+def archive_table(month: str) -> Table:
+    """Same columns as `transaction` (no FKs: archived rows are frozen), own index names."""
+    name = table_name(month)
+    if name not in _tables:
+        columns = [
+            Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+            for c in Transaction.__table__.columns
+        ]
+        _tables[name] = Table(
+            name, _archive_metadata, *columns,
+            Index(f"ix_{name}_user_date", "user_id", "date"),
+            Index(f"ix_{name}_txn_hash", "txn_hash", unique=True),
+            Index(f"ix_{name}_fingerprint", "fingerprint", unique=True),
+        )
+    return _tables[name]
+
+
+# ----------------------------
+# Partition registry
+# ----------------------------
+def partitions(refresh: bool = False):
+    now = time.monotonic()
+    if refresh or now - _partitions["loaded_at"] > PARTITION_CACHE_TTL:
+        with Session(engine) as session:
+            _partitions["months"] = sorted(session.exec(select(ArchivePartition.month)).all())
+        _partitions["loaded_at"] = now
+    return _partitions["months"]
+
+
+def transaction_tables():
+    """Physical tables holding transactions: the hot table, then each partition (for migrations)."""
+    if not inspect(engine).has_table(ArchivePartition.__tablename__):
+        return [Transaction.__tablename__]  # migrate --dry-run before create_all
+    return [Transaction.__tablename__, *(table_name(m) for m in partitions(refresh=True))]
+
+
+def unified_transactions():
+    """Hot table plus every archive partition, with the columns of `transaction`."""
+    hot = Transaction.__table__
+    months = partitions()
+    if not months:
+        return hot
+    parts = [sa_select(*hot.columns)]
+    for month in months:
+        t = archive_table(month)
+        parts.append(sa_select(*[t.c[c.name] for c in hot.columns]))
+    return union_all(*parts).subquery("all_transactions")
+
+
+def _ensure_partition(session, month: str):
+    archive_table(month).create(session.connection(), checkfirst=True)
+    if not session.get(ArchivePartition, month):
+        session.add(ArchivePartition(month=month, table_name=table_name(month)))
+        session.flush()
+
+
+# ----------------------------
+# Mover
+# ----------------------------
+def archive_paid(older_than_days: int | None = None, batch_size: int = 500, dry_run: bool = False):
+    """Move paid, settled transactions older than the cutoff, one short transaction per batch."""
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+    hot = Transaction.__table__
+    moved = 0
+    last_id = 0
+
+    while True:
+        with Session(engine) as session:
+            rows = session.execute(
+                sa_select(hot.c.id, hot.c.date, hot.c.family_id, hot.c.shared)
+                .where(hot.c.paid == True, hot.c.week_paid != None, hot.c.date < cutoff, hot.c.id > last_id)
+                .order_by(hot.c.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            if dry_run:
+                moved += len(rows)
+                continue
+
+            by_month, shared = {}, {}
+            for tid, dt, family_id, is_shared in rows:
+                by_month.setdefault(month_of(dt), []).append(tid)
+                if is_shared:
+                    shared.setdefault(family_id, []).append(tid)
+
+            try:
+                for month, ids in by_month.items():
+                    _ensure_partition(session, month)
+                    target = archive_table(month)
+                    session.execute(insert(target).from_select(
+                        [c.name for c in hot.columns],
+                        sa_select(*hot.columns).where(hot.c.id.in_(ids)),
+                    ))
+                    session.execute(delete(hot).where(hot.c.id.in_(ids)))
+                    part = session.get(ArchivePartition, month)
+                    part.rows += len(ids)
+                    part.updated_at = datetime.now(timezone.utc)
+                    session.add(part)
+                for family_id, ids in shared.items():
+                    family_sync.tombstone(session, family_id, ids, reason="archived")  # gone from the hot feed
+                session.commit()
+                moved += len(rows)
+            except IntegrityError:
+                # another worker archived this batch first
+                session.rollback()
+
+    if moved and not dry_run:
+        partitions(refresh=True)
+        print(f"🗄️ Archived {moved} paid transactions older than {days} days")
+    return {"moved": moved, "cutoff": cutoff.isoformat(), "dry_run": dry_run}
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Move old paid transactions to monthly archive tables")
+    p.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    p.add_argument("--batch-size", type=int, default=500)
+    p.add_argument("--dry-run", action="store_true")
+    args = p.parse_args(argv)
+    print(archive_paid(args.days, args.batch_size, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
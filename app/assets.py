@@ -0,0 +1,197 @@
+# app/assets.py
+"""
+Static asset pipeline: the replacement for StaticFiles(directory="static").
+
+At startup (the "assets" phase) every file under GPAY_STATIC_DIR (default
+./static) is read once into memory with:
+
+  - a content hash, which becomes its ETag and its fingerprinted name
+    (favicon.svg -> favicon.3f2a1b9c0d.svg),
+  - gzip and, when the optional `brotli` package is installed, brotli
+    variants for text types, kept only when smaller.
+
+HTML pages have their href/src references to local assets rewritten to the
+fingerprinted names. Fingerprinted URLs are served with
+`Cache-Control: public, max-age=31536000, immutable`, so browsers never ask
+again. Pages and plain asset names keep their URLs and are served with
+`no-cache`: the browser revalidates with If-None-Match and gets a 304.
+Responses pick br / gzip / identity from Accept-Encoding.
+
+Files are read at startup; edit them with GPAY_STATIC_RELOAD=1 to rebuild
+when anything in the directory changes.
+
+    python -m app.assets        # list assets, hashes and variant sizes
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import get_route_path
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+STATIC_DIR = os.environ.get("GPAY_STATIC_DIR", "static")
+RELOAD = os.environ.get("GPAY_STATIC_RELOAD", "0") == "1"
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+MIN_COMPRESS = 256  # bytes; below this the headers cost more than they save
+
+_COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+_REFERENCE = re.compile(r"""(\b(?:href|src)\s*=\s*["'])([^"'#?]+)""", re.IGNORECASE)
+
+
+class Asset:
+    """One file: body per encoding ("identity", "gzip", "br"), content type and hash."""
+
+    def __init__(self, path: str, body: bytes):
+        self.path = path
+        self.digest = hashlib.sha256(body).hexdigest()[:10]
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type in ("application/javascript", "image/svg+xml"):
+            content_type += "; charset=utf-8"
+        self.content_type = content_type
+        self.bodies = {"identity": body}
+        if content_type.startswith(_COMPRESSIBLE) and len(body) >= MIN_COMPRESS:
+            variants = {"gzip": gzip.compress(body, 9, mtime=0)}
+            if brotli is not None:
+                variants["br"] = brotli.compress(body, quality=11)
+            for encoding, data in variants.items():
+                if len(data) < len(body) * 0.9:
+                    self.bodies[encoding] = data
+
+    @property
+    def fingerprinted(self) -> str:
+        root, ext = posixpath.splitext(self.path)
+        return f"{root}.{self.digest}{ext}"
+
+    @property
+    def is_page(self) -> bool:
+        return self.content_type.startswith("text/html")
+
+
+def _rewrite(page: str, html: bytes, assets: dict) -> bytes:
+    """Point the page's references to local non-HTML assets at their fingerprinted names."""
+    base = posixpath.dirname(page)
+
+    def swap(m):
+        prefix, ref = m.group(1), m.group(2)
+        if ref.startswith(("http:", "https:", "//", "data:", "mailto:")):
+            return m.group(0)
+        target = posixpath.normpath(ref.lstrip("/") if ref.startswith("/") else posixpath.join(base, ref))
+        asset = assets.get(target)
+        if asset is None or asset.is_page:
+            return m.group(0)
+        return prefix + ref[:ref.rfind("/") + 1] + posixpath.basename(asset.fingerprinted)
+
+    return _REFERENCE.sub(swap, html.decode("utf-8")).encode("utf-8")
+
+
+def _scan(directory: str) -> dict:
+    """relative path -> file bytes."""
+    files = {}
+    for root, _, names in os.walk(directory):
+        for name in names:
+            full = os.path.join(root, name)
+            with open(full, "rb") as f:
+                files[os.path.relpath(full, directory).replace(os.sep, "/")] = f.read()
+    return files
+
+
+def _stamp(directory: str):
+    return max((e.stat().st_mtime_ns for e in os.scandir(directory)), default=0) if os.path.isdir(directory) else 0
+
+
+class Site:
+    """ASGI app serving the built assets; mounted at "/" in app/main.py."""
+
+    def __init__(self, directory: str = STATIC_DIR):
+        self.directory = directory
+        self.routes = {}  # url path (no leading /) -> (Asset, cache-control)
+        self.assets = {}
+        self._stamp = None
+        self._lock = threading.Lock()
+
+    def build(self) -> str:
+        files = _scan(self.directory)
+        assets = {path: Asset(path, body) for path, body in files.items() if not path.endswith(".html")}
+        for path, body in files.items():
+            if path.endswith(".html"):
+                assets[path] = Asset(path, _rewrite(path, body, assets))
+        routes = {}
+        for path, asset in assets.items():
+            routes[path] = (asset, REVALIDATE)
+            if not asset.is_page:
+                routes[asset.fingerprinted] = (asset, IMMUTABLE)
+        self.assets, self.routes, self._stamp = assets, routes, _stamp(self.directory)
+        raw = sum(len(a.bodies["identity"]) for a in assets.values())
+        packed = sum(min(len(b) for b in a.bodies.values()) for a in assets.values())
+        return f"{len(assets)} files, {raw / 1024:.0f} KB → {packed / 1024:.0f} KB compressed" + \
+            ("" if brotli else " (gzip only)")
+
+    def _current(self):
+        if self._stamp is None or (RELOAD and _stamp(self.directory) != self._stamp):
+            with self._lock:
+                if self._stamp is None or (RELOAD and _stamp(self.directory) != self._stamp):
+                    self.build()
+        return self.routes
+
+    def _lookup(self, path: str):
+        routes = self._current()
+        path = path.strip("/")
+        found = routes.get(path)
+        if found is None:
+            found = routes.get(posixpath.join(path, "index.html") if path else "index.html")
+        return found
+
+    def response(self, request: Request) -> Response:
+        if request.method not in ("GET", "HEAD"):
+            return PlainTextResponse("Method Not Allowed", status_code=405)
+        found = self._lookup(get_route_path(request.scope))
+        status = 200
+        if found is None:
+            found = self.routes.get("404.html")
+            if found is None:
+                return PlainTextResponse("Not Found", status_code=404)
+            status = 404
+        asset, cache_control = found
+
+        accepted = {e.split(";")[0].strip().lower() for e in request.headers.get("accept-encoding", "").split(",")}
+        encoding = next((e for e in ("br", "gzip") if e in accepted and e in asset.bodies), "identity")
+        etag = f'"{asset.digest}-{encoding}"' if encoding != "identity" else f'"{asset.digest}"'
+        headers = {"etag": etag, "cache-control": cache_control, "vary": "Accept-Encoding"}
+
+        if status == 200 and etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+            return Response(status_code=304, headers=headers)
+        body = asset.bodies[encoding]
+        if encoding != "identity":
+            headers["content-encoding"] = encoding
+        headers["content-length"] = str(len(body))
+        return Response(b"" if request.method == "HEAD" else body, status_code=status, headers=headers,
+                        media_type=asset.content_type)
+
+    async def __call__(self, scope, receive, send):
+        await self.response(Request(scope, receive))(scope, receive, send)
+
+
+site = Site()
+
+
+def main():
+    print(site.build())
+    for path, asset in sorted(site.assets.items()):
+        sizes = ", ".join(f"{e} {len(b)}" for e, b in asset.bodies.items())
+        print(f"   {path:<28} {asset.digest}  {sizes}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,17 +1,18 @@
-from fastapi import APIRouter, HTTPException, Response, Request, Depends
+from fastapi import APIRouter, HTTPException, Response, Request, Depends, BackgroundTasks
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, EmailStr
 from app.db import engine, get_session
-from app.utils.email import get_family_smtp
-from app.models import User, Family, VerificationResendLog
+from app.utils.email import get_family_smtp, verification_message, send_verification_batch
+from app.models import Transaction, User
+from app import provisioning, purge, ratelimit
 from sqlmodel import Session, select
+from sqlalchemy import and_, exists
 from passlib.hash import argon2
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 import os
-import pyotp
 import secrets
 import smtplib, ssl
-from email.message import EmailMessage
 
 from app.settings import DEFAULT_SMTP
 
@@ -114,12 +115,17 @@ def register(request: Request, payload: RegisterIn):
 
 
 @router.post('/login')
-def login(payload: LoginIn, response: Response):
+def login(request: Request, payload: LoginIn, response: Response):
+    # refused before the user lookup and the argon2 verify; only failures count against the account
+    ratelimit.LOGIN_IP.hit(ratelimit.client_ip(request))
+    ratelimit.LOGIN_EMAIL.check(payload.email.lower())
     with Session(engine) as session:
         q = select(User).where(User.email == payload.email)
         user = session.exec(q).first()
         if not user or not argon2.verify(payload.password, user.password_hash):
+            ratelimit.LOGIN_EMAIL.add(payload.email.lower())
             raise HTTPException(status_code=401, detail='Invalid credentials')
+        ratelimit.LOGIN_EMAIL.reset(payload.email.lower())
 
         token = create_access_token({'sub': str(user.id), 'email': user.email})
         response.set_cookie('access_token', token, httponly=True, secure=False, samesite='lax')
@@ -154,6 +160,7 @@ def get_current_user(request: Request):
 @router.post('/enable-totp')
 def enable_totp(request: Request):
     user = get_current_user(request)
+    import pyotp  # only needed for 2FA; keep it off the startup path
     secret = pyotp.random_base32()
     # save secret temporarily; in production use proper onboarding flow
     with Session(engine) as session:
@@ -169,6 +176,7 @@ def verify_totp(code: str, request: Request):
     user = get_current_user(request)
     if not user.totp_secret:
         raise HTTPException(status_code=400, detail='No totp enabled')
+    import pyotp
     totp = pyotp.TOTP(user.totp_secret)
     if not totp.verify(code):
         raise HTTPException(status_code=400, detail='Invalid code')
@@ -209,12 +217,13 @@ def list_users(request: Request):
         ]
 
 @router.post('/signup')
-def signup(payload: RegisterIn):
+def signup(request: Request, payload: RegisterIn):
     """
     Public signup endpoint.
     Normal users can self-register.
     Sends verification email. User must verify within 7 days.
     """
+    ratelimit.SIGNUP_IP.hit(ratelimit.client_ip(request))
     with Session(engine) as session:
         existing = session.exec(select(User).where(User.email == payload.email)).first()
         if existing:
@@ -252,14 +261,7 @@ def signup(payload: RegisterIn):
 
 def send_verification_email(email: str, token: str, smtp_cfg: dict):
     try:
-        msg = EmailMessage()
-        msg["Subject"] = "Verify your FamilyApp account"
-        msg["From"] = smtp_cfg['EMAIL_USER']
-        msg["To"] = email
-        APP_HOST_URL = os.environ.get('APP_HOST_URL', 'http://localhost:8000')
-        verify_url = f"{APP_HOST_URL}/auth/verify?token={token}"
-        msg.set_content(f"Welcome! Please verify your account: {verify_url}")
-
+        msg = verification_message(email, token, smtp_cfg)
         context = ssl.create_default_context()
         with smtplib.SMTP_SSL(smtp_cfg['EMAIL_HOST'], smtp_cfg['EMAIL_PORT'], context=context) as server:
             server.login(smtp_cfg['EMAIL_USER'], smtp_cfg['EMAIL_PASS'])
@@ -293,43 +295,52 @@ def invite_superadmin(email: EmailStr, request: Request):
     send_verification_email(email, token, smtp_config=DEFAULT_SMTP)
     return {"message": "Superadmin invited. Must verify within 7 days."}
 
-def cleanup_unverified_accounts():
+CLEANUP_INTERVAL_S = float(os.environ.get('GPAY_UNVERIFIED_CLEANUP_S', '86400'))
+
+def cleanup_unverified_accounts(dry_run: bool = False, verbose: bool = False):
+    """
+    Scheduled job: delete accounts still unverified, never used (first login
+    pending, no transactions) and created more than 7 days ago. Only those
+    users go: their children stay, and a family is deleted only when every
+    member is such a stale account. Admin accounts are kept. Deletes run in
+    short batches (app/purge.py).
+    """
     seven_days_ago = datetime.utcnow() - timedelta(days=7)
+    stale = and_(User.is_verified == False, User.first_login == True, User.created_at < seven_days_ago,
+                 User.role.not_in(["admin", "superadmin"]),
+                 ~exists().where(Transaction.user_id == User.id))
     with Session(engine) as session:
-        # Find unverified users
-        unverified = session.exec(select(User).where(User.is_verified == False, User.created_at < seven_days_ago)).all()
-        for user in unverified:
-            if user.role == "parent" and user.family_id:
-                # Delete entire family and cascade to spouses, children, transactions
-                family = session.get(Family, user.family_id)
-                if family:
-                    session.delete(family)
-            else:
-                # Delete user; cascade set on relationships deletes transactions, children, etc.
-                session.delete(user)
-        session.commit()
+        stale_ids = set(session.exec(select(User.id).where(stale)).all())
+        members = session.exec(
+            select(User.family_id, User.id).where(User.family_id.in_(
+                select(User.family_id).where(stale, User.family_id != None)))
+        ).all()
+    by_family = {}
+    for family_id, user_id in members:
+        by_family.setdefault(family_id, set()).add(user_id)
+    families = sorted(f for f, ids in by_family.items() if ids <= stale_ids)
+    users = sorted(stale_ids - {u for f in families for u in by_family[f]})
+
+    report = purge.Report(dry_run, verbose=verbose)
+    for family_id in families:
+        purge.purge_family(family_id, report)
+    purge.purge_users(users, report, descendants=False)
+    result = {"families": len(families), "users": len(users), **report.summary()}
+    if (families or users) and not dry_run:
+        print(f"🧹 Removed {len(users)} unverified accounts and {len(families)} families "
+              f"in {result['batches']} batches (slowest {result['slowest_batch_ms']} ms)")
+    return result
 
-MAX_RESENDS_PER_DAY = 7
 @router.post('/auth/resend-verification')
-def resend_verification(email: EmailStr):
+def resend_verification(request: Request, email: EmailStr):
+    # address limit first: unknown emails never reach the resend log
+    ratelimit.RESEND_IP.hit(ratelimit.client_ip(request))
     now = datetime.utcnow()
-    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_of_day = start_of_day + timedelta(days=1)
     with Session(engine) as session:
-        count_today = session.exec(
-            select(VerificationResendLog)
-            .where(
-                VerificationResendLog.email == email,
-                VerificationResendLog.sent_at >= start_of_day,
-                VerificationResendLog.sent_at < end_of_day
-            )
-        ).count()
-        if count_today >= MAX_RESENDS_PER_DAY:
-            raise HTTPException(status_code=429, detail="Too many resend attempts for today. Try tomorrow.")
-
         user = session.exec(select(User).where(User.email == email)).first()
         if not user or user.is_verified:
             raise HTTPException(status_code=400, detail="No unverified account for this email.")
+        ratelimit.RESEND_EMAIL.check(email)
         # always issue a fresh expiry for a new token
         token = generate_token()
         expires_at = now + timedelta(days=7)
@@ -338,8 +349,9 @@ def resend_verification(email: EmailStr):
         user.verification_expires_at = expires_at
         session.add(user)
         # Log this send
-        session.add(VerificationResendLog(email=email, sent_at=now))
+        ratelimit.log_resend(session, email)
         session.commit()
+    ratelimit.RESEND_EMAIL.add(email)
     return {"message": "Verification email resent."}
 
 def get_valid_role(requested_role: str, default: str = "user"):
@@ -382,6 +394,18 @@ def invite_user(
     send_verification_email(email, token, smtp_cfg=DEFAULT_SMTP)
     return {"message": f"{role.capitalize()} invited. Must verify within 7 days."}
 
+@router.post('/admin/users/bulk')
+async def bulk_provision(request: Request, background_tasks: BackgroundTasks):
+    """Create many users from a CSV or JSON member list; one result per row (see app/provisioning.py)"""
+    inviter = get_current_user(request)
+    if inviter.role not in ["admin", "superadmin"]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    rows = provisioning.parse_members(await request.body(), request.headers.get("content-type", ""))
+    results, invites = await run_in_threadpool(provisioning.provision, rows, provisioning.admin_placement(inviter))
+    if invites:
+        background_tasks.add_task(send_verification_batch, invites, DEFAULT_SMTP)
+    return provisioning.summarize(results)
+
 from fastapi.responses import HTMLResponse
 
 @router.get("/verify", response_class=HTMLResponse)
@@ -0,0 +1,177 @@
+# app/batches.py
+"""
+Multi-file statement imports.
+
+POST /api/upload/batch takes several statements and/or .zip archives and
+spools them as one zip (ZIP_STORED) for a single import job: archives are
+unpacked member by member straight into the spool, never held in memory
+whole. The job (app/jobs.py) recognises the spooled zip, parses its
+members concurrently on a process pool (pdfplumber is CPU-bound Python, so
+threads would not help), merges the records and drops cross-file repeats
+by fingerprint before anything reaches the database. The job then reports
+once for the whole batch, with a per-file breakdown in `files`.
+
+A .zip sent to the plain POST /api/upload goes through the same path.
+"""
+
+import hashlib
+import multiprocessing
+import os
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
+from app import parse_cache
+
+MAX_FILES = int(os.environ.get("GPAY_ARCHIVE_MAX_FILES", "100"))
+MAX_BYTES = int(os.environ.get("GPAY_ARCHIVE_MAX_MB", "200")) * 1024 * 1024  # uncompressed, whole batch
+PARSE_WORKERS = int(os.environ.get("GPAY_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+COPY_BLOCK = 1024 * 1024
+
+_pool = None
+
+
+def is_archive(path: str) -> bool:
+    with open(path, "rb") as f:
+        if f.read(4) != b"PK\x03\x04":
+            return False
+    return zipfile.is_zipfile(path)
+
+
+def _statement_members(zf: zipfile.ZipFile):
+    """Members worth parsing: regular files, minus macOS resource forks and dotfiles."""
+    for info in zf.infolist():
+        base = os.path.basename(info.filename)
+        if info.is_dir() or not base or base.startswith(".") or info.filename.startswith("__MACOSX/"):
+            continue
+        yield info
+
+
+# ----------------------------
+# Spooling a batch
+# ----------------------------
+class _Spool:
+    def __init__(self, path):
+        self.zip = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True)
+        self.names = set()
+        self.total = 0
+        self.sha = hashlib.sha256()  # of the statements' bytes, so a re-sent batch maps to its pending job
+
+    def _name(self, name):
+        name = os.path.basename(name or "") or "statement"
+        unique, n = name, 1
+        while unique in self.names:
+            n += 1
+            unique = f"{n}-{name}"
+        self.names.add(unique)
+        return unique
+
+    def add(self, name, src):
+        if len(self.names) >= MAX_FILES:
+            raise HTTPException(400, f"A batch may hold at most {MAX_FILES} statements")
+        with self.zip.open(self._name(name), "w", force_zip64=True) as dst:
+            while block := src.read(COPY_BLOCK):
+                self.total += len(block)
+                if self.total > MAX_BYTES:
+                    raise HTTPException(400, f"Batch is larger than {MAX_BYTES // (1024 * 1024)} MB unpacked")
+                self.sha.update(block)
+                dst.write(block)
+
+    def add_archive(self, fileobj):
+        try:
+            src = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile:
+            raise HTTPException(400, "Corrupt zip archive")
+        with src:
+            for info in _statement_members(src):
+                with src.open(info) as member:
+                    self.add(info.filename, member)
+
+
+def spool_batch(files) -> tuple[str, str, str]:
+    """
+    Write (filename, file object) pairs into one zip under the job spool;
+    returns its path, a name for the job and a content digest. Raises 400 on
+    an empty or oversized batch.
+    """
+    from app.jobs import JOB_DIR
+
+    os.makedirs(JOB_DIR, exist_ok=True)
+    path = os.path.join(JOB_DIR, f"{uuid.uuid4().hex}.tmp")
+    spool = _Spool(path)
+    try:
+        for name, fileobj in files:
+            fileobj.seek(0)
+            if fileobj.read(4) == b"PK\x03\x04":
+                fileobj.seek(0)
+                spool.add_archive(fileobj)
+            else:
+                fileobj.seek(0)
+                spool.add(name, fileobj)
+        spool.zip.close()
+    except BaseException:
+        spool.zip.close()
+        os.remove(path)
+        raise
+    if not spool.names:
+        os.remove(path)
+        raise HTTPException(400, "No statements in upload")
+    names = [os.path.basename(n or "") for n, _ in files]
+    label = names[0] if len(names) == 1 else f"{len(spool.names)} statements"
+    return path, label, spool.sha.hexdigest()
+
+
+# ----------------------------
+# Parsing a spooled batch
+# ----------------------------
+def _parse_member(path: str, name: str):
+    """Runs in a pool process: parse one member; returns (name, format, records, error)."""
+    with zipfile.ZipFile(path) as zf:
+        content = zf.read(name)
+    try:
+        fmt, records = parse_cache.parse(content)
+    except Exception as e:
+        return name, None, [], f"Could not read statement: {e}"
+    if fmt is None:
+        return name, None, [], "Unrecognised statement format"
+    return name, fmt, records, None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the app process runs threads (scheduler, import workers)
+        _pool = ProcessPoolExecutor(PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def parse_archive(path: str):
+    """Parse every member of a spooled batch; returns ([records per member], [file report])."""
+    with zipfile.ZipFile(path) as zf:
+        infos = list(_statement_members(zf))
+    if len(infos) > MAX_FILES:
+        raise ValueError(f"Archive holds {len(infos)} files; the limit is {MAX_FILES}")
+    if sum(i.file_size for i in infos) > MAX_BYTES:
+        raise ValueError(f"Archive is larger than {MAX_BYTES // (1024 * 1024)} MB unpacked")
+
+    names = [i.filename for i in infos]
+    if PARSE_WORKERS > 1 and len(names) > 1:
+        try:
+            results = list(_get_pool().map(_parse_member, [path] * len(names), names))
+        except BrokenProcessPool:
+            shutdown()  # a parser process died (e.g. out of memory); the job retries on a fresh pool
+            raise
+    else:
+        results = [_parse_member(path, n) for n in names]
+
+    files = [{"name": name, "format": fmt, "rows": len(records), "error": error}
+             for name, fmt, records, error in results]
+    return [records for _, _, records, _ in results], files
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
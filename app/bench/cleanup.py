@@ -0,0 +1,98 @@
+# app/bench/cleanup.py
+"""
+Regression check for the unverified-account cleanup (auth.cleanup_unverified_accounts).
+
+Seeds a throwaway SQLite DB with:
+
+  - a family holding a verified admin, a verified child (with transactions)
+    and a 10-day-old unverified parent: only the parent may go,
+  - a family whose only members are stale unverified accounts: it goes whole,
+  - a stale account that already has transactions and a fresh unverified
+    one: both stay,
+
+runs the cleanup (dry run first, which must delete nothing) and checks
+which users, families and transactions are left.
+
+    python -m app.bench.cleanup
+
+Exits non-zero on any mismatch.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+
+def run():
+    db = os.path.join(tempfile.mkdtemp(prefix="gpay-cleanup-"), "cleanup.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db}"
+
+    from sqlalchemy import func
+    from sqlmodel import Session, select
+    from app.db import engine, init_db
+    from app.models import Family, Transaction, User
+    from app.auth import cleanup_unverified_accounts
+
+    init_db()
+    old = datetime.utcnow() - timedelta(days=10)
+
+    def user(session, email, role, family, verified, created=old, parent=None):
+        u = User(email=email, password_hash="x", role=role, family_id=family.id, parent_id=parent,
+                 is_verified=verified, first_login=not verified, created_at=created)
+        session.add(u)
+        session.flush()
+        return u
+
+    with Session(engine) as s:
+        mixed, dead = Family(name="mixed"), Family(name="all-stale")
+        s.add_all([mixed, dead])
+        s.flush()
+        parent = user(s, "parent@mixed.test", "parent", mixed, False)
+        admin = user(s, "admin@mixed.test", "admin", mixed, True)
+        child = user(s, "child@mixed.test", "child", mixed, True, parent=parent.id)
+        user(s, "parent@dead.test", "parent", dead, False)
+        user(s, "spouse@dead.test", "spouse", dead, False)
+        used = user(s, "used@mixed.test", "user", mixed, False)
+        fresh = user(s, "fresh@mixed.test", "user", mixed, False, created=datetime.utcnow())
+        for owner in (child, used):
+            s.add(Transaction(user_id=owner.id, family_id=mixed.id, date=old, amount=10.0, amount_paise=1000,
+                              merchant="SHOP", type="debit", description="SHOP", txn_hash=f"h{owner.id}"))
+        s.commit()
+        keep = {admin.email, child.email, used.email, fresh.email}
+        child_id, mixed_id = child.id, mixed.id
+
+    failures = []
+
+    def check(label, ok):
+        print(f"{'✅' if ok else '❌'} {label}")
+        if not ok:
+            failures.append(label)
+
+    def state():
+        with Session(engine) as s:
+            return (set(s.exec(select(User.email)).all()), set(s.exec(select(Family.name)).all()),
+                    s.exec(select(func.count()).select_from(Transaction)).one())
+
+    before = state()
+    print(cleanup_unverified_accounts(dry_run=True))
+    check("dry run deletes nothing", state() == before)
+
+    print(cleanup_unverified_accounts())
+    emails, families, txns = state()
+    check("only the stale accounts are deleted", emails == keep)
+    check("the family with verified members stays, the all-stale one goes", families == {"mixed"})
+    check("transactions stay", txns == 2)
+    with Session(engine) as s:
+        orphan = s.get(User, child_id)
+        check("the child stays in its family, detached from the deleted parent",
+              orphan.family_id == mixed_id and orphan.parent_id is None)
+    return 1 if failures else 0
+
+
+def main():
+    sys.exit(run())
+
+
+if __name__ == "__main__":
+    main()
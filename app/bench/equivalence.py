@@ -0,0 +1,309 @@
+# app/bench/equivalence.py
+"""
+Equivalence check: NumPy aggregation engine vs the original SQL/Python reports.
+
+Seeds a throwaway SQLite DB with random transactions (several users and
+families, NULL and mixed-case merchants, some rows archived), then compares
+every report endpoint against the reference queries the endpoints used
+before the engine, both on live columns and on family snapshots. Children
+share and get paid through the API before archiving, and the admin summary
+(served from the cached aggregates) is compared with the original query run
+over hot and archived rows, with archived shared rows in every period;
+finished weeks are closed into statements first and checked as well.
+
+    python -m app.bench.equivalence [--rows 20000] [--seed 7]
+
+Exits non-zero on any mismatch.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+MERCHANTS = ["MEDPLUS", "medplus", "Hotel Saravana", "UBER", "uber auto", None, "", "AMAZON PAY",
+             "VEGETABLE SHOP", "ZERODHA", "SATHYA MOBILES", "Ola Cabs"]
+RULES = {"MEDPLUS": "Medical", "HOTEL": "Food", "UBER": "Transport", "OLA": "Transport", "AMAZON": "Shopping"}
+PASSWORD = "equivalence-pw"
+TOL = 1e-6
+
+
+# ----------------------------
+# Reference (pre-engine) implementations
+# ----------------------------
+def ref_daily(session, txn, user_id=None):
+    from sqlalchemy import func
+    from sqlmodel import select
+    q = select(func.strftime("%Y-%m-%d", txn.c.date).label("day"), func.sum(txn.c.amount))
+    if user_id is not None:
+        q = q.where(txn.c.user_id == user_id)
+    return [{"date": r[0], "total": r[1]} for r in session.exec(q.group_by("day").order_by("day")).all()]
+
+
+def ref_monthly(session, txn, user_id=None):
+    from sqlalchemy import func
+    from sqlmodel import select
+    q = select(func.strftime("%Y-%m", txn.c.date).label("month"), func.sum(txn.c.amount))
+    if user_id is not None:
+        q = q.where(txn.c.user_id == user_id)
+    return [{"month": r[0], "total": r[1]} for r in session.exec(q.group_by("month").order_by("month")).all()]
+
+
+def ref_vendors(session, txn, user_id):
+    from sqlalchemy import func
+    from sqlmodel import select
+    q = (
+        select(txn.c.merchant, func.sum(txn.c.amount))
+        .where(txn.c.user_id == user_id)
+        .group_by(txn.c.merchant)
+    )
+    return [{"merchant": r[0], "total": r[1]} for r in session.exec(q).all()]
+
+
+def ref_top_merchants(session, txn):
+    from sqlalchemy import func
+    from sqlmodel import select
+    q = (
+        select(txn.c.merchant, func.sum(txn.c.amount))
+        .group_by(txn.c.merchant)
+        .order_by(func.sum(txn.c.amount).desc())
+        .limit(20)
+    )
+    return [{"merchant": r[0], "total": r[1]} for r in session.exec(q).all()]
+
+
+def by_merchant(rows):
+    """
+    Fold rows on the normalized merchant name. The merchant dictionary made
+    the reports group "MEDPLUS" and "medplus " together under one display
+    name; the raw-name references above are compared after the same fold.
+    """
+    from app.merchants import normalize
+    folded = {}
+    for r in rows:
+        key = normalize(r["merchant"])
+        folded[key] = folded.get(key, 0) + (r["total"] or 0)
+    return [{"merchant": k, "total": v} for k, v in folded.items()]
+
+
+def ref_admin_summary(session, txn, admin_id, family_id, start, end):
+    from sqlalchemy import func
+    from sqlmodel import select
+    from app.models import User
+    paise = session.exec(
+        select(func.sum(txn.c.amount_paise)).join(User, User.id == txn.c.user_id)
+        .where(User.parent_id == admin_id, User.family_id == family_id, txn.c.shared == True,
+               txn.c.date.between(start, end))
+    ).one_or_none()
+    return (paise or 0) / 100
+
+
+def ref_category(session, txn, user_id):
+    from sqlmodel import select
+    from app.models import MerchantRule, Category
+    txns = session.exec(select(txn.c.merchant, txn.c.amount).where(txn.c.user_id == user_id)).all()
+    rules = session.exec(select(MerchantRule, Category).join(Category)).all()
+    totals = {}
+    for t in txns:
+        merchant = (t.merchant or "").upper()
+        for rule, cat in rules:
+            if rule.pattern in merchant:
+                totals[cat.name] = totals.get(cat.name, 0) + t.amount
+                break
+        else:
+            totals["Others"] = totals.get("Others", 0) + t.amount
+    return [{"category": k, "total": v} for k, v in totals.items()]
+
+
+def ref_summary_total(session, user_id, days):
+    from sqlalchemy import func
+    from sqlmodel import select
+    from app.models import Transaction
+    end = datetime.utcnow().date()
+    start = end - timedelta(days=days)
+    rows = session.exec(select(Transaction).where(
+        Transaction.user_id == user_id, Transaction.paid == False,
+        func.date(Transaction.date) >= start, func.date(Transaction.date) <= end)).all()
+    return sum(t.amount for t in rows), sorted(t.id for t in rows)
+
+
+# ----------------------------
+# Comparison
+# ----------------------------
+def close(a, b):
+    if a is None or b is None:
+        return a == b
+    return abs(a - b) <= TOL * max(1.0, abs(a), abs(b))
+
+
+def same_rows(expected, actual, key, ordered=True):
+    if len(expected) != len(actual):
+        return False
+    if not ordered:
+        expected = sorted(expected, key=lambda r: str(r[key]))
+        actual = sorted(actual, key=lambda r: str(r[key]))
+    return all(e[key] == a[key] and close(e["total"], a["total"]) for e, a in zip(expected, actual))
+
+
+def seed(rows, rng):
+    from sqlmodel import Session
+    from app.db import engine
+    from app.models import User, Family, Transaction, Category, MerchantRule
+    from app.auth import hash_password
+    from app.merchants import intern_many
+
+    pw = hash_password(PASSWORD)
+    interned = intern_many(m or "" for m in MERCHANTS)  # own write transaction: before ours opens
+    now = datetime.utcnow()
+    with Session(engine) as session:
+        families = [Family(name=f"eq-{i}") for i in range(2)]
+        session.add_all(families)
+        session.commit()
+        users = []
+        for i in range(4):
+            u = User(email=f"eq{i}@example.com", password_hash=pw, role="child",
+                     family_id=families[i % 2].id, is_verified=True, first_login=False)
+            users.append(u)
+        users.append(User(email="eq-admin@example.com", password_hash=pw, role="admin",
+                          family_id=families[0].id, is_verified=True, first_login=False))
+        session.add_all(users)
+        cats = {name: Category(name=name) for name in set(RULES.values())}
+        session.add_all(cats.values())
+        session.commit()
+        for child in (users[0], users[2]):  # the admin's children (family 0)
+            child.parent_id = users[4].id
+            session.add(child)
+        for pattern, name in RULES.items():
+            session.add(MerchantRule(pattern=pattern, category_id=cats[name].id))
+        for n in range(rows):
+            u = rng.choice(users[:4])
+            merchant = rng.choice(MERCHANTS)
+            paise = rng.randint(1, 500000)
+            session.add(Transaction(
+                user_id=u.id, family_id=u.family_id, txn_hash=f"eq-{n}",
+                date=now - timedelta(days=rng.randint(0, 400), minutes=rng.randint(0, 1439)),
+                amount=paise / 100, amount_paise=paise, merchant=merchant,
+                merchant_id=interned[merchant or ""][0],
+                paid=rng.random() < 0.5, type="debit", description="eq",
+            ))
+        session.commit()
+        return [(u.id, u.email, u.family_id) for u in users]
+
+
+def share_and_pay(client, users, rng):
+    """Children share part of their rows, the admin pays some of them and one is deleted."""
+    from sqlmodel import Session, select
+    from app.db import engine
+    from app.models import Transaction
+    with Session(engine) as s:
+        by_user = {uid: s.exec(select(Transaction.id).where(Transaction.user_id == uid)).all()
+                   for uid, _, _ in users[:4]}
+    for uid, email, _ in users[:4]:
+        client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        ids = rng.sample(by_user[uid], len(by_user[uid]) // 2)
+        client.post("/api/transactions/share", json={"ids": ids})
+        client.post("/api/transactions/archive", json={"ids": rng.sample(ids, len(ids) // 10)})
+        unshared = sorted(set(by_user[uid]) - set(ids))
+        if unshared:
+            client.delete(f"/api/transactions/{unshared[0]}")
+    client.post("/auth/login", json={"email": users[4][1], "password": PASSWORD})
+    shared = [i for uid, _, _ in (users[0], users[2]) for i in by_user[uid]]
+    client.post("/api/admin/markPaid", json={"txnIds": rng.sample(shared, len(shared) // 5)})
+
+
+def run(args):
+    db = os.path.join(tempfile.mkdtemp(prefix="gpay-eq-"), "eq.db")
+    os.environ["DATABASE_URL"] = f"sqlite:///{db}"
+    os.environ["GPAY_ANALYTICS_DIR"] = os.path.join(os.path.dirname(db), "analytics")
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import func
+    from sqlmodel import Session, select
+    import app.main
+    from app.db import engine
+    from app import archive, aggregates, settlement
+    from app.analytics import snapshot
+
+    failures = []
+    with TestClient(app.main.app) as client:
+        rng = random.Random(args.seed)
+        users = seed(args.rows, rng)
+        admin = users[4]
+        share_and_pay(client, users, rng)
+        print(settlement.close_weeks())  # only settled rows are archived
+        print(archive.archive_paid(120))
+
+        def check(label, ok):
+            print(f"{'✅' if ok else '❌'} {label}")
+            if not ok:
+                failures.append(label)
+
+        for mode in ("live", "snapshot"):
+            snapshot.ENABLED = mode == "snapshot"
+            if snapshot.ENABLED:
+                for fid in {u[2] for u in users}:
+                    snapshot.refresh_family(fid)
+            txn = archive.unified_transactions()
+            for uid, email, _ in users[:4]:
+                client.post("/auth/login", json={"email": email, "password": PASSWORD})
+                with Session(engine) as s:
+                    check(f"[{mode}] daily user {uid}",
+                          same_rows(ref_daily(s, txn, uid), client.get("/api/report/daily").json(), "date"))
+                    check(f"[{mode}] monthly user {uid}",
+                          same_rows(ref_monthly(s, txn, uid), client.get("/api/report/monthly").json(), "month"))
+                    check(f"[{mode}] vendors user {uid}",
+                          same_rows(by_merchant(ref_vendors(s, txn, uid)),
+                                    by_merchant(client.get("/api/report/vendors").json()), "merchant", ordered=False))
+                    check(f"[{mode}] category user {uid}",
+                          same_rows(ref_category(s, txn, uid), client.get("/api/report/category").json(),
+                                    "category", ordered=False))
+                    total, ids = ref_summary_total(s, uid, 30)
+                    got = client.get("/api/summary", params={"days": 30}).json()
+                    check(f"[{mode}] summary user {uid}",
+                          close(total, got["total"]) and ids == sorted(t["id"] for t in got["unpaid"]))
+
+        snapshot.ENABLED = False
+        client.post("/auth/login", json={"email": admin[1], "password": PASSWORD})
+        now = datetime.utcnow()
+        periods = [(now - timedelta(days=400), now), (now - timedelta(days=30), now)]
+        for _ in range(6):
+            a = now - timedelta(days=rng.randint(0, 400), hours=rng.randint(0, 23), minutes=rng.randint(0, 59))
+            periods.append((a, a + timedelta(days=rng.randint(0, 60), hours=rng.randint(0, 23))))
+        periods.append((datetime.combine(now.date(), datetime.min.time()) - timedelta(days=9),
+                        datetime.combine(now.date(), datetime.max.time())))
+        with Session(engine) as s:
+            txn = archive.unified_transactions()
+            archived_shared = sum(s.exec(select(func.count()).select_from(archive.archive_table(m))
+                                         .where(archive.archive_table(m).c.shared == True)).one()
+                                  for m in archive.partitions())
+            check(f"archived shared rows seeded ({archived_shared})", archived_shared > 0)
+            for start, end in periods:
+                got = client.get("/api/admin/summary", params={"start_date": start.isoformat(),
+                                                                "end_date": end.isoformat()}).json()
+                check(f"admin summary {start:%Y-%m-%d %H:%M} .. {end:%Y-%m-%d %H:%M}",
+                      close(ref_admin_summary(s, txn, admin[0], admin[2], start, end), got["total"]))
+        check("summary aggregates match transactions", not aggregates.check())
+        check("weekly statements match transactions", not settlement.check())
+        with Session(engine) as s:
+            txn = archive.unified_transactions()
+            check("admin daily", same_rows(ref_daily(s, txn), client.get("/api/admin/daily").json(), "date"))
+            check("admin monthly", same_rows(ref_monthly(s, txn), client.get("/api/admin/monthly").json(), "month"))
+            check("admin merchants", same_rows(by_merchant(ref_top_merchants(s, txn)),
+                                               by_merchant(client.get("/api/admin/merchants").json()),
+                                               "merchant", ordered=False))
+
+    print(f"\n{len(failures)} mismatch(es)" if failures else "\nAll reports match the reference implementations")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Compare engine reports with the reference SQL/Python paths")
+    p.add_argument("--rows", type=int, default=20000)
+    p.add_argument("--seed", type=int, default=7)
+    sys.exit(run(p.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,401 @@
+# app/bench/loadtest.py
+"""
+Mixed-traffic load generator for the dashboard API.
+
+Seeds N family members, logs each one in through /auth/login and replays a
+weighted mix of dashboard polls, uploads and markPaid calls. Prints
+throughput and latency percentiles per route, plus event-loop stalls seen
+by a probe that keeps hitting a trivial static asset while the load runs.
+
+Usage:
+    python -m app.bench.loadtest --users 40 --duration 30
+    python -m app.bench.loadtest --mix summary=6,upload=2,mark_paid=1
+    python -m app.bench.loadtest --url http://127.0.0.1:8000 --users 20
+
+Without --url a fresh app is started with uvicorn on a temporary SQLite DB,
+with GPAY_RATELIMIT=0: every virtual user logs in from 127.0.0.1, which the
+per-address login limit (30 per 5 minutes) would otherwise refuse.
+With --url the users are seeded into DATABASE_URL, which must be the same
+database the running server uses; start that server with GPAY_RATELIMIT=0
+(or a GPAY_RATE_LOGIN_IP above --users) for the same reason.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+FAMILY_NAME = "loadtest"
+PASSWORD = "loadtest-pw"
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MERCHANTS = ["MEDPLUS", "AMAZON", "HOTEL SARAVANA", "UBER", "VEGETABLE SHOP", "ZERODHA", "SATHYA MOBILES"]
+
+
+# ----------------------------
+# Seeding
+# ----------------------------
+def seed_users(count: int):
+    """Create (or reuse) `count` verified family members sharing one password."""
+    from sqlmodel import Session, select
+    from app.db import engine, init_db
+    from app.models import User, Family
+    from app.auth import hash_password
+
+    init_db()
+    pw_hash = hash_password(PASSWORD)
+    emails = [f"loadtest+{i}@example.com" for i in range(count)]
+
+    with Session(engine) as session:
+        family = session.exec(select(Family).where(Family.name == FAMILY_NAME)).first()
+        if not family:
+            family = Family(name=FAMILY_NAME)
+            session.add(family)
+            session.commit()
+            session.refresh(family)
+
+        existing = set(session.exec(select(User.email).where(User.email.in_(emails))).all())
+        for email in emails:
+            if email in existing:
+                continue
+            session.add(User(
+                email=email,
+                password_hash=pw_hash,
+                role="child",
+                family_id=family.id,
+                is_verified=True,
+                first_login=False,
+            ))
+        session.commit()
+
+    return emails
+
+
+# ----------------------------
+# Local server
+# ----------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port: int, env: dict):
+    cmd = [sys.executable, "-m", "uvicorn", "app.main:app",
+           "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=REPO_ROOT, env=env)
+
+
+async def wait_ready(client, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            r = await client.get("/favicon.svg")
+            if r.status_code == 200:
+                return
+        except Exception:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Server did not become ready in time")
+
+
+# ----------------------------
+# Scenario operations
+# ----------------------------
+def make_statement(rows: int) -> bytes:
+    """Random CSV statement in the format upload() accepts."""
+    now = datetime.utcnow()
+    lines = ["id,date,amount,merchant"]
+    for _ in range(rows):
+        dt = now - timedelta(days=random.randint(0, 6), minutes=random.randint(0, 1440))
+        lines.append(",".join([
+            str(random.getrandbits(48)),
+            dt.replace(microsecond=0).isoformat(),
+            str(random.randint(10, 5000)),
+            random.choice(MERCHANTS),
+        ]))
+    return ("\n".join(lines) + "\n").encode("utf8")
+
+
+async def op_summary(client, state):
+    r = await client.get("/api/summary", params={"days": 7})
+    if r.status_code == 200:
+        state["unpaid"] = [t["id"] for t in r.json().get("unpaid", [])]
+    return r
+
+
+async def op_transactions(client, state):
+    return await client.get("/api/transactions")
+
+
+async def op_report_daily(client, state):
+    return await client.get("/api/report/daily")
+
+
+async def op_report_category(client, state):
+    return await client.get("/api/report/category")
+
+
+async def op_upload(client, state):
+    body = make_statement(state["upload_rows"])
+    files = {"file": ("statement.csv", body, "text/csv")}
+    return await client.post("/api/upload", files=files)
+
+
+async def op_mark_paid(client, state):
+    unpaid = state.get("unpaid") or []
+    picked = random.sample(unpaid, min(3, len(unpaid)))
+    for tid in picked:
+        unpaid.remove(tid)
+    return await client.post("/api/markPaid", json={"txnIds": picked})
+
+
+# name -> (default weight, coroutine)
+SCENARIOS = {
+    "summary": (6, op_summary),
+    "transactions": (3, op_transactions),
+    "report_daily": (2, op_report_daily),
+    "report_category": (1, op_report_category),
+    "upload": (1, op_upload),
+    "mark_paid": (1, op_mark_paid),
+}
+
+
+def parse_mix(spec: str):
+    weights = {name: w for name, (w, _) in SCENARIOS.items()}
+    if spec:
+        for part in spec.split(","):
+            name, _, w = part.partition("=")
+            name = name.strip()
+            if name not in SCENARIOS:
+                raise SystemExit(f"Unknown scenario '{name}'. Known: {', '.join(SCENARIOS)}")
+            weights[name] = float(w or 0)
+    return {k: v for k, v in weights.items() if v > 0}
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+class Stats:
+    def __init__(self):
+        self.samples = {}      # route -> [latency seconds]
+        self.errors = {}       # route -> count
+        self.in_flight = {}    # route -> currently running requests
+        self.probes = []       # (latency, {route: in_flight})
+        self.login_failures = 0
+
+    def begin(self, route):
+        self.in_flight[route] = self.in_flight.get(route, 0) + 1
+
+    def end(self, route, latency, ok):
+        self.in_flight[route] -= 1
+        self.samples.setdefault(route, []).append(latency)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+
+
+async def virtual_user(httpx, base_url, email, weights, stats, stop_at, args):
+    names = list(weights)
+    w = [weights[n] for n in names]
+    state = {"unpaid": [], "upload_rows": args.upload_rows}
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout) as client:
+        r = await client.post("/auth/login", json={"email": email, "password": PASSWORD})
+        if r.status_code != 200:
+            stats.login_failures += 1
+            return
+
+        while time.monotonic() < stop_at:
+            name = random.choices(names, weights=w)[0]
+            op = SCENARIOS[name][1]
+            stats.begin(name)
+            t0 = time.perf_counter()
+            try:
+                resp = await op(client, state)
+                ok = resp.status_code < 400
+            except Exception:
+                ok = False
+            stats.end(name, time.perf_counter() - t0, ok)
+            if args.think:
+                await asyncio.sleep(random.uniform(0, args.think))
+
+
+async def loop_probe(httpx, base_url, stats, stop_at, interval):
+    """Hit a static asset on a fixed cadence; a slow answer means the server loop was busy."""
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        while time.monotonic() < stop_at:
+            snapshot = {k: v for k, v in stats.in_flight.items() if v}
+            t0 = time.perf_counter()
+            try:
+                await client.get("/favicon.svg")
+            except Exception:
+                pass
+            stats.probes.append((time.perf_counter() - t0, snapshot))
+            await asyncio.sleep(interval)
+
+
+async def measure_baseline(httpx, base_url, samples=20):
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        lat = []
+        for _ in range(samples):
+            t0 = time.perf_counter()
+            await client.get("/favicon.svg")
+            lat.append(time.perf_counter() - t0)
+    return percentile(sorted(lat), 50)
+
+
+def percentile(sorted_vals, pct):
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def build_report(stats, elapsed, baseline, stall_ms):
+    routes = {}
+    total = 0
+    for route, lat in sorted(stats.samples.items()):
+        lat = sorted(lat)
+        total += len(lat)
+        routes[route] = {
+            "requests": len(lat),
+            "errors": stats.errors.get(route, 0),
+            "rps": round(len(lat) / elapsed, 2),
+            "mean_ms": round(sum(lat) / len(lat) * 1000, 1),
+            "p50_ms": round(percentile(lat, 50) * 1000, 1),
+            "p90_ms": round(percentile(lat, 90) * 1000, 1),
+            "p99_ms": round(percentile(lat, 99) * 1000, 1),
+            "max_ms": round(lat[-1] * 1000, 1),
+        }
+
+    # a probe counts as a stall when it is both over the absolute threshold
+    # and well above what the same request costs on an idle server
+    threshold = max(stall_ms / 1000, baseline * 10)
+    stalls = [(lat, snap) for lat, snap in stats.probes if lat >= threshold]
+    blame = {}
+    for _, snap in stalls:
+        for route in snap:
+            blame[route] = blame.get(route, 0) + 1
+
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": total,
+        "total_rps": round(total / elapsed, 2),
+        "login_failures": stats.login_failures,
+        "routes": routes,
+        "loop": {
+            "probe_baseline_ms": round(baseline * 1000, 2),
+            "stall_threshold_ms": round(threshold * 1000, 1),
+            "probes": len(stats.probes),
+            "stalls": len(stalls),
+            "max_probe_ms": round(max((p[0] for p in stats.probes), default=0) * 1000, 1),
+            "in_flight_during_stalls": {
+                r: f"{c / len(stalls):.0%}" for r, c in sorted(blame.items(), key=lambda x: -x[1])
+            } if stalls else {},
+        },
+    }
+
+
+def print_report(report):
+    print()
+    print(f"Ran {report['elapsed_s']}s: {report['total_requests']} requests, "
+          f"{report['total_rps']} req/s, {report['login_failures']} login failures")
+    print()
+    header = f"{'route':<18}{'reqs':>7}{'err':>6}{'rps':>8}{'mean':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}"
+    print(header)
+    print("-" * len(header))
+    for route, s in report["routes"].items():
+        print(f"{route:<18}{s['requests']:>7}{s['errors']:>6}{s['rps']:>8}"
+              f"{s['mean_ms']:>9}{s['p50_ms']:>9}{s['p90_ms']:>9}{s['p99_ms']:>9}{s['max_ms']:>9}")
+    print("(latencies in ms)")
+
+    loop = report["loop"]
+    print()
+    print(f"Event loop probe: {loop['probes']} probes, baseline {loop['probe_baseline_ms']}ms, "
+          f"max {loop['max_probe_ms']}ms")
+    if loop["stalls"]:
+        print(f"⚠️  {loop['stalls']} probes over {loop['stall_threshold_ms']}ms — the loop was blocked.")
+        print("   Routes in flight during stalls: " +
+              ", ".join(f"{r} ({share})" for r, share in loop["in_flight_during_stalls"].items()))
+    else:
+        print(f"✅ No probe exceeded {loop['stall_threshold_ms']}ms")
+
+
+async def run(args):
+    try:
+        import httpx
+    except ImportError:
+        raise SystemExit("The load generator needs httpx: pip install httpx")
+
+    weights = parse_mix(args.mix)
+    server = None
+    base_url = args.url
+
+    if not base_url:
+        db_path = os.path.join(tempfile.mkdtemp(prefix="gpay-load-"), "load.db")
+        os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+
+    print(f"Seeding {args.users} users...")
+    emails = seed_users(args.users)
+
+    if not args.url:
+        print(f"Starting app on {base_url} ({os.environ['DATABASE_URL']})")
+        server = start_server(port, dict(os.environ, GPAY_RATELIMIT="0"))
+
+    try:
+        async with httpx.AsyncClient(base_url=base_url) as client:
+            await wait_ready(client)
+        baseline = await measure_baseline(httpx, base_url)
+
+        print(f"Running {args.users} users for {args.duration}s, mix: " +
+              ", ".join(f"{k}={v:g}" for k, v in weights.items()))
+        stats = Stats()
+        started = time.monotonic()
+        stop_at = started + args.duration
+        tasks = [virtual_user(httpx, base_url, e, weights, stats, stop_at, args) for e in emails]
+        tasks.append(loop_probe(httpx, base_url, stats, stop_at, args.probe_interval))
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+    report = build_report(stats, elapsed, baseline, args.stall_ms)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+    return report
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Mixed dashboard traffic load test")
+    p.add_argument("--url", help="Target an already running server instead of starting one")
+    p.add_argument("--users", type=int, default=20, help="Concurrent family members")
+    p.add_argument("--duration", type=float, default=20, help="Seconds to run")
+    p.add_argument("--mix", default="", help="Weights, e.g. summary=6,upload=1,mark_paid=1")
+    p.add_argument("--think", type=float, default=0.0, help="Max random pause between requests (s)")
+    p.add_argument("--upload-rows", type=int, default=200, help="Rows per uploaded statement")
+    p.add_argument("--timeout", type=float, default=60)
+    p.add_argument("--probe-interval", type=float, default=0.05)
+    p.add_argument("--stall-ms", type=float, default=100, help="Probe latency counted as a loop stall")
+    p.add_argument("--json", help="Also write the report to this file")
+    args = p.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+# app/bench/money.py
+"""
+Float rupees vs integer paise: correctness checks and aggregation timings.
+
+    python -m app.bench.money [--rows 1000000] [--seed 7]
+
+Correctness (exit code 1 if any fails):
+  * to_paise gives one canonical value for "100", "100.0", 100.0, "₹1,00.00" ...
+    and the transaction fingerprint agrees for all of them
+  * summing many small amounts is exact in paise (float rupees drift)
+  * engine totals stay exact past 2**53 paise, where float64 weights round
+  * SQLite SUM over amount_paise matches Python's integer sum
+
+Timings compare SQLite SUM/GROUP BY on the REAL vs INTEGER column and the
+NumPy float bincount the engine used before against engine._grouped, on
+ordinary totals and on totals past 2**53 (its int64 reduceat path).
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import numpy as np
+
+from app.money import to_paise, rupees
+from app.analytics import engine as analytics
+
+
+def timed(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        ms = (time.perf_counter() - t0) * 1000
+        best = ms if best is None else min(best, ms)
+    return result, best
+
+
+class Cols(dict):
+    @property
+    def rows(self):
+        return len(self["paise"])
+
+
+# ----------------------------
+# Correctness
+# ----------------------------
+def check_canonical():
+    from datetime import datetime
+    from app.fingerprint import digest
+    spellings = ["100", "100.0", "100.00", 100, 100.0, "₹100", "₹ 1,00.00", " 100.004 "]
+    values = {to_paise(v) for v in spellings}
+    hashes = {digest("T1", datetime(2025, 1, 1), to_paise(v)) for v in spellings}
+    return values == {10000} and len(hashes) == 1, f"paise={sorted(values)}, distinct hashes={len(hashes)}"
+
+
+def check_small_sums(n):
+    amounts = [0.10] * n
+    float_total = sum(amounts)
+    paise_total = sum(to_paise(a) for a in amounts)
+    expected = n * 10
+    detail = f"float sum={float_total!r}, paise sum={paise_total} (expected {expected})"
+    return paise_total == expected and rupees(paise_total) == n / 10, detail
+
+
+def check_large_sums(rng):
+    # ~9e15 paise per group, far past float64's 2**53 exact-integer range
+    big = np.array([rng.randint(10**14, 10**15) for _ in range(64)] + [1] * 64, dtype=np.int64)
+    days = np.zeros(len(big), dtype=np.int32)
+    cols = Cols(paise=big, day=days)
+    exact = sum(int(v) for v in big)
+    _, (engine_sum,) = analytics._grouped(days, big)
+    float_sum = int(np.bincount(days, weights=big.astype(np.float64))[0])
+    ok = int(engine_sum) == exact and analytics.daily_totals(cols, np.ones(len(big), bool))[0]["total"] == rupees(exact)
+    return ok, f"exact={exact}, engine={int(engine_sum)}, float bincount={float_sum} (off by {float_sum - exact})"
+
+
+def check_sql_sum(conn, paise):
+    (sql_total,) = conn.execute("SELECT SUM(amount_paise) FROM txn").fetchone()
+    exact = sum(paise)
+    return sql_total == exact, f"SQL={sql_total}, python={exact}"
+
+
+# ----------------------------
+# Timings
+# ----------------------------
+def build_db(path, rows, rng):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE txn (id INTEGER PRIMARY KEY, day INTEGER, amount REAL, amount_paise INTEGER)")
+    data = []
+    paise = []
+    for i in range(rows):
+        p = rng.randint(1, 500000)
+        paise.append(p)
+        data.append((i + 1, rng.randint(0, 365), p / 100, p))
+    conn.executemany("INSERT INTO txn VALUES (?, ?, ?, ?)", data)
+    conn.commit()
+    return conn, paise
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    failures = []
+
+    def check(label, result):
+        ok, detail = result
+        print(f"{'✅' if ok else '❌'} {label}: {detail}")
+        if not ok:
+            failures.append(label)
+
+    print("Correctness")
+    check("canonical amounts", check_canonical())
+    check("many small amounts", check_small_sums(args.rows))
+    check("sums past 2**53 paise", check_large_sums(rng))
+
+    path = os.path.join(tempfile.mkdtemp(prefix="gpay-money-"), "money.db")
+    conn, paise = build_db(path, args.rows, rng)
+    check("SQLite SUM(amount_paise)", check_sql_sum(conn, paise))
+
+    print(f"\nTimings over {args.rows} rows (best of 3)")
+    timings = [
+        ("sqlite SUM(amount)", lambda: conn.execute("SELECT SUM(amount) FROM txn").fetchone()),
+        ("sqlite SUM(amount_paise)", lambda: conn.execute("SELECT SUM(amount_paise) FROM txn").fetchone()),
+        ("sqlite GROUP BY day, SUM(amount)",
+         lambda: conn.execute("SELECT day, SUM(amount) FROM txn GROUP BY day").fetchall()),
+        ("sqlite GROUP BY day, SUM(amount_paise)",
+         lambda: conn.execute("SELECT day, SUM(amount_paise) FROM txn GROUP BY day").fetchall()),
+    ]
+    days = np.array([r[0] for r in conn.execute("SELECT day FROM txn ORDER BY id")], dtype=np.int32)
+    p = np.array(paise, dtype=np.int64)
+    f = p / 100
+
+    def float_bincount():
+        uniq, inverse = np.unique(days, return_inverse=True)
+        return np.bincount(inverse, weights=f, minlength=len(uniq))
+
+    timings += [
+        ("numpy float64 bincount by day", float_bincount),
+        ("numpy engine._grouped by day", lambda: analytics._grouped(days, p)),
+        ("numpy engine._grouped past 2**53 (reduceat)", lambda: analytics._grouped(days, p * 10**8)),
+    ]
+    for label, fn in timings:
+        _, ms = timed(fn)
+        print(f"   {label:<42} {ms:8.1f} ms")
+    conn.close()
+
+    print(f"\n{len(failures)} failure(s)" if failures else "\nAll money checks passed")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Integer paise correctness checks and aggregation benchmark")
+    p.add_argument("--rows", type=int, default=1000000)
+    p.add_argument("--seed", type=int, default=7)
+    sys.exit(run(p.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
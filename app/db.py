@@ -1,13 +1,63 @@
 from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+import hashlib
 import os
 
 DATABASE_URL = os.environ.get('DATABASE_URL', 'sqlite:///./gpay.db')
 engine = create_engine(DATABASE_URL, echo=False)
 
+if engine.dialect.name == "sqlite":
+    # WAL lets readers carry on while a writer (or an index build) holds the write lock
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute("PRAGMA busy_timeout=5000")
+        cur.close()
+
 def init_db():
     print(f"Using database: {DATABASE_URL}")
     SQLModel.metadata.create_all(engine)
 
+def schema_fingerprint() -> str:
+    """Short hash of every table/column/index declared in the models."""
+    import app.models  # noqa: F401  make sure all tables are registered
+    parts = []
+    for table in SQLModel.metadata.sorted_tables:
+        parts.append(table.name)
+        for col in table.columns:
+            parts.append(f"{col.name}:{col.type}:{col.nullable}:{col.primary_key}")
+        parts.extend(sorted(ix.name for ix in table.indexes))
+    return hashlib.sha256("|".join(parts).encode("utf8")).hexdigest()[:16]
+
+def upsert_add(session, model, rows, keys, add, replace=()):
+    """
+    Insert `rows` (dicts) into `model`'s table; where a row with the same `keys`
+    exists, add the `add` columns to it and overwrite the `replace` ones.
+    Atomic on SQLite/PostgreSQL, read-modify-write in the caller's transaction elsewhere.
+    """
+    if not rows:
+        return
+    table = model.__table__
+    dialect = session.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        ins = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        set_ = {c: table.c[c] + ins.excluded[c] for c in add}
+        set_.update({c: ins.excluded[c] for c in replace})
+        session.execute(ins.on_conflict_do_update(index_elements=[table.c[k] for k in keys], set_=set_), rows)
+        return
+    for r in rows:
+        obj = session.get(model, tuple(r[k] for k in keys))
+        if obj is None:
+            session.add(model(**r))
+            continue
+        for c in add:
+            setattr(obj, c, getattr(obj, c) + r[c])
+        for c in replace:
+            setattr(obj, c, r[c])
+        session.add(obj)
+
 def get_session():
     with Session(engine) as session:
         yield session
@@ -0,0 +1,182 @@
+# app/deletions.py
+"""
+Background execution of approved DeletionRequests.
+
+Approving a deletion no longer deletes anything inside the superadmin's
+request: the request is marked approved and a worker deletes the user or
+family through app/purge.py (dependent rows first, one short transaction
+per chunk), so removing a big family never holds the database lock for
+long. The rows deleted so far, per table, are written to the request as it
+goes (progress) together with a heartbeat; GET /api/admin/deletions/{id}
+shows them.
+
+Requests are claimed with a conditional UPDATE, like import jobs, so two
+app processes never run the same one. A request whose worker stopped
+heartbeating is reclaimed after GPAY_DELETION_STALE_S and carries on where
+it stopped: what is deleted is gone, the purge deletes what is left. After
+MAX_ATTEMPTS tries the request is failed. The scheduler polls every
+GPAY_DELETION_POLL_S (default 30); approval also starts a run right away.
+"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, or_, update
+from sqlmodel import Session, select
+from app.db import engine
+from app.models import DeletionRequest
+from app import purge
+
+POLL_S = float(os.environ.get("GPAY_DELETION_POLL_S", "30"))
+STALE_S = float(os.environ.get("GPAY_DELETION_STALE_S", "120"))
+PROGRESS_EVERY_S = 1.0
+MAX_ATTEMPTS = 3
+ENTITY_TYPES = ("user", "family")
+
+
+class _Lost(Exception):
+    """Another worker took the request over."""
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def describe(req: DeletionRequest) -> dict:
+    return {
+        "request_id": req.id,
+        "entity_type": req.entity_type,
+        "entity_id": req.entity_id,
+        "status": req.status,
+        "approvals": len(req.approval_ids or []),
+        "progress": req.progress or {},
+        "attempts": req.attempts,
+        "error": req.error,
+        "created_at": req.created_at.isoformat() if req.created_at else None,
+        "approved_at": req.approved_at.isoformat() if req.approved_at else None,
+        "finished_at": req.finished_at.isoformat() if req.finished_at else None,
+    }
+
+
+def approve(session, req: DeletionRequest):
+    """Queue an approved request for the executor; the caller commits."""
+    req.status = "approved"
+    req.approved_at = _now()
+    session.add(req)
+
+
+# ----------------------------
+# Worker side
+# ----------------------------
+def claim(worker: str):
+    """Take the oldest approved request (or one whose worker died). Safe across processes."""
+    stale = (_now() - timedelta(seconds=STALE_S)).replace(tzinfo=None)
+    dead = and_(DeletionRequest.status == "running", DeletionRequest.heartbeat_at < stale)
+    runnable = or_(
+        DeletionRequest.status == "approved",
+        and_(dead, DeletionRequest.attempts < MAX_ATTEMPTS),
+    )
+    with Session(engine) as session:
+        # a request that kills its worker every time is failed, not retried forever
+        gave_up = session.execute(
+            update(DeletionRequest).where(dead, DeletionRequest.attempts >= MAX_ATTEMPTS).values(
+                status="failed", worker=None, finished_at=_now(),
+                error=f"Worker stopped during the deletion {MAX_ATTEMPTS} times",
+            )
+        ).rowcount
+        session.commit()
+        if gave_up:
+            print(f"⚠️ Gave up on {gave_up} deletion requests whose workers kept dying")
+        candidates = session.exec(
+            select(DeletionRequest.id).where(runnable).order_by(DeletionRequest.approved_at).limit(5)
+        ).all()
+        for req_id in candidates:
+            won = session.execute(
+                update(DeletionRequest).where(DeletionRequest.id == req_id, runnable).values(
+                    status="running", worker=worker, heartbeat_at=_now(), attempts=DeletionRequest.attempts + 1,
+                    error=None,
+                )
+            ).rowcount
+            session.commit()
+            if won:
+                return req_id
+    return None
+
+
+def _progress(req_id, owner, **values):
+    """Record progress; False if another worker has taken the request over meanwhile."""
+    with Session(engine) as session:
+        ok = session.execute(
+            update(DeletionRequest).where(DeletionRequest.id == req_id, DeletionRequest.worker == owner)
+            .values(heartbeat_at=_now(), **values)
+        ).rowcount
+        session.commit()
+        return bool(ok)
+
+
+def run(req_id: int, worker: str):
+    with Session(engine) as session:
+        req = session.get(DeletionRequest, req_id)
+        entity_type, entity_id, done = req.entity_type, req.entity_id, dict(req.progress or {})
+    if entity_type not in ENTITY_TYPES:
+        raise ValueError(f"Unknown entity type {entity_type!r}")
+
+    last = [time.monotonic()]
+
+    def on_batch(report):
+        if time.monotonic() - last[0] < PROGRESS_EVERY_S:
+            return
+        last[0] = time.monotonic()
+        if not _progress(req_id, worker, progress=report.summary()["deleted"]):
+            raise _Lost()
+
+    report = purge.Report(progress=on_batch)
+    report.tables = done  # counts carry over when a reclaimed request resumes
+    t0 = time.perf_counter()
+    if entity_type == "user":
+        purge.purge_users([entity_id], report)
+    else:
+        purge.purge_family(entity_id, report)
+    summary = report.summary()
+    _progress(req_id, worker, status="done", executed=True, progress=summary["deleted"], finished_at=_now())
+    print(f"🗑️ Deleted {entity_type} {entity_id} (request {req_id}): {sum(summary['deleted'].values())} rows "
+          f"in {summary['batches']} batches, {time.perf_counter() - t0:.1f}s")
+
+
+def _fail(req_id, worker, error):
+    with Session(engine) as session:
+        req = session.get(DeletionRequest, req_id)
+        attempts = req.attempts if req else MAX_ATTEMPTS
+    if attempts < MAX_ATTEMPTS:
+        _progress(req_id, worker, status="approved", worker=None, error=error)
+    else:
+        _progress(req_id, worker, status="failed", error=error, finished_at=_now())
+
+
+_lock = threading.Lock()
+
+
+def run_pending():
+    """Scheduled job (and kicked on approval): execute approved requests until none is left."""
+    if not _lock.acquire(blocking=False):
+        return {"executed": 0, "busy": True}  # this process is already on it
+    try:
+        worker = f"{socket.gethostname()}:{os.getpid()}"
+        executed = 0
+        while True:
+            req_id = claim(worker)
+            if req_id is None:
+                return {"executed": executed}
+            try:
+                run(req_id, worker)
+                executed += 1
+            except _Lost:
+                print(f"⚠️ Deletion request {req_id} was taken over by another worker")
+            except Exception as e:
+                traceback.print_exc()
+                _fail(req_id, worker, str(e))
+    finally:
+        _lock.release()
@@ -0,0 +1,329 @@
+# app/diagnostics.py
+"""
+Opt-in runtime diagnostics: event-loop stall detection and a per-request
+sampling profiler.
+
+Enable at boot with GPAY_DIAGNOSTICS=1, or at runtime (no redeploy) through
+POST /api/admin/diagnostics. Settings (all optional):
+
+    GPAY_DIAG_DIR              where stall reports and profiles are written (./diagnostics)
+    GPAY_LOOP_LAG_MS           loop lag that counts as a stall (100)
+    GPAY_PROFILE_ROUTES        comma separated path prefixes to profile, e.g. /api/upload
+    GPAY_PROFILE_HEADER        request header that turns profiling on (X-Profile)
+    GPAY_PROFILE_INTERVAL_MS   sampling interval of the profiler (5)
+
+Stalls are appended to <dir>/stalls.log with the stack of whatever was running
+on the loop thread. Profiles are written as collapsed stacks
+(`thread;frame;frame count`), ready for flamegraph.pl or speedscope.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+from fastapi import HTTPException
+
+
+def _env_list(name):
+    return [p.strip() for p in os.environ.get(name, "").split(",") if p.strip()]
+
+
+class DiagnosticsConfig:
+    def __init__(self):
+        self.enabled = os.environ.get("GPAY_DIAGNOSTICS", "0") == "1"
+        self.out_dir = os.environ.get("GPAY_DIAG_DIR", "diagnostics")
+        self.lag_ms = float(os.environ.get("GPAY_LOOP_LAG_MS", "100"))
+        self.profile_routes = _env_list("GPAY_PROFILE_ROUTES")
+        self.profile_header = os.environ.get("GPAY_PROFILE_HEADER", "X-Profile").lower()
+        self.profile_interval_ms = float(os.environ.get("GPAY_PROFILE_INTERVAL_MS", "5"))
+
+    def as_dict(self):
+        return {
+            "enabled": self.enabled,
+            "out_dir": self.out_dir,
+            "lag_ms": self.lag_ms,
+            "profile_routes": self.profile_routes,
+            "profile_header": self.profile_header,
+            "profile_interval_ms": self.profile_interval_ms,
+        }
+
+
+config = DiagnosticsConfig()
+
+# request label per asyncio task, so a stall can be pinned on a request
+_active_requests = {}
+_current_tasks = getattr(asyncio.tasks, "_current_tasks", {})
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _request_from_stack(frame):
+    """Fallback for tasks spawned inside a request (e.g. call_next): find the ASGI scope on the stack."""
+    while frame is not None:
+        scope = frame.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") == "http":
+            return f"{scope.get('method')} {scope.get('path')}"
+        frame = frame.f_back
+    return "-"
+
+
+def _write(name, text):
+    os.makedirs(config.out_dir, exist_ok=True)
+    path = os.path.join(config.out_dir, name)
+    with open(path, "a", encoding="utf8") as f:
+        f.write(text)
+    return path
+
+
+# ----------------------------
+# Loop lag monitor
+# ----------------------------
+class LoopMonitor:
+    """
+    A coroutine on the loop bumps a heartbeat every `interval`; a watchdog
+    thread notices when the heartbeat goes stale and grabs the loop thread's
+    stack while it is still stuck, which is the code that blocks the loop.
+    """
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.loop = None
+        self.loop_thread_id = None
+        self.heartbeat = time.monotonic()
+        self.task = None
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.recent = deque(maxlen=50)
+        self.max_lag_ms = 0.0
+
+    def start(self, loop):
+        if self.task and not self.task.done():
+            return
+        self.stop()  # make sure a previous watchdog is gone before starting another
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stop_event = threading.Event()  # per run: an old watchdog can never see it cleared
+        self.task = loop.create_task(self._beat())
+        self.thread = threading.Thread(target=self._watch, args=(self.stop_event,), name="gpay-loop-watchdog",
+                                       daemon=True)
+        self.thread.start()
+        print(f"🩺 Loop monitor started (stall threshold {config.lag_ms:.0f}ms)")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1)
+        self.thread = None
+
+    async def _beat(self):
+        while True:
+            before = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag_ms = (now - before - self.interval) * 1000
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            self.heartbeat = now
+
+    def _watch(self, stop_event):
+        reported_for = None
+        while not stop_event.wait(self.interval / 2):
+            stale_ms = (time.monotonic() - self.heartbeat) * 1000
+            if stale_ms < config.lag_ms:
+                continue
+            if reported_for == self.heartbeat:
+                continue  # already captured this stall
+            reported_for = self.heartbeat
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is not None:
+                self._report(stale_ms, frame)
+
+    def _report(self, stale_ms, frame):
+        task = _current_tasks.get(self.loop)
+        request = _active_requests.get(task) or _request_from_stack(frame)
+        stack = "".join(traceback.format_stack(frame))
+        entry = {
+            "at": datetime.utcnow().isoformat(),
+            "lag_ms": round(stale_ms, 1),
+            "request": request,
+            "task": task.get_name() if task else None,
+            "top": _frame_label(frame),
+        }
+        self.recent.append(entry)
+        _write("stalls.log",
+               f"=== {entry['at']} loop blocked >{entry['lag_ms']}ms "
+               f"request={request} task={entry['task']}\n{stack}\n")
+        print(f"⚠️ Event loop blocked >{entry['lag_ms']}ms in {request} at {entry['top']}")
+
+
+monitor = LoopMonitor()
+
+
+# ----------------------------
+# Sampling profiler
+# ----------------------------
+class StackSampler:
+    """Samples every thread (except its own) and counts collapsed stacks."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="gpay-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for t in threading.enumerate():
+                names[t.ident] = t.name
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.counts[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        return "".join(f"{stack} {n}\n" for stack, n in self.counts.most_common())
+
+
+def should_profile(path: str, headers: dict) -> bool:
+    if headers.get(config.profile_header) in ("1", "true", "yes"):
+        return True
+    return any(path.startswith(prefix) for prefix in config.profile_routes)
+
+
+def dump_profile(sampler: StackSampler, method: str, path: str, elapsed: float):
+    stamp = datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+    slug = path.strip("/").replace("/", "_") or "root"
+    name = f"profile-{stamp}-{method}-{slug}.collapsed"
+    out = _write(name, sampler.collapsed())
+    print(f"🔬 Profiled {method} {path}: {elapsed * 1000:.0f}ms, {sampler.samples} samples → {out}")
+    return out
+
+
+# ----------------------------
+# ASGI middleware
+# ----------------------------
+class DiagnosticsMiddleware:
+    """
+    Pure ASGI middleware so it costs nothing when diagnostics are off. When on,
+    it labels the running task with the request (for stall reports) and
+    profiles requests matching GPAY_PROFILE_ROUTES or the profile header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not config.enabled:
+            return await self.app(scope, receive, send)
+
+        if not monitor.task:
+            monitor.start(asyncio.get_running_loop())
+
+        method, path = scope["method"], scope["path"]
+        task = asyncio.current_task()
+        _active_requests[task] = f"{method} {path}"
+
+        sampler = None
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        if should_profile(path, headers):
+            sampler = StackSampler(config.profile_interval_ms / 1000).start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _active_requests.pop(task, None)
+            if sampler:
+                sampler.stop()
+                dump_profile(sampler, method, path, time.perf_counter() - started)
+
+
+def start():
+    """Called on app startup; only does anything when diagnostics are enabled."""
+    if config.enabled:
+        monitor.start(asyncio.get_running_loop())
+
+
+def _positive(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0:
+        raise ValueError("must be a positive number")
+    return float(value)
+
+
+def _routes(value):
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list) or not all(isinstance(p, str) for p in value):
+        raise ValueError("must be a list of path prefixes")
+    return [p.strip() for p in value if p.strip()]
+
+
+def _header(value):
+    if not isinstance(value, str) or not value.strip():
+        raise ValueError("must be a header name")
+    return value.strip().lower()
+
+
+def _flag(value):
+    if not isinstance(value, bool):
+        raise ValueError("must be true or false")
+    return value
+
+
+_SETTINGS = {"enabled": _flag, "lag_ms": _positive, "profile_routes": _routes, "profile_header": _header,
+             "profile_interval_ms": _positive}
+
+
+def configure(**changes):
+    """Update settings at runtime (from the admin endpoint); 400 and nothing changed on a bad value."""
+    checked = {}
+    for key, value in changes.items():
+        if value is None or key not in _SETTINGS:
+            continue
+        try:
+            checked[key] = _SETTINGS[key](value)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{key} {e}")
+    for key, value in checked.items():
+        setattr(config, key, value)
+    if config.enabled:
+        monitor.start(asyncio.get_running_loop())
+    else:
+        monitor.stop()
+    return config.as_dict()
+
+
+def status():
+    return {
+        **config.as_dict(),
+        "monitor_running": bool(monitor.task and not monitor.task.done()),
+        "max_lag_ms": round(monitor.max_lag_ms, 1),
+        "recent_stalls": list(monitor.recent),
+    }
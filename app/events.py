@@ -0,0 +1,172 @@
+# app/events.py
+"""
+Dashboard push events.
+
+Writers publish small events ("something changed, here is what") on
+channels named user:<id> and family:<id>; GET /api/events streams them to
+the browser as Server-Sent Events, so dashboards refresh when data changes
+instead of polling. An idle connection does no database work.
+
+Events that describe a write are queued on the session with on_commit() and
+only go out once that session commits (a rolled-back write publishes
+nothing). The broker is in-process (LocalBroker): every app process only
+reaches its own subscribers. A deployment with several processes swaps in
+another Broker with set_broker() (e.g. one backed by Redis pub/sub); the
+publish and subscribe calls stay the same.
+"""
+
+import asyncio
+import itertools
+import json
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession
+
+REPLAY = 100  # recent events kept per channel for clients reconnecting with Last-Event-ID
+QUEUE_SIZE = 256
+
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+def family_channel(family_id: int) -> str:
+    return f"family:{family_id}"
+
+
+class Subscription:
+    def __init__(self, channels, loop):
+        self.channels = tuple(channels)
+        self.loop = loop
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    def _put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            # too slow to keep up: tell the client to refetch instead of blocking publishers
+            self.overflowed = True
+
+    async def get(self, timeout: float):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class Broker(ABC):
+    """Pub/sub interface used by the rest of the app."""
+
+    @abstractmethod
+    def publish(self, channel: str, type_: str, data: dict):
+        ...
+
+    @abstractmethod
+    def subscribe(self, channels, last_event_id: int | None = None) -> Subscription:
+        ...
+
+    @abstractmethod
+    def unsubscribe(self, sub: Subscription):
+        ...
+
+
+class LocalBroker(Broker):
+    """In-process broker. publish() may be called from any thread; subscribers live on the event loop."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subs = {}  # channel -> set of Subscription
+        self._recent = {}  # channel -> deque of events
+        self._ids = itertools.count(1)
+
+    def publish(self, channel, type_, data):
+        with self._lock:
+            item = {"id": next(self._ids), "channel": channel, "type": type_, "data": data}
+            self._recent.setdefault(channel, deque(maxlen=REPLAY)).append(item)
+            subs = list(self._subs.get(channel, ()))
+        for sub in subs:
+            try:
+                sub.loop.call_soon_threadsafe(sub._put, item)
+            except RuntimeError:
+                pass  # the subscriber's loop is gone; it unsubscribes on its way out
+        return item["id"]
+
+    def subscribe(self, channels, last_event_id=None):
+        sub = Subscription(channels, asyncio.get_running_loop())
+        with self._lock:
+            for ch in sub.channels:
+                self._subs.setdefault(ch, set()).add(sub)
+            if last_event_id is not None:
+                missed = sorted(
+                    (e for ch in sub.channels for e in self._recent.get(ch, ()) if e["id"] > last_event_id),
+                    key=lambda e: e["id"],
+                )
+                for item in missed:
+                    sub._put(item)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for ch in sub.channels:
+                subs = self._subs.get(ch)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._subs[ch]
+
+
+_broker: Broker = LocalBroker()
+
+
+def set_broker(broker: Broker):
+    global _broker
+    _broker = broker
+
+
+def broker() -> Broker:
+    return _broker
+
+
+def publish(channel: str, type_: str, data: dict | None = None):
+    try:
+        return _broker.publish(channel, type_, data or {})
+    except Exception as e:
+        # a push is a hint, never a reason to fail the write that caused it
+        print(f"⚠️ Event {type_} on {channel} not published: {e}")
+
+
+# ----------------------------
+# Publish on commit
+# ----------------------------
+def on_commit(session, channel: str, type_: str, data: dict | None = None):
+    """Publish once `session` commits; dropped if it rolls back."""
+    session.info.setdefault("pending_events", []).append((channel, type_, data))
+
+
+def announce_paid(session, txns):
+    """Tell each owner's dashboard which of their transactions were marked paid."""
+    by_user = {}
+    for t in txns:
+        by_user.setdefault(t.user_id, []).append(t.id)
+    for user_id, ids in by_user.items():
+        on_commit(session, user_channel(user_id), "transactions", {"paid": ids})
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _flush_events(session):
+    for channel, type_, data in session.info.pop("pending_events", ()):
+        publish(channel, type_, data)
+
+
+@event.listens_for(OrmSession, "after_transaction_end")
+def _drop_events(session, transaction):
+    if transaction.parent is None:  # rolled back or closed without commit (a commit has already flushed)
+        session.info.pop("pending_events", None)
+
+
+# ----------------------------
+# SSE framing
+# ----------------------------
+def format_sse(item: dict) -> str:
+    payload = json.dumps({"channel": item["channel"], **item["data"]}, default=str)
+    return f"id: {item['id']}\nevent: {item['type']}\ndata: {payload}\n\n"
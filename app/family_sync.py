@@ -0,0 +1,146 @@
+# app/family_sync.py
+"""
+Incremental sync of a family's shared-transaction feed.
+
+Each family has a change sequence (family.change_seq). Every write that
+changes what the feed shows (sharing, marking paid, deleting, archiving)
+takes the next number inside its own transaction and stamps it on the
+touched rows (transaction.sync_seq) or, for rows leaving the hot table, on a
+TransactionTombstone, and announces it on the family's event channel. Bumping the family row serialises writers per family,
+so sequence numbers are committed in order and a client that has seen
+everything up to N only ever needs the rows with a higher number:
+
+    GET /api/transactions/family/sync?since=N
+    -> {"seq": M, "reset": false, "changes": [...], "deleted": [ids]}
+
+since=0 (or a watermark older than the pruned tombstones, reported as
+reset=true) returns the whole feed. Tombstones are kept for
+GPAY_SYNC_TOMBSTONE_DAYS (default 30).
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from sqlalchemy import delete, func, update
+from sqlmodel import Session, select
+from app.db import engine
+from app.models import Family, Transaction, TransactionTombstone
+from app import events
+
+TOMBSTONE_DAYS = float(os.environ.get("GPAY_SYNC_TOMBSTONE_DAYS", "30"))
+
+FEED_COLUMNS = (
+    Transaction.id, Transaction.user_id, Transaction.txn_id, Transaction.date, Transaction.amount,
+    Transaction.amount_paise, Transaction.merchant, Transaction.category, Transaction.note,
+    Transaction.paid, Transaction.week_paid, Transaction.sync_seq, Transaction.shared,
+)
+
+
+# ----------------------------
+# Write side (call inside the writer's transaction, before commit)
+# ----------------------------
+def next_seq(session, family_id: int) -> int:
+    """Take the family's next sequence number; holds the family row lock until commit."""
+    session.execute(update(Family).where(Family.id == family_id).values(change_seq=Family.change_seq + 1))
+    return session.exec(select(Family.change_seq).where(Family.id == family_id)).one()
+
+
+def touch(session, family_id: int, txn_ids):
+    """Mark rows as changed for the family feed."""
+    txn_ids = list(txn_ids)
+    if not txn_ids or family_id is None:
+        return None
+    session.flush()
+    seq = next_seq(session, family_id)
+    session.execute(update(Transaction).where(Transaction.id.in_(txn_ids)).values(sync_seq=seq))
+    events.on_commit(session, events.family_channel(family_id), "feed", {"seq": seq})
+    return seq
+
+
+def touch_many(session, txns):
+    """touch() for the shared ones among ORM transactions that may belong to several families."""
+    by_family = {}
+    for t in txns:
+        if not t.shared:
+            continue  # not in any feed
+        by_family.setdefault(t.family_id, []).append(t.id)
+    for family_id, ids in by_family.items():
+        touch(session, family_id, ids)
+
+
+def tombstone(session, family_id: int, txn_ids, reason: str = "deleted"):
+    """Record rows leaving the hot table."""
+    txn_ids = list(txn_ids)
+    if not txn_ids or family_id is None:
+        return None
+    seq = next_seq(session, family_id)
+    session.add_all(TransactionTombstone(family_id=family_id, txn_id=i, seq=seq, reason=reason) for i in txn_ids)
+    events.on_commit(session, events.family_channel(family_id), "feed", {"seq": seq})
+    return seq
+
+
+# ----------------------------
+# Read side
+# ----------------------------
+def _row(r):
+    return {
+        "id": r.id,
+        "user_id": r.user_id,
+        "txn_id": r.txn_id,
+        "date": r.date.isoformat(),
+        "amount": r.amount,
+        "amount_paise": r.amount_paise,
+        "merchant": r.merchant,
+        "category": r.category,
+        "note": r.note,
+        "paid": r.paid,
+        "week_paid": r.week_paid,
+        "seq": r.sync_seq,
+    }
+
+
+def changes(family_id: int, since: int = 0) -> dict:
+    with Session(engine) as session:
+        # watermark first: anything committed after this read is (re)sent next time, never skipped
+        family = session.exec(
+            select(Family.change_seq, Family.sync_floor).where(Family.id == family_id)
+        ).first()
+        if family is None:
+            raise HTTPException(404, "Family not found")
+        seq, floor = family
+        reset = since <= 0 or since < floor or since > seq
+        q = select(*FEED_COLUMNS).where(Transaction.family_id == family_id)
+        if reset:
+            rows = session.exec(q.where(Transaction.shared == True).order_by(Transaction.id)).all()
+            return {"seq": seq, "reset": True, "changes": [_row(r) for r in rows], "deleted": []}
+
+        rows = session.exec(q.where(Transaction.sync_seq > since).order_by(Transaction.sync_seq, Transaction.id)).all()
+        gone = session.exec(
+            select(TransactionTombstone.txn_id)
+            .where(TransactionTombstone.family_id == family_id, TransactionTombstone.seq > since)
+        ).all()
+    return {
+        "seq": seq,
+        "reset": False,
+        "changes": [_row(r) for r in rows if r.shared],
+        "deleted": sorted({*gone, *(r.id for r in rows if not r.shared)}),
+    }
+
+
+def prune_tombstones(days: float | None = None):
+    """Scheduled job: drop old tombstones and raise each family's sync floor past them."""
+    days = TOMBSTONE_DAYS if days is None else days
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).replace(tzinfo=None)
+    with Session(engine) as session:
+        floors = session.exec(
+            select(TransactionTombstone.family_id, func.max(TransactionTombstone.seq))
+            .where(TransactionTombstone.deleted_at < cutoff)
+            .group_by(TransactionTombstone.family_id)
+        ).all()
+        for family_id, floor in floors:
+            session.execute(update(Family).where(Family.id == family_id, Family.sync_floor < floor)
+                            .values(sync_floor=floor))
+            session.execute(delete(TransactionTombstone).where(
+                TransactionTombstone.family_id == family_id, TransactionTombstone.seq <= floor))
+        session.commit()
+    return {"families": len(floors)}
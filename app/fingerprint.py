@@ -0,0 +1,159 @@
+# app/fingerprint.py
+"""
+Transaction fingerprints and the per-user Bloom filter used to dedup imports.
+
+A fingerprint is a 16-byte BLAKE2b digest of the canonical record
+(statement txn id, timestamp, amount in paise, and the normalized merchant
+when the statement has no txn id). It is stored in `transaction.fingerprint`
+under a unique index; `txn_hash` holds the same digest as hex for older
+readers.
+
+Re-uploading overlapping monthly statements is the normal case, so each
+worker keeps a Bloom filter of every fingerprint a user already has, loaded
+from the database the first time that user imports. Rows the filter has
+never seen are new for certain and are inserted without an existence check;
+only the "maybe" rows are looked up, in one batched query. The unique index
+stays the final word (another worker may have inserted a row this filter
+has not seen), so a stale filter costs a lookup, never a duplicate.
+"""
+
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import select as sa_select
+from app.models import Transaction
+from app.merchants import normalize
+from app import archive
+
+DIGEST_SIZE = 16
+BLOOM_ERROR_RATE = float(os.environ.get("GPAY_BLOOM_ERROR_RATE", "0.01"))
+BLOOM_MAX_USERS = int(os.environ.get("GPAY_BLOOM_USERS", "256"))
+LOOKUP_CHUNK = 500
+
+
+# ----------------------------
+# Canonical record / digest
+# ----------------------------
+def canonical(txn_id: str | None, dt: datetime, amount_paise: int, merchant: str | None = None) -> bytes:
+    txn_id = (txn_id or "").strip()
+    if dt.tzinfo is not None:
+        dt = dt.replace(tzinfo=None)
+    parts = [txn_id, dt.isoformat(), str(int(amount_paise))]
+    if not txn_id:
+        # without a statement id, same-day same-amount payments differ only by payee
+        parts.append(normalize(merchant) or "")
+    return "\x1f".join(parts).encode("utf8")
+
+
+def digest(txn_id: str | None, dt: datetime, amount_paise: int, merchant: str | None = None) -> bytes:
+    return hashlib.blake2b(canonical(txn_id, dt, amount_paise, merchant), digest_size=DIGEST_SIZE).digest()
+
+
+# ----------------------------
+# Bloom filter
+# ----------------------------
+class BloomFilter:
+    """Fixed-size Bloom filter over fingerprints (already uniform, so no extra hashing)."""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        self.capacity = max(capacity, 1024)
+        self.bits = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / self.capacity * math.log(2)))
+        self.array = bytearray((self.bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fp: bytes):
+        # double hashing: two 64-bit halves of the digest give k probe positions
+        h1 = int.from_bytes(fp[:8], "little")
+        h2 = int.from_bytes(fp[8:16], "little") | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def add(self, fp: bytes):
+        for p in self._positions(fp):
+            self.array[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, fp: bytes):
+        return all(self.array[p >> 3] & (1 << (p & 7)) for p in self._positions(fp))
+
+    @property
+    def full(self):
+        return self.count > self.capacity
+
+
+_filters = OrderedDict()  # user_id -> BloomFilter, least recently used first
+_lock = threading.Lock()
+
+
+def _user_fingerprints(session, user_id):
+    txn = archive.unified_transactions()
+    q = sa_select(txn.c.fingerprint).where(txn.c.user_id == user_id, txn.c.fingerprint.is_not(None))
+    return session.execute(q).scalars().all()
+
+
+def user_filter(session, user_id: int) -> BloomFilter:
+    """The user's filter, warmed from the database on first use (or once it outgrows its size)."""
+    with _lock:
+        bloom = _filters.get(user_id)
+        if bloom is not None and not bloom.full:
+            _filters.move_to_end(user_id)
+            return bloom
+
+    fps = _user_fingerprints(session, user_id)
+    bloom = BloomFilter(capacity=2 * len(fps))
+    for fp in fps:
+        bloom.add(fp)
+    with _lock:
+        _filters[user_id] = bloom
+        _filters.move_to_end(user_id)
+        while len(_filters) > BLOOM_MAX_USERS:
+            _filters.popitem(last=False)
+    return bloom
+
+
+def remember(user_id: int, fps):
+    """Add freshly inserted fingerprints to the user's filter, if it is loaded."""
+    with _lock:
+        bloom = _filters.get(user_id)
+    if bloom is not None:
+        for fp in fps:
+            bloom.add(fp)
+
+
+def forget(user_id: int | None = None):
+    with _lock:
+        if user_id is None:
+            _filters.clear()
+        else:
+            _filters.pop(user_id, None)
+
+
+# ----------------------------
+# Existence check
+# ----------------------------
+def existing(session, candidates: dict) -> set:
+    """
+    Which of `candidates` ({fingerprint: transaction date}) are already stored,
+    in the hot table or in the archive partition for that date's month.
+    """
+    found = set()
+    hot = Transaction.__table__
+    fps = list(candidates)
+    for i in range(0, len(fps), LOOKUP_CHUNK):
+        chunk = fps[i:i + LOOKUP_CHUNK]
+        found.update(session.execute(sa_select(hot.c.fingerprint).where(hot.c.fingerprint.in_(chunk))).scalars())
+
+    months = set(archive.partitions())
+    by_month = {}
+    for fp, dt in candidates.items():
+        if fp not in found and archive.month_of(dt) in months:
+            by_month.setdefault(archive.month_of(dt), []).append(fp)
+    for month, fps in by_month.items():
+        t = archive.archive_table(month)
+        for i in range(0, len(fps), LOOKUP_CHUNK):
+            chunk = fps[i:i + LOOKUP_CHUNK]
+            found.update(session.execute(sa_select(t.c.fingerprint).where(t.c.fingerprint.in_(chunk))).scalars())
+    return found
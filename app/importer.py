@@ -0,0 +1,134 @@
+# app/importer.py
+"""
+Import parsed statement records for a user.
+
+Records are dicts as produced by the upload parsers: {"id", "date",
+"amount", "merchant"}. Each one is normalized, fingerprinted and checked
+against the user's Bloom filter; only rows the filter may have seen are
+looked up, in one batched query, and everything new is inserted in a
+single transaction. Records that cannot be normalized (an amount like
+"N/A", a missing or unparseable date) are skipped and counted as invalid
+rather than failing the batch; an undated row never gets a made-up
+timestamp, which would fingerprint differently on every upload.
+"""
+
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session
+from app.db import engine
+from app.models import Transaction
+from app.merchants import intern_many
+from app.money import to_paise, rupees
+from app.analytics import snapshot
+from app import fingerprint
+
+INSERT_CHUNK = 500
+
+
+def _parse_date(value):
+    """ISO date of a record; ValueError when missing or unparseable (the date is part of the fingerprint)."""
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except TypeError:
+        raise ValueError(f"Missing date: {value!r}")
+
+
+def _fields(r):
+    txn_id = r.get("id") or ""
+    dt = _parse_date(r.get("date"))
+    amount_paise = to_paise(r.get("amount"))
+    merchant = r.get("merchant") or ""
+    return txn_id, dt, amount_paise, merchant, fingerprint.digest(txn_id, dt, amount_paise, merchant)
+
+
+def _try_fields(r):
+    """_fields(r), or None when the record cannot be imported."""
+    try:
+        return _fields(r)
+    except (AttributeError, TypeError, ValueError, ArithmeticError):
+        return None
+
+
+def merge_records(record_lists):
+    """
+    Concatenate the records of several statements, keeping the first of any
+    rows that share a fingerprint (overlapping monthly exports); returns
+    (records, repeats dropped). Invalid records are kept for import_records
+    to count.
+    """
+    seen = set()
+    merged = []
+    for records in record_lists:
+        for r in records:
+            fields = _try_fields(r)
+            if fields is None:
+                merged.append(r)
+            elif fields[-1] not in seen:
+                seen.add(fields[-1])
+                merged.append(r)
+    return merged, sum(map(len, record_lists)) - len(merged)
+
+
+def normalize_records(user, records):
+    """
+    Parsed records -> ({fingerprint: row values}, invalid count); repeats
+    within the file collapse to one.
+    """
+    valid = [f for f in map(_try_fields, records) if f is not None]
+    interned = intern_many(merchant for _, _, _, merchant, _ in valid)
+    rows = {}
+    for txn_id, dt, amount_paise, merchant, fp in valid:
+        merchant_id, category = interned[merchant]
+        rows.setdefault(fp, {
+            "user_id": user.id,
+            "family_id": user.family_id,
+            "txn_id": txn_id,
+            "txn_hash": fp.hex(),
+            "fingerprint": fp,
+            "date": dt,
+            "amount": rupees(amount_paise),
+            "amount_paise": amount_paise,
+            "merchant": merchant,
+            "merchant_id": merchant_id,
+            "category": category,
+            "type": "debit",
+            "description": merchant,
+        })
+    return rows, len(records) - len(valid)
+
+
+def _insert_new(session, rows):
+    """INSERT ... ON CONFLICT DO NOTHING, returning the fingerprints that went in."""
+    dialect = session.get_bind().dialect.name
+    table = Transaction.__table__
+    if dialect == "postgresql":
+        stmt = postgresql.insert(table).on_conflict_do_nothing()
+    elif dialect == "sqlite":
+        stmt = sqlite.insert(table).on_conflict_do_nothing()
+    else:
+        stmt = insert(table)
+    inserted = []
+    for i in range(0, len(rows), INSERT_CHUNK):
+        chunk = rows[i:i + INSERT_CHUNK]
+        inserted.extend(session.execute(stmt.returning(table.c.fingerprint), chunk).scalars())
+    return inserted
+
+
+def import_records(user, records):
+    """Insert the user's new records; returns {"imported", "duplicates", "invalid"}."""
+    rows, invalid = normalize_records(user, records)
+    with Session(engine) as session:
+        bloom = fingerprint.user_filter(session, user.id)
+        maybe = {fp: row["date"] for fp, row in rows.items() if fp in bloom}
+        known = fingerprint.existing(session, maybe) if maybe else set()
+        new = [row for fp, row in rows.items() if fp not in known]
+        inserted = _insert_new(session, new) if new else []
+        session.commit()
+
+    fingerprint.remember(user.id, inserted)
+    if inserted:
+        snapshot.mark_dirty(user.family_id)
+    return {"imported": len(inserted), "duplicates": len(records) - invalid - len(inserted), "invalid": invalid}
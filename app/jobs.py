@@ -0,0 +1,325 @@
+# app/jobs.py
+"""
+Background statement imports.
+
+upload() spools the file under GPAY_UPLOAD_SPOOL/jobs, inserts an ImportJob
+row and answers at once with the job id. Every app process runs a small pool
+of worker threads (GPAY_IMPORT_WORKERS, default 2) that claim queued jobs
+straight from that table with a conditional UPDATE, so the database is the
+queue and no broker is needed. A worker parses the file and imports it in
+batches, writing progress (rows parsed, imported, duplicates, records done)
+to the row after each batch; clients poll GET /api/import-jobs/{id}.
+A spooled zip is a multi-file batch (app/batches.py) imported as one job.
+
+Jobs are idempotent and resumable: the same file sent again while its job
+is still pending returns that job, and a job whose worker stopped
+heartbeating (a restart or crash) is reclaimed and continues from
+records_done, up to MAX_ATTEMPTS times; after that it is marked failed.
+Parsing a big PDF can take longer than GPAY_IMPORT_STALE_S, so a side
+thread keeps the heartbeat going while it runs. Rows imported just before a
+crash are skipped by the fingerprint dedup, so a replayed batch never
+duplicates anything.
+"""
+
+import hashlib
+import os
+import socket
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import or_, and_, update
+from sqlmodel import Session, select
+from app.db import engine
+from app.models import ImportJob, User
+from app.importer import import_records, merge_records
+from app import batches, parse_cache, events
+from app.analytics import snapshot
+
+WORKERS = int(os.environ.get("GPAY_IMPORT_WORKERS", "2"))
+POLL_S = float(os.environ.get("GPAY_IMPORT_POLL_S", "1"))
+BATCH = int(os.environ.get("GPAY_IMPORT_BATCH", "1000"))
+STALE_S = float(os.environ.get("GPAY_IMPORT_STALE_S", "120"))
+MAX_ATTEMPTS = 3
+JOB_DIR = os.path.join(os.environ.get("GPAY_UPLOAD_SPOOL", "spool"), "jobs")  # next to the chunk spool
+PENDING = ("queued", "running")
+
+_wake = threading.Event()
+_stop = threading.Event()
+_threads = []
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def job_path(job_id: str) -> str:
+    return os.path.join(JOB_DIR, f"{job_id}.bin")
+
+
+def describe(job: ImportJob) -> dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "filename": job.filename,
+        "rows_parsed": job.rows_parsed,
+        "imported": job.imported,
+        "duplicates": job.duplicates,
+        "invalid": job.invalid,
+        "attempts": job.attempts,
+        "error": job.error,
+        "files": job.files,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+# ----------------------------
+# Enqueue / query
+# ----------------------------
+def enqueue(user, content: bytes, filename: str | None) -> dict:
+    """Spool `content` and queue an import; returns the pending job for the same file if there is one."""
+    digest = hashlib.sha256(content).hexdigest()
+    os.makedirs(JOB_DIR, exist_ok=True)
+    tmp = os.path.join(JOB_DIR, f"{uuid.uuid4().hex}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(content)
+    return enqueue_file(user, tmp, filename, digest)
+
+
+def enqueue_file(user, path: str, filename: str | None, digest: str) -> dict:
+    """Queue an import of a file already on disk; the file is moved into the job spool."""
+    with Session(engine) as session:
+        pending = session.exec(
+            select(ImportJob).where(ImportJob.user_id == user.id, ImportJob.sha256 == digest,
+                                    ImportJob.status.in_(PENDING))
+        ).first()
+        if pending:
+            os.remove(path)
+            return describe(pending)
+
+        job = ImportJob(id=uuid.uuid4().hex, user_id=user.id, filename=filename or "statement", sha256=digest)
+        os.makedirs(JOB_DIR, exist_ok=True)
+        os.replace(path, job_path(job.id))
+        session.add(job)
+        session.commit()
+        session.refresh(job)
+        result = describe(job)
+    _wake.set()
+    return result
+
+
+def get(user, job_id: str):
+    """The job if `user` may see it: its owner, an admin of the owner's family, or a superadmin."""
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        if not job:
+            return None
+        if job.user_id != user.id and user.role != "superadmin":
+            owner_family = session.exec(select(User.family_id).where(User.id == job.user_id)).first()
+            if user.role != "admin" or user.family_id is None or owner_family != user.family_id:
+                return None
+        return describe(job)
+
+
+def recent(user, limit: int = 20):
+    with Session(engine) as session:
+        jobs = session.exec(
+            select(ImportJob).where(ImportJob.user_id == user.id)
+            .order_by(ImportJob.created_at.desc()).limit(limit)
+        ).all()
+        return [describe(j) for j in jobs]
+
+
+# ----------------------------
+# Worker side
+# ----------------------------
+def claim(worker: str):
+    """
+    Take the oldest runnable job (queued, or running with a dead worker). Safe
+    across processes. A job whose workers died MAX_ATTEMPTS times is failed
+    instead of being retried forever.
+    """
+    stale = (_now() - timedelta(seconds=STALE_S)).replace(tzinfo=None)
+    dead = and_(ImportJob.status == "running", ImportJob.heartbeat_at < stale)
+    runnable = or_(
+        ImportJob.status == "queued",
+        and_(dead, ImportJob.attempts < MAX_ATTEMPTS),
+    )
+    with Session(engine) as session:
+        gave_up = session.execute(
+            update(ImportJob).where(dead, ImportJob.attempts >= MAX_ATTEMPTS).values(
+                status="failed", worker=None, finished_at=_now(),
+                error=f"Worker stopped during the import {MAX_ATTEMPTS} times",
+            )
+        ).rowcount
+        session.commit()
+        if gave_up:
+            print(f"⚠️ Gave up on {gave_up} import jobs whose workers kept dying")
+        candidates = session.exec(
+            select(ImportJob.id).where(runnable).order_by(ImportJob.created_at).limit(5)
+        ).all()
+        for job_id in candidates:
+            now = _now()
+            won = session.execute(
+                update(ImportJob).where(ImportJob.id == job_id, runnable).values(
+                    status="running", worker=worker, heartbeat_at=now, attempts=ImportJob.attempts + 1,
+                    started_at=now, error=None,
+                )
+            ).rowcount
+            session.commit()
+            if won:
+                return job_id
+    return None
+
+
+def _progress(job_id, owner, **values):
+    """Record progress; False if another worker has taken the job over meanwhile."""
+    with Session(engine) as session:
+        ok = session.execute(
+            update(ImportJob).where(ImportJob.id == job_id, ImportJob.worker == owner)
+            .values(heartbeat_at=_now(), **values)
+        ).rowcount
+        session.commit()
+        return bool(ok)
+
+
+class _Heartbeat:
+    """Keep a claimed job's heartbeat fresh from a side thread during a long step (parsing)."""
+
+    def __init__(self, job_id, worker):
+        self.job_id, self.worker = job_id, worker
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"import-heartbeat-{job_id[:8]}", daemon=True)
+
+    def _run(self):
+        while not self._done.wait(STALE_S / 4):
+            if not _progress(self.job_id, self.worker):
+                return  # taken over; the main thread finds out at its next _progress
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._done.set()
+        self._thread.join()
+
+
+def _finish(job_id, worker, status, error=None):
+    finished = _progress(job_id, worker, status=status, error=error, finished_at=_now())
+    try:
+        os.remove(job_path(job_id))
+    except FileNotFoundError:
+        pass
+    if finished:
+        _announce(job_id)
+
+
+def _announce(job_id):
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        family_id = session.exec(select(User.family_id).where(User.id == job.user_id)).first()
+        result = describe(job)
+    events.publish(events.user_channel(job.user_id), "import", result)
+    if family_id is not None and result["imported"]:
+        events.publish(events.family_channel(family_id), "transactions",
+                       {"user_id": job.user_id, "imported": result["imported"]})
+
+
+def run(job_id: str, worker: str):
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        user = session.get(User, job.user_id)
+        start, digest = job.records_done, job.sha256
+
+    path, files, repeats = job_path(job_id), None, 0
+    with _Heartbeat(job_id, worker):  # a big PDF can parse for longer than STALE_S
+        if batches.is_archive(path):
+            try:
+                parsed, files = batches.parse_archive(path)
+            except ValueError as e:
+                _finish(job_id, worker, "failed", str(e))
+                return
+            records, repeats = merge_records(parsed)
+        else:
+            with open(path, "rb") as f:
+                content = f.read()
+            try:
+                _, records = parse_cache.parse(content, digest)  # a file seen before skips parsing
+            except Exception as e:
+                print(f"⚠️ Import job {job_id}: could not read statement: {e}")
+                records = []
+    if not records:
+        _progress(job_id, worker, files=files)
+        _finish(job_id, worker, "failed", "Could not parse file")
+        return
+    progress = {"rows_parsed": len(records) + repeats, "files": files}
+    if start == 0:
+        progress["duplicates"] = repeats  # rows repeated across the batch's files
+    if not _progress(job_id, worker, **progress):
+        return
+
+    for i in range(start, len(records), BATCH):
+        if _stop.is_set():
+            # shutting down: hand the job back; the next worker resumes at records_done
+            _progress(job_id, worker, status="queued", worker=None)
+            return
+        result = import_records(user, records[i:i + BATCH])
+        if not _progress(job_id, worker, records_done=min(i + BATCH, len(records)),
+                         imported=ImportJob.imported + result["imported"],
+                         duplicates=ImportJob.duplicates + result["duplicates"],
+                         invalid=ImportJob.invalid + result["invalid"]):
+            return  # reclaimed by another worker after we looked dead
+
+    _finish(job_id, worker, "done")
+    snapshot.refresh_family(user.family_id)
+
+
+def _fail(job_id, worker, error):
+    with Session(engine) as session:
+        job = session.get(ImportJob, job_id)
+        attempts = job.attempts if job else MAX_ATTEMPTS
+    if attempts < MAX_ATTEMPTS:
+        _progress(job_id, worker, status="queued", worker=None, error=error)
+    else:
+        _finish(job_id, worker, "failed", error)
+
+
+def _worker_loop(worker):
+    while not _stop.is_set():
+        job_id = None
+        try:
+            job_id = claim(worker)
+            if job_id:
+                run(job_id, worker)
+                continue
+        except Exception as e:
+            traceback.print_exc()
+            if job_id:
+                _fail(job_id, worker, str(e))
+        _wake.wait(POLL_S)
+        _wake.clear()
+
+
+def start(workers: int | None = None):
+    n = WORKERS if workers is None else workers
+    if n <= 0 or _threads:
+        return
+    _stop.clear()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    for i in range(n):
+        t = threading.Thread(target=_worker_loop, args=(f"{prefix}:{i}",), name=f"import-worker-{i}", daemon=True)
+        t.start()
+        _threads.append(t)
+    print(f"📥 Import workers: {n}")
+
+
+def stop(timeout: float = 10):
+    _stop.set()
+    _wake.set()
+    for t in _threads:
+        t.join(timeout)
+    _threads.clear()
+    batches.shutdown()
@@ -0,0 +1,115 @@
+# app/ledger.py
+"""
+Payments between family members and what they settle.
+
+A payment settles specific transactions through PaymentAllocation rows
+(payment -> transaction, amount), indexed both ways, instead of a JSON list
+on the payment. record_payment() creates the payment, its allocations and
+the paid flags on the settled transactions in one transaction: a
+transaction that is not the payee's, not shared, or already paid (or paid
+concurrently) aborts the whole payment, so nothing is half-settled and no
+transaction is settled twice.
+
+balances() answers "what does payer X still owe payee Y" from the cached
+unpaid totals (app/aggregates.py) and the indexed payment sums, without
+reading individual transactions.
+"""
+
+from fastapi import HTTPException
+from sqlalchemy import func, update
+from sqlmodel import select
+from app.models import Payment, PaymentAllocation, SharedAggregate, Transaction, User
+from app.money import rupees
+from app import aggregates, events, family_sync, settlement
+
+
+def paid(session, txns):
+    """Bookkeeping for transactions that just went from unpaid to paid; call before commit."""
+    family_sync.touch_many(session, txns)
+    aggregates.paid(session, txns)
+    settlement.paid(session, txns)
+    events.announce_paid(session, txns)
+
+
+def record_payment(session, payer, payee_id: int, amount_paise: int | None, txn_ids) -> Payment:
+    """Create a payment settling `txn_ids`; the caller commits. amount defaults to their sum."""
+    payee = session.get(User, payee_id)
+    if payee is None or payee.family_id is None or payee.family_id != payer.family_id:
+        raise HTTPException(404, "Payee not found in your family")
+    txn_ids = sorted(set(txn_ids))
+
+    txns = []
+    if txn_ids:
+        txns = session.exec(select(Transaction).where(Transaction.id.in_(txn_ids))).all()
+        bad = [t.id for t in txns if t.user_id != payee_id or not t.shared or t.paid]
+        missing = set(txn_ids) - {t.id for t in txns}
+        if bad or missing:
+            raise HTTPException(409, {"message": "Some transactions cannot be settled by this payment",
+                                      "transactions": sorted([*bad, *missing])})
+        # conditional update: a concurrent payment or markPaid on the same rows makes this one fail
+        settled = session.execute(
+            update(Transaction)
+            .where(Transaction.id.in_(txn_ids), Transaction.paid == False)
+            .values(paid=True)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if settled != len(txn_ids):
+            session.rollback()
+            raise HTTPException(409, "Some transactions were settled concurrently; reload and retry")
+
+    if amount_paise is None:
+        amount_paise = sum(t.amount_paise or 0 for t in txns)
+    if amount_paise <= 0:
+        raise HTTPException(400, "Payment amount must be positive")
+
+    payment = Payment(payer_id=payer.id, payee_id=payee_id, amount=rupees(amount_paise),
+                      amount_paise=amount_paise, txn_refs=txn_ids)
+    session.add(payment)
+    session.flush()
+    session.add_all(PaymentAllocation(payment_id=payment.id, transaction_id=t.id, amount_paise=t.amount_paise or 0)
+                    for t in txns)
+
+    paid(session, txns)
+    announced = {"payment_id": payment.id, "payer_id": payer.id, "payee_id": payee_id, "amount": payment.amount,
+                 "settled": txn_ids}
+    for uid in {payer.id, payee_id}:
+        events.on_commit(session, events.user_channel(uid), "payment", announced)
+    return payment
+
+
+def balances(session, payer_id: int, payee_ids) -> dict:
+    """
+    {payee_id: {"owed", "paid", "allocated", "credit", "outstanding"}} in paise:
+    owed is the payee's unpaid shared spending, credit the part of payer's
+    payments not tied to any transaction, outstanding = owed - credit.
+    """
+    payee_ids = list(payee_ids)
+    if not payee_ids:
+        return {}
+    owed = dict(session.exec(
+        select(SharedAggregate.user_id, func.sum(SharedAggregate.unpaid_paise))
+        .where(SharedAggregate.user_id.in_(payee_ids)).group_by(SharedAggregate.user_id)
+    ).all())
+    paid = dict(session.exec(
+        select(Payment.payee_id, func.sum(Payment.amount_paise))
+        .where(Payment.payer_id == payer_id, Payment.payee_id.in_(payee_ids)).group_by(Payment.payee_id)
+    ).all())
+    allocated = dict(session.exec(
+        select(Payment.payee_id, func.sum(PaymentAllocation.amount_paise))
+        .join(PaymentAllocation, PaymentAllocation.payment_id == Payment.id)
+        .where(Payment.payer_id == payer_id, Payment.payee_id.in_(payee_ids)).group_by(Payment.payee_id)
+    ).all())
+    out = {}
+    for pid in payee_ids:
+        o, p, a = owed.get(pid) or 0, paid.get(pid) or 0, allocated.get(pid) or 0
+        credit = max(p - a, 0)
+        out[pid] = {"owed": o, "paid": p, "allocated": a, "credit": credit, "outstanding": o - credit}
+    return out
+
+
+def settled_by(session, txn_ids) -> dict:
+    """{transaction_id: payment_id} for the given transactions that a payment settled."""
+    return dict(session.exec(
+        select(PaymentAllocation.transaction_id, PaymentAllocation.payment_id)
+        .where(PaymentAllocation.transaction_id.in_(list(txn_ids)))
+    ).all())
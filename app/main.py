@@ -1,21 +1,45 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import RedirectResponse
-from sqlmodel import Session, select
-from passlib.hash import argon2
+from sqlmodel import Session
 
-from app.db import engine, init_db
+from app.db import engine
 from app.auth import verify_token
 from app.models import User
-from app import auth
-from app.api import upload, summary, reports, transactions
-from app.api.admin import categories, rules, system
+from app import (
+    auth, diagnostics, startup, scheduler, archive, uploads, jobs, family_sync, settlement, deletions, ratelimit, assets,
+)
+from app.analytics import snapshot
+from app.api import upload, summary, reports, transactions, import_jobs, family, events as events_api
+from app.api.admin import categories, rules, system, admin as admin_api
+from app.api.admin import diagnostics as diagnostics_api
 
-app = FastAPI(title="GPay Weekly Pay")
+# ✅ Startup pipeline (schema, bootstrap) runs here, not at import time
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.startup_report = startup.run_startup(_IMPORT_STARTED)
+    diagnostics.start()
+    scheduler.every("archive", archive.ARCHIVE_INTERVAL_S, archive.archive_paid)
+    scheduler.every("upload-expiry", 3600, uploads.expire_stale)
+    scheduler.every("sync-tombstones", 86400, family_sync.prune_tombstones)
+    scheduler.every("settlement", settlement.SETTLE_INTERVAL_S, settlement.close_weeks)
+    scheduler.every("unverified-cleanup", auth.CLEANUP_INTERVAL_S, auth.cleanup_unverified_accounts)
+    scheduler.every("deletions", deletions.POLL_S, deletions.run_pending)
+    scheduler.every("rate-limits", ratelimit.PRUNE_INTERVAL_S, ratelimit.prune)
+    if snapshot.ENABLED:
+        scheduler.every("analytics", 60, snapshot.refresh_dirty)
+    scheduler.start()
+    jobs.start()
+    yield
+    await scheduler.stop()
+    await asyncio.to_thread(jobs.stop)
 
-# ✅ Initialize DB
-init_db()
+app = FastAPI(title="GPay Weekly Pay", lifespan=lifespan)
 
 # ✅ Ensure CORS for cookies
 app.add_middleware(
@@ -26,26 +50,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# ✅ Create default superadmin (recommended)
-def ensure_default_superadmin():
-    with Session(engine) as session:
-        superadmin_exists = session.exec(select(User).where(User.role == "superadmin")).first()
-        if not superadmin_exists:
-            pw_hash = argon2.hash("superadmin123")
-            superadmin = User(
-                email="superadmin@example.com",
-                password_hash=pw_hash,
-                role="superadmin",
-                first_login=True
-            )
-            session.add(superadmin)
-            session.commit()
-            print("✅ Default superadmin created: superadmin@example.com / superadmin123")
-        else:
-            print("🔸 Superadmin already exists")
-
-ensure_default_superadmin()
-
 # ✅ Middleware for user context
 @app.middleware("http")
 async def add_user_to_request(request: Request, call_next):
@@ -68,15 +72,24 @@ async def add_user_to_request(request: Request, call_next):
     response = await call_next(request)
     return response
 
+# ✅ Opt-in loop stall detector / request profiler (GPAY_DIAGNOSTICS=1).
+# Added after add_user_to_request so it wraps it and sees its blocking work too.
+app.add_middleware(diagnostics.DiagnosticsMiddleware)
+
 # ✅ Include Routers
 app.include_router(auth.router, prefix="/auth")
 app.include_router(upload.router, prefix="/api")
 app.include_router(summary.router, prefix="/api")
 app.include_router(reports.router, prefix="/api")
 app.include_router(transactions.router, prefix="/api")
+app.include_router(import_jobs.router, prefix="/api")
+app.include_router(family.router, prefix="/api")
+app.include_router(events_api.router, prefix="/api")
+app.include_router(admin_api.router, prefix="/api")
 app.include_router(categories.router, prefix="/api/admin")
 app.include_router(rules.router, prefix="/api/admin")
 app.include_router(system.router, prefix="/api/admin")
+app.include_router(diagnostics_api.router, prefix="/api/admin")
 
 # ✅ Default route → redirect to correct dashboard based on role
 @app.get("/")
@@ -104,4 +117,4 @@ async def root(request: Request):
     return RedirectResponse(url="/login.html")
 
 # ✅ Static files (keep last)
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
+app.mount("/", assets.site, name="static")
@@ -0,0 +1,150 @@
+# app/merchants.py
+"""
+Merchant dictionary.
+
+Every distinct merchant (after normalization) gets one Merchant row with its
+category worked out once; transactions point at it through merchant_id.
+Imports resolve names through a process-wide intern map, so a statement
+with thousands of rows costs one lookup query for the names not seen yet.
+"""
+
+import threading
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from app.db import engine
+from app.models import Merchant
+
+_lock = threading.Lock()
+_interned = {}  # normalized name -> (merchant id, category)
+
+
+def normalize(name: str | None) -> str | None:
+    """Upper-case, collapse whitespace; empty names mean 'no merchant'."""
+    if not name:
+        return None
+    norm = " ".join(name.upper().split())
+    return norm or None
+
+
+# ----------------------------
+# Category Detection
+# ----------------------------
+def detect_category(merchant_name: str):
+    if not merchant_name:
+        return "Other"
+
+    name = merchant_name.lower()
+    mapping = {
+        "Medical": ["medplus", "pharma", "chemist", "hospital"],
+        "Groceries": ["vegetable", "fruit", "grocery", "supermarket", "mart"],
+        "Fuel": ["hp", "indian oil", "indianoil", "shell", "petrol"],
+        "Food": ["hotel", "restaurant", "biryani", "grill", "cafe"],
+        "Shopping": ["mobile", "electronics", "clothing", "store"],
+        "Finance": ["zerodha", "bank", "broker", "mutual"],
+        "Family": ["jenitha", "ashok", "amma", "dad"],
+    }
+
+    for category, keywords in mapping.items():
+        if any(k in name for k in keywords):
+            return category
+
+    return "Other"
+
+
+# ----------------------------
+# Interning
+# ----------------------------
+def intern_many(raw_names) -> dict:
+    """
+    Map raw merchant strings to (merchant_id, category), creating missing
+    Merchant rows. Returns {raw name: (id, category)}; names that normalize
+    to nothing map to (None, "Other").
+
+    New rows are committed in their own short session, so call this before
+    opening the write transaction that uses the ids (SQLite has one writer).
+    """
+    raw_names = set(raw_names)
+    result = {}
+    missing = {}
+    for raw in raw_names:
+        norm = normalize(raw)
+        if norm is None:
+            result[raw] = (None, "Other")
+        elif norm in _interned:
+            result[raw] = _interned[norm]
+        else:
+            missing.setdefault(norm, raw)
+
+    if missing:
+        with Session(engine) as session:
+            _load(session, list(missing))
+            new = {n: raw for n, raw in missing.items() if n not in _interned}
+            if new:
+                _create(session, new)
+        for raw in raw_names:
+            if raw not in result:
+                result[raw] = _interned[normalize(raw)]
+    return result
+
+
+def intern(raw_name: str | None):
+    return intern_many([raw_name])[raw_name]
+
+
+def _load(session, names):
+    for i in range(0, len(names), 500):
+        rows = session.exec(
+            select(Merchant.id, Merchant.name, Merchant.category).where(Merchant.name.in_(names[i:i + 500]))
+        ).all()
+        with _lock:
+            for mid, name, category in rows:
+                _interned[name] = (mid, category)
+
+
+def _new_merchant(name, raw):
+    return Merchant(name=name, display_name=" ".join(raw.split()), category=detect_category(raw))
+
+
+def _create(session, raw_by_name):
+    rows = [_new_merchant(n, raw) for n, raw in raw_by_name.items()]
+    session.add_all(rows)
+    try:
+        session.commit()
+    except IntegrityError:
+        # another worker created some of them first: take theirs, insert the rest one by one
+        session.rollback()
+        _load(session, list(raw_by_name))
+        rows = []
+        for n, raw in raw_by_name.items():
+            if n in _interned:
+                continue
+            m = _new_merchant(n, raw)
+            session.add(m)
+            try:
+                session.commit()
+                rows.append(m)
+            except IntegrityError:
+                session.rollback()
+                _load(session, [n])
+    with _lock:
+        for m in rows:
+            _interned[m.name] = (m.id, m.category)
+
+
+def names_for(merchant_ids) -> dict:
+    """{merchant_id: display name} for the given ids."""
+    ids = [int(i) for i in set(merchant_ids) if i is not None]
+    out = {}
+    with Session(engine) as session:
+        for i in range(0, len(ids), 500):
+            for mid, display in session.exec(
+                select(Merchant.id, Merchant.display_name).where(Merchant.id.in_(ids[i:i + 500]))
+            ).all():
+                out[mid] = display
+    return out
+
+
+def forget():
+    """Drop the intern map (tests, or after Merchant rows were merged/deleted by hand)."""
+    with _lock:
+        _interned.clear()
@@ -0,0 +1,47 @@
+# app/meta.py
+"""Helpers around the AppMeta key/value table."""
+
+from datetime import datetime, timezone
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+from app.db import engine
+from app.models import AppMeta
+
+
+def get_meta(key: str, default=None):
+    with Session(engine) as session:
+        row = session.get(AppMeta, key)
+        return row.value if row else default
+
+
+def set_meta(key: str, value: str):
+    with Session(engine) as session:
+        row = session.get(AppMeta, key) or AppMeta(key=key, value=value)
+        row.value = value
+        row.updated_at = datetime.now(timezone.utc)
+        session.add(row)
+        session.commit()
+
+
+def claim_meta(key: str, value: str) -> bool:
+    """
+    Insert `key` only if nobody has yet. Returns True for exactly one caller
+    across all workers, so it can gate once-per-deployment work.
+    """
+    with Session(engine) as session:
+        session.add(AppMeta(key=key, value=value))
+        try:
+            session.commit()
+            return True
+        except IntegrityError:
+            session.rollback()
+            return False
+
+
+def release_meta(key: str):
+    """Drop a claim, e.g. when the work it gated failed, so the next start tries again."""
+    with Session(engine) as session:
+        row = session.get(AppMeta, key)
+        if row:
+            session.delete(row)
+            session.commit()
@@ -0,0 +1,46 @@
+# app/migrate.py
+"""
+Schema migration CLI.
+
+    python -m app.migrate status
+    python -m app.migrate upgrade [--to N] [--dry-run]
+
+--dry-run changes nothing: no create_all, no lock, only the SQL printed.
+"""
+
+import argparse
+from app.db import init_db
+from app import migrations
+
+
+def status():
+    done = migrations.applied_versions()
+    for version, name, module in migrations.discover():
+        mark = "✅" if version in done else "⏳"
+        doc = (module.__doc__ or "").strip().splitlines()
+        print(f"{mark} {version:04d} {name:<32} {doc[0] if doc else ''}")
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("status", help="List migrations and whether they are applied")
+    up = sub.add_parser("upgrade", help="Apply pending migrations")
+    up.add_argument("--to", type=int, help="Stop after this version")
+    up.add_argument("--dry-run", action="store_true", help="Print the SQL without running it")
+    args = p.parse_args(argv)
+
+    if not getattr(args, "dry_run", False):
+        init_db()  # new tables (including schema_migrations) come from create_all
+    if args.cmd == "status":
+        status()
+    elif args.cmd == "upgrade":
+        applied = migrations.upgrade(target=args.to, dry_run=args.dry_run)
+        if not applied:
+            print("Nothing to apply")
+        else:
+            print(f"{'Would apply' if args.dry_run else 'Applied'} {len(applied)} migration(s)")
+
+
+if __name__ == "__main__":
+    main()
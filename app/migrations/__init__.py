@@ -0,0 +1,339 @@
+# app/migrations/__init__.py
+"""
+Versioned schema migrations.
+
+`SQLModel.metadata.create_all` only creates missing tables; it never adds
+columns or indexes to tables that already exist (like the live gpay.db).
+Every such change goes into a module here named `vNNNN_<what>.py` with:
+
+    VERSION = NNNN
+
+    def upgrade(ctx):
+        ctx.add_column("transaction", "foo", "INTEGER")
+        ctx.create_index("ix_transaction_foo", "transaction", ["foo"])
+        ctx.backfill("transaction", "foo", "amount * 100", where="foo IS NULL")
+
+Steps must be idempotent: a migration can be interrupted and re-run, and on
+a fresh database create_all has usually created everything already.
+
+Run with `python -m app.migrate upgrade`; startup also applies pending
+migrations unless GPAY_AUTO_MIGRATE=0.
+
+Workers booting together take a lock first, so the check-then-act steps
+(has_column -> ADD COLUMN, ...) never race: a Postgres advisory lock, and
+elsewhere (SQLite) a lease row in app_meta that the holder keeps renewing
+and that expires GPAY_MIGRATION_LOCK_S seconds (default 60) after a holder
+died.
+"""
+
+import importlib
+import os
+import pkgutil
+import re
+import socket
+import threading
+import time
+from sqlalchemy import delete, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from app.db import engine
+from app.meta import claim_meta, get_meta
+from app.models import AppMeta, SchemaMigration
+
+LOCK_S = float(os.environ.get("GPAY_MIGRATION_LOCK_S", "60"))
+LOCK_KEY = "migration_lock"
+
+_MODULE_RE = re.compile(r"^v(\d{4})_(\w+)$")
+
+
+class MigrationContext:
+    """Dialect-aware helpers that keep locks short on a live database."""
+
+    def __init__(self, engine, dry_run: bool = False):
+        self.engine = engine
+        self.dialect = engine.dialect.name
+        self.dry_run = dry_run
+        self.q = engine.dialect.identifier_preparer.quote
+
+    # ---------- introspection ----------
+    def has_table(self, table):
+        return inspect(self.engine).has_table(table)
+
+    def has_column(self, table, column):
+        if not self.has_table(table):  # dry run before create_all
+            return False
+        return any(c["name"] == column for c in inspect(self.engine).get_columns(table))
+
+    def has_index(self, table, name):
+        if self.dialect == "postgresql":
+            return self._pg_index_valid(name) is True
+        if not self.has_table(table):
+            return False
+        return any(ix["name"] == name for ix in inspect(self.engine).get_indexes(table))
+
+    def _pg_index_valid(self, name):
+        """True / False (left INVALID by a failed CONCURRENTLY build) / None (no such index)."""
+        with self.engine.connect() as conn:
+            return conn.execute(text(
+                "SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid "
+                "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"), {"name": name}).scalar()
+
+    def execute(self, sql, params=None):
+        print(f"   {sql}")
+        if self.dry_run:
+            return None
+        with self.engine.begin() as conn:
+            return conn.execute(text(sql), params or {})
+
+    # ---------- DDL ----------
+    def add_column(self, table, column, ddl_type, default=None):
+        if self.has_column(table, column):
+            return
+        sql = f"ALTER TABLE {self.q(table)} ADD COLUMN {self.q(column)} {ddl_type}"
+        if default is not None:
+            sql += f" DEFAULT {default}"
+        self.execute(sql)
+
+    def create_index(self, name, table, columns, unique=False, where=None):
+        """
+        Postgres: CREATE INDEX CONCURRENTLY outside a transaction, so writers are
+        never blocked. SQLite has no online index build; the build runs in its
+        own short transaction and, with WAL, readers keep going meanwhile.
+        """
+        if self.has_index(table, name):
+            return
+        if self.dialect == "postgresql" and self._pg_index_valid(name) is False:
+            # IF NOT EXISTS would keep the broken index forever; drop it and build again
+            print(f"   DROP INDEX CONCURRENTLY IF EXISTS {self.q(name)}  -- left INVALID by a failed build")
+            if not self.dry_run:
+                with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {self.q(name)}"))
+        cols = ", ".join(self.q(c) for c in columns)
+        kind = "UNIQUE INDEX" if unique else "INDEX"
+        if self.dialect == "postgresql":
+            sql = f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {self.q(name)} ON {self.q(table)} ({cols})"
+        else:
+            sql = f"CREATE {kind} IF NOT EXISTS {self.q(name)} ON {self.q(table)} ({cols})"
+        if where:
+            sql += f" WHERE {where}"
+        print(f"   {sql}")
+        if self.dry_run:
+            return
+        t0 = time.perf_counter()
+        if self.dialect == "postgresql":
+            with self.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(sql))
+        else:
+            with self.engine.begin() as conn:
+                conn.execute(text(sql))
+        print(f"   built {name} in {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+    # ---------- data ----------
+    def _id_bounds(self, table, where):
+        sql = f"SELECT MIN(id), MAX(id), COUNT(*) FROM {self.q(table)}"
+        if where:
+            sql += f" WHERE {where}"
+        with self.engine.connect() as conn:
+            return conn.execute(text(sql)).one()
+
+    def _batches(self, table, where, batch_size):
+        lo, hi, total = self._id_bounds(table, where)
+        if not total:
+            return
+        start = lo
+        while start <= hi:
+            yield start, start + batch_size - 1, total
+            start += batch_size
+
+    def backfill(self, table, column, expr, where=None, batch_size=2000, params=None):
+        """`UPDATE table SET column = expr` in primary-key windows, one short transaction each."""
+        self.backfill_many(table, {column: expr}, where, batch_size, params)
+
+    def backfill_many(self, table, assignments: dict, where=None, batch_size=2000, params=None):
+        sets = ", ".join(f"{self.q(col)} = {expr}" for col, expr in assignments.items())
+        label = f"{table}.{','.join(assignments)}"
+        print(f"   UPDATE {self.q(table)} SET {sets}" + (f" WHERE {where}" if where else ""))
+        if self.dry_run:
+            return
+        progress = Progress(label)
+        for a, b, total in self._batches(table, where, batch_size):
+            sql = f"UPDATE {self.q(table)} SET {sets} WHERE id BETWEEN :_a AND :_b"
+            if where:
+                sql += f" AND ({where})"
+            with self.engine.begin() as conn:
+                res = conn.execute(text(sql), {**(params or {}), "_a": a, "_b": b})
+            progress.step(res.rowcount, total)
+        progress.done()
+
+    def backfill_rows(self, table, columns, compute, targets, where=None, batch_size=1000):
+        """
+        Backfill with values computed in Python. `compute(row)` gets a mapping of
+        `columns` (plus id) and returns a dict for the `targets` columns.
+        """
+        cols = ", ".join(self.q(c) for c in ["id", *columns])
+        sets = ", ".join(f"{self.q(t)} = :{t}" for t in targets)
+        label = f"{table}.{','.join(targets)}"
+        print(f"   backfill {label} from {', '.join(columns)} (python)")
+        if self.dry_run:
+            return
+        progress = Progress(label)
+        for a, b, total in self._batches(table, where, batch_size):
+            sql = f"SELECT {cols} FROM {self.q(table)} WHERE id BETWEEN :_a AND :_b"
+            if where:
+                sql += f" AND ({where})"
+            with self.engine.begin() as conn:
+                rows = conn.execute(text(sql), {"_a": a, "_b": b}).mappings().all()
+                updates = [{**compute(r), "_id": r["id"]} for r in rows]
+                if updates:
+                    conn.execute(text(f"UPDATE {self.q(table)} SET {sets} WHERE id = :_id"), updates)
+            progress.step(len(updates), total)
+        progress.done()
+
+
+class Progress:
+    def __init__(self, label):
+        self.label = label
+        self.done_rows = 0
+        self.started = time.perf_counter()
+        self.last_print = 0.0
+
+    def step(self, rows, total):
+        self.done_rows += max(rows, 0)
+        now = time.perf_counter()
+        if now - self.last_print >= 1 or self.done_rows >= total:
+            rate = self.done_rows / max(now - self.started, 1e-6)
+            pct = self.done_rows / total if total else 1
+            print(f"   [backfill] {self.label}: {self.done_rows}/{total} ({pct:.0%}) {rate:.0f} rows/s")
+            self.last_print = now
+
+    def done(self):
+        print(f"   [backfill] {self.label}: {self.done_rows} rows in {time.perf_counter() - self.started:.1f}s")
+
+
+# ----------------------------
+# Discovery / runner
+# ----------------------------
+def discover():
+    """[(version, name, module)] sorted by version."""
+    found = []
+    for info in pkgutil.iter_modules(__path__):
+        m = _MODULE_RE.match(info.name)
+        if m:
+            module = importlib.import_module(f"{__name__}.{info.name}")
+            found.append((module.VERSION, m.group(2), module))
+    found.sort(key=lambda x: x[0])
+    versions = [v for v, _, _ in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions: {versions}")
+    return found
+
+
+def applied_versions():
+    if not inspect(engine).has_table(SchemaMigration.__tablename__):
+        return set()  # dry run before create_all
+    with Session(engine) as session:
+        return set(session.exec(select(SchemaMigration.version)).all())
+
+
+def pending():
+    done = applied_versions()
+    return [m for m in discover() if m[0] not in done]
+
+
+class _Lease:
+    """
+    Migration lock without advisory locks: an app_meta row "holder|expires".
+    The holder renews it from a side thread; a dead holder's row expires.
+    """
+
+    def __init__(self):
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        self._done = threading.Event()
+        self._thread = None
+
+    def _value(self):
+        return f"{self.holder}|{time.time() + LOCK_S:.0f}"
+
+    def acquire(self):
+        waited = False
+        while not claim_meta(LOCK_KEY, self._value()):
+            current = get_meta(LOCK_KEY)
+            if current is not None and float(current.rpartition("|")[2]) < time.time():
+                with Session(engine) as session:  # holder died: take the row away (only if unchanged)
+                    session.execute(delete(AppMeta).where(AppMeta.key == LOCK_KEY, AppMeta.value == current))
+                    session.commit()
+                continue
+            if not waited:
+                print(f"⏳ Waiting for another process to finish migrating ({current})")
+                waited = True
+            time.sleep(0.5)
+        self._thread = threading.Thread(target=self._renew, name="migration-lock", daemon=True)
+        self._thread.start()
+
+    def _renew(self):
+        while not self._done.wait(LOCK_S / 3):
+            with Session(engine) as session:
+                row = session.get(AppMeta, LOCK_KEY)
+                if row is None or not row.value.startswith(self.holder + "|"):
+                    return
+                row.value = self._value()
+                session.add(row)
+                session.commit()
+
+    def release(self):
+        self._done.set()
+        if self._thread:
+            self._thread.join()
+        with Session(engine) as session:
+            session.execute(delete(AppMeta).where(AppMeta.key == LOCK_KEY,
+                                                  AppMeta.value.startswith(self.holder + "|")))
+            session.commit()
+
+
+def _lock(conn):
+    """Serialize workers that boot at the same time; returns the lease to release (not on Postgres)."""
+    if engine.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_lock(727001)"))
+        return None
+    lease = _Lease()
+    lease.acquire()
+    return lease
+
+
+def _unlock(conn, lease):
+    if lease is not None:
+        lease.release()
+    elif engine.dialect.name == "postgresql":
+        conn.execute(text("SELECT pg_advisory_unlock(727001)"))
+
+
+def upgrade(target: int | None = None, dry_run: bool = False):
+    """Apply pending migrations up to `target` (all by default). Returns applied versions."""
+    applied = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        lease = None if dry_run else _lock(lock_conn)  # a dry run writes nothing
+        try:
+            for version, name, module in pending():
+                if target is not None and version > target:
+                    break
+                print(f"⏫ Migration {version:04d} {name}" + (" (dry run)" if dry_run else ""))
+                ctx = MigrationContext(engine, dry_run=dry_run)
+                t0 = time.perf_counter()
+                module.upgrade(ctx)
+                ms = (time.perf_counter() - t0) * 1000
+                if not dry_run:
+                    _record(version, name, ms)
+                applied.append(version)
+        finally:
+            if not dry_run:
+                _unlock(lock_conn, lease)
+    return applied
+
+
+def _record(version, name, ms):
+    with Session(engine) as session:
+        session.add(SchemaMigration(version=version, name=name, duration_ms=round(ms, 1)))
+        try:
+            session.commit()
+        except IntegrityError:
+            session.rollback()  # another worker finished it first
@@ -0,0 +1,8 @@
+"""Composite indexes for the hot queries: summary() and the family/shared feeds."""
+
+VERSION = 1
+
+
+def upgrade(ctx):
+    ctx.create_index("ix_transaction_user_paid_date", "transaction", ["user_id", "paid", "date"])
+    ctx.create_index("ix_transaction_family_shared", "transaction", ["family_id", "shared"])
@@ -0,0 +1,81 @@
+"""Merchant dictionary: transaction.merchant_id (hot table and archive partitions) pointing at merchant rows."""
+
+from datetime import datetime, timezone
+from sqlalchemy import text
+
+VERSION = 2
+
+# category keywords as of this migration (app/merchants.py may change them later)
+CATEGORIES = {
+    "Medical": ["medplus", "pharma", "chemist", "hospital"],
+    "Groceries": ["vegetable", "fruit", "grocery", "supermarket", "mart"],
+    "Fuel": ["hp", "indian oil", "indianoil", "shell", "petrol"],
+    "Food": ["hotel", "restaurant", "biryani", "grill", "cafe"],
+    "Shopping": ["mobile", "electronics", "clothing", "store"],
+    "Finance": ["zerodha", "bank", "broker", "mutual"],
+    "Family": ["jenitha", "ashok", "amma", "dad"],
+}
+
+
+def normalize(name):
+    if not name:
+        return None
+    return " ".join(name.upper().split()) or None
+
+
+def category(raw):
+    name = raw.lower()
+    return next((c for c, keywords in CATEGORIES.items() if any(k in name for k in keywords)), "Other")
+
+
+def intern(ctx, raw_names):
+    """{raw name: merchant id}, creating the missing merchant rows."""
+    first_raw = {}
+    for raw in sorted(raw_names):
+        norm = normalize(raw)
+        if norm is not None:
+            first_raw.setdefault(norm, raw)
+    ids = {}
+    names = sorted(first_raw)
+    now = datetime.now(timezone.utc)
+    with ctx.engine.begin() as conn:
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            conn.execute(text(
+                "INSERT INTO merchant (name, display_name, category, created_at) "
+                "VALUES (:name, :display, :category, :now) ON CONFLICT (name) DO NOTHING"
+            ), [{"name": n, "display": " ".join(first_raw[n].split()), "category": category(first_raw[n]),
+                 "now": now} for n in chunk])
+            marks = ", ".join(f":n{k}" for k in range(len(chunk)))
+            ids.update(conn.execute(text(f"SELECT name, id FROM merchant WHERE name IN ({marks})"),
+                                    {f"n{k}": n for k, n in enumerate(chunk)}).all())
+    return {raw: ids[normalize(raw)] for raw in raw_names if normalize(raw) is not None}
+
+
+def upgrade(ctx):
+    from app.archive import transaction_tables
+
+    tables = transaction_tables()
+    for table in tables:
+        ctx.add_column(table, "merchant_id", "INTEGER")
+    ctx.create_index("ix_transaction_merchant_id", "transaction", ["merchant_id"])
+
+    # build the dictionary from the distinct names already stored, then point rows at it
+    names = set()
+    for table in tables:
+        if ctx.dry_run and not ctx.has_column(table, "merchant_id"):
+            continue
+        with ctx.engine.connect() as conn:
+            names.update(r[0] for r in conn.execute(text(
+                f"SELECT DISTINCT merchant FROM {ctx.q(table)} WHERE merchant IS NOT NULL AND merchant_id IS NULL"
+            )))
+    print(f"   {len(names)} distinct merchant names to intern")
+    if ctx.dry_run:
+        return
+    interned = intern(ctx, names)
+
+    for table in tables:
+        ctx.backfill_rows(
+            table, ["merchant"], lambda r: {"merchant_id": interned.get(r["merchant"])}, ["merchant_id"],
+            where="merchant_id IS NULL AND merchant IS NOT NULL",
+        )
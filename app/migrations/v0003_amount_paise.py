@@ -0,0 +1,32 @@
+"""Integer paise amounts: amount_paise on transactions (hot and archived) and payments; txn_hash rehashed on paise."""
+
+import hashlib
+from datetime import datetime
+
+VERSION = 3
+
+
+def txn_hash(txn_id: str, date_iso: str, amount_paise: int):
+    # the upload hash as of this migration (superseded by fingerprints in 0004)
+    s = f"{txn_id}|{date_iso}|{amount_paise}"
+    return hashlib.sha256(s.encode("utf8")).hexdigest()
+
+
+def upgrade(ctx):
+    from app.archive import transaction_tables
+
+    tables = transaction_tables()
+    for table in [*tables, "payment"]:
+        ctx.add_column(table, "amount_paise", "INTEGER")
+        # amounts come from statements with at most two decimals, so rounding amount*100 is exact
+        ctx.backfill(table, "amount_paise", "CAST(ROUND(amount * 100) AS INTEGER)", where="amount_paise IS NULL")
+
+    def rehash(row):
+        dt = row["date"]
+        if isinstance(dt, str):  # SQLite hands back the stored text
+            dt = datetime.fromisoformat(dt)
+        return {"txn_hash": txn_hash(row["txn_id"] or "", dt.isoformat(), row["amount_paise"])}
+
+    # upload dedups on txn_hash, so existing rows must hash the way new uploads do
+    for table in tables:
+        ctx.backfill_rows(table, ["txn_id", "date", "amount_paise"], rehash, ["txn_hash"])
@@ -0,0 +1,36 @@
+"""Binary transaction fingerprints: fingerprint column + unique index (hot and archived); txn_hash becomes its hex."""
+
+import hashlib
+from datetime import datetime
+
+VERSION = 4
+
+
+def digest(txn_id, dt, amount_paise, merchant):
+    # the fingerprint as of this migration (app/fingerprint.py computes it for new uploads)
+    txn_id = (txn_id or "").strip()
+    parts = [txn_id, dt.replace(tzinfo=None).isoformat(), str(int(amount_paise))]
+    if not txn_id:
+        parts.append(" ".join((merchant or "").upper().split()))
+    return hashlib.blake2b("\x1f".join(parts).encode("utf8"), digest_size=16).digest()
+
+
+def upgrade(ctx):
+    from app.archive import transaction_tables
+
+    blob = "BYTEA" if ctx.dialect == "postgresql" else "BLOB"
+    tables = transaction_tables()
+
+    def compute(row):
+        dt = row["date"]
+        if isinstance(dt, str):  # SQLite hands back the stored text
+            dt = datetime.fromisoformat(dt)
+        fp = digest(row["txn_id"], dt, row["amount_paise"] or 0, row["merchant"])
+        return {"fingerprint": fp, "txn_hash": fp.hex()}
+
+    for table in tables:
+        ctx.add_column(table, "fingerprint", blob)
+        ctx.backfill_rows(table, ["txn_id", "date", "amount_paise", "merchant"], compute,
+                          ["fingerprint", "txn_hash"], where="fingerprint IS NULL")
+        name = "ix_transaction_fingerprint" if table == "transaction" else f"ix_{table}_fingerprint"
+        ctx.create_index(name, table, ["fingerprint"], unique=True)
@@ -0,0 +1,8 @@
+"""uploadsession.job_id: chunked uploads of non-CSV files finish as background import jobs."""
+
+VERSION = 5
+
+
+def upgrade(ctx):
+    if ctx.has_table("uploadsession"):
+        ctx.add_column("uploadsession", "job_id", "VARCHAR")
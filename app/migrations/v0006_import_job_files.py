@@ -0,0 +1,8 @@
+"""importjob.files: per-file results of multi-file (batch/zip) imports."""
+
+VERSION = 6
+
+
+def upgrade(ctx):
+    if ctx.has_table("importjob"):
+        ctx.add_column("importjob", "files", "JSON")
@@ -0,0 +1,14 @@
+"""Incremental family sync: family change sequence, transaction.sync_seq (hot and archived) + index."""
+
+VERSION = 7
+
+
+def upgrade(ctx):
+    from app.archive import transaction_tables
+
+    ctx.add_column("family", "change_seq", "INTEGER NOT NULL", default=0)
+    ctx.add_column("family", "sync_floor", "INTEGER NOT NULL", default=0)
+    # existing rows keep sync_seq NULL: clients get them from their first (full) sync
+    for table in transaction_tables():
+        ctx.add_column(table, "sync_seq", "INTEGER")
+    ctx.create_index("ix_transaction_family_sync", "transaction", ["family_id", "sync_seq"])
@@ -0,0 +1,21 @@
+"""Summary aggregates: fill sharedaggregate (created by create_all) from the shared hot transactions."""
+
+VERSION = 8
+
+
+def upgrade(ctx):
+    print("   rebuild sharedaggregate from shared transactions")
+    if ctx.dry_run:
+        return
+    from sqlalchemy import text
+
+    # the cache as defined by this migration: per child and day, shared rows of the hot table
+    with ctx.engine.begin() as conn:
+        conn.execute(text("DELETE FROM sharedaggregate"))
+        rows = conn.execute(text(
+            f"INSERT INTO sharedaggregate (user_id, day, {ctx.q('count')}, paise, unpaid_paise) "
+            f"SELECT user_id, DATE(date), COUNT(*), COALESCE(SUM(amount_paise), 0), "
+            f"COALESCE(SUM(CASE WHEN paid THEN 0 ELSE amount_paise END), 0) "
+            f"FROM {ctx.q('transaction')} WHERE shared GROUP BY user_id, DATE(date)"
+        )).rowcount
+    print(f"   {rows} rows")
@@ -0,0 +1,41 @@
+"""Payment ledger: payer/payee indexes, paymentallocation (created by create_all) filled from txn_refs."""
+
+VERSION = 9
+
+
+def upgrade(ctx):
+    import json
+    from sqlalchemy import text
+
+    ctx.create_index("ix_payment_payer_payee", "payment", ["payer_id", "payee_id"])
+    ctx.create_index("ix_payment_payee_id", "payment", ["payee_id"])
+
+    print("   backfill paymentallocation from payment.txn_refs (python)")
+    if ctx.dry_run:
+        return
+    from app.archive import transaction_tables
+    with ctx.engine.begin() as conn:
+        payments = conn.execute(text(
+            "SELECT id, txn_refs FROM payment p WHERE txn_refs IS NOT NULL AND NOT EXISTS "
+            "(SELECT 1 FROM paymentallocation a WHERE a.payment_id = p.id) ORDER BY id"
+        )).all()
+        refs = {}
+        for pid, raw in payments:
+            for tid in (json.loads(raw) if isinstance(raw, str) else raw) or []:
+                refs.setdefault(int(tid), pid)  # a transaction listed twice stays with its first payment
+        taken = set(conn.execute(text("SELECT transaction_id FROM paymentallocation")).scalars())
+        amounts = {}
+        ids = sorted(set(refs) - taken)
+        for table in transaction_tables():  # settled rows may already be archived
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                marks = ", ".join(f":t{n}" for n in range(len(chunk)))
+                amounts.update(conn.execute(
+                    text(f"SELECT id, amount_paise FROM {ctx.q(table)} WHERE id IN ({marks})"),
+                    {f"t{n}": t for n, t in enumerate(chunk)},
+                ).all())
+        rows = [{"p": refs[t], "t": t, "a": amounts[t] or 0} for t in ids if t in amounts]  # skip deleted rows
+        if rows:
+            conn.execute(text("INSERT INTO paymentallocation (payment_id, transaction_id, amount_paise) "
+                              "VALUES (:p, :t, :a)"), rows)
+    print(f"   {len(rows)} allocations from {len(payments)} payments")
@@ -0,0 +1,79 @@
+"""Weekly statements: index for unsettled rows, then close every finished week (hot and archived) into weeklystatement."""
+
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import text
+
+VERSION = 10
+
+BATCH = 2000
+
+
+def _close_batch(ctx, table, cutoff):
+    """Settle one batch of rows dated before `cutoff` (ISO weeks, as app/settlement.py did at this version)."""
+    t = ctx.q(table)
+    with ctx.engine.begin() as conn:
+        rows = conn.execute(text(
+            f"SELECT id, user_id, family_id, date, amount_paise, shared, paid FROM {t} "
+            f"WHERE week_paid IS NULL AND date < :cutoff ORDER BY id LIMIT {BATCH}"
+        ), {"cutoff": cutoff}).all()
+        if not rows:
+            return 0
+        stamps, totals, touched = [], {}, defaultdict(list)
+        now = datetime.utcnow()
+        for r in rows:
+            dt = datetime.fromisoformat(r.date) if isinstance(r.date, str) else r.date  # SQLite: stored text
+            year, week_no, _ = dt.isocalendar()
+            week = f"{year}-W{week_no:02d}"
+            stamps.append({"w": week, "id": r.id})
+            s = totals.setdefault((r.user_id, week), {
+                "u": r.user_id, "w": week, "f": r.family_id, "ws": dt.date() - timedelta(days=dt.weekday()),
+                "c": 0, "p": 0, "sp": 0, "up": 0, "now": now,
+            })
+            paise = r.amount_paise or 0
+            s["c"] += 1
+            s["p"] += paise
+            s["sp"] += paise if r.shared else 0
+            s["up"] += 0 if r.paid else paise
+            if r.shared and r.family_id is not None:
+                touched[r.family_id].append(r.id)
+
+        conn.execute(text(f"UPDATE {t} SET week_paid = :w WHERE id = :id"), stamps)
+        count = ctx.q("count")
+        conn.execute(text(
+            f"INSERT INTO weeklystatement (user_id, week, family_id, week_start, {count}, paise, shared_paise, "
+            f"unpaid_paise, closed_at) VALUES (:u, :w, :f, :ws, :c, :p, :sp, :up, :now) "
+            f"ON CONFLICT (user_id, week) DO UPDATE SET family_id = excluded.family_id, "
+            f"{count} = weeklystatement.{count} + excluded.{count}, paise = weeklystatement.paise + excluded.paise, "
+            f"shared_paise = weeklystatement.shared_paise + excluded.shared_paise, "
+            f"unpaid_paise = weeklystatement.unpaid_paise + excluded.unpaid_paise"
+        ), list(totals.values()))
+        if table == "transaction":
+            # week_paid is part of the family feed: give the shared rows a new sync sequence number
+            for family_id, ids in touched.items():
+                conn.execute(text("UPDATE family SET change_seq = change_seq + 1 WHERE id = :f"), {"f": family_id})
+                seq = conn.execute(text("SELECT change_seq FROM family WHERE id = :f"), {"f": family_id}).scalar()
+                conn.execute(text(f"UPDATE {t} SET sync_seq = :s WHERE id = :id"),
+                             [{"s": seq, "id": i} for i in ids])
+    return len(rows)
+
+
+def upgrade(ctx):
+    from app.archive import transaction_tables
+
+    ctx.create_index("ix_transaction_week_user", "transaction", ["week_paid", "user_id"])
+    # rows archived before settlement existed are settled here once; the archiver only moves settled rows now
+    tables = transaction_tables()
+    print(f"   close finished weeks into weeklystatement ({len(tables)} tables)")
+    if ctx.dry_run:
+        return
+    today = datetime.utcnow().date()
+    cutoff = datetime.combine(today - timedelta(days=today.weekday()), time.min)
+    settled = 0
+    for table in tables:
+        while True:
+            n = _close_batch(ctx, table, cutoff)
+            if not n:
+                break
+            settled += n
+    print(f"   settled {settled} transactions before {cutoff.date()}")
@@ -0,0 +1,17 @@
+"""deletionrequest: status/progress columns for the background deletion executor (app/deletions.py)."""
+
+VERSION = 11
+
+
+def upgrade(ctx):
+    if not ctx.has_table("deletionrequest"):
+        return
+    ctx.add_column("deletionrequest", "status", "VARCHAR NOT NULL", default="'pending'")
+    ctx.add_column("deletionrequest", "progress", "JSON")
+    ctx.add_column("deletionrequest", "attempts", "INTEGER NOT NULL", default=0)
+    for column in ("worker", "error"):
+        ctx.add_column("deletionrequest", column, "VARCHAR")
+    for column in ("heartbeat_at", "approved_at", "finished_at"):
+        ctx.add_column("deletionrequest", column, "TIMESTAMP")
+    ctx.execute("UPDATE deletionrequest SET status = 'done' WHERE executed = :yes AND status = 'pending'", {"yes": True})
+    ctx.create_index("ix_deletionrequest_status", "deletionrequest", ["status"])
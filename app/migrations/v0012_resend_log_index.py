@@ -0,0 +1,9 @@
+"""verificationresendlog: (email, created_at) index for the resend rate limit and log expiry (app/ratelimit.py)."""
+
+VERSION = 12
+
+
+def upgrade(ctx):
+    if not ctx.has_table("verificationresendlog"):
+        return
+    ctx.create_index("ix_verificationresendlog_email_created", "verificationresendlog", ["email", "created_at"])
@@ -0,0 +1,9 @@
+"""uploadsession / importjob: count of records skipped as invalid (app/importer.py)."""
+
+VERSION = 13
+
+
+def upgrade(ctx):
+    for table in ("uploadsession", "importjob"):
+        if ctx.has_table(table):
+            ctx.add_column(table, "invalid", "INTEGER NOT NULL", default=0)
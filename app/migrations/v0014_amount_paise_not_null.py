@@ -0,0 +1,31 @@
+"""amount_paise NOT NULL: backfill stragglers, constrain on Postgres, fill-in trigger on SQLite."""
+
+VERSION = 14
+
+
+def upgrade(ctx):
+    from app.archive import transaction_tables
+
+    tables = [*transaction_tables(), "payment"]
+    for table in tables:
+        if ctx.has_table(table):
+            ctx.backfill(table, "amount_paise", "CAST(ROUND(amount * 100) AS INTEGER)", where="amount_paise IS NULL")
+
+    if ctx.dialect == "postgresql":
+        # validate a NOT VALID check first, so SET NOT NULL skips the full scan under its exclusive lock
+        for table in tables:
+            check = ctx.q(f"ck_{table}_amount_paise_nn")
+            ctx.execute(f"ALTER TABLE {ctx.q(table)} DROP CONSTRAINT IF EXISTS {check}")
+            ctx.execute(f"ALTER TABLE {ctx.q(table)} ADD CONSTRAINT {check} CHECK (amount_paise IS NOT NULL) NOT VALID")
+            ctx.execute(f"ALTER TABLE {ctx.q(table)} VALIDATE CONSTRAINT {check}")
+            ctx.execute(f"ALTER TABLE {ctx.q(table)} ALTER COLUMN amount_paise SET NOT NULL")
+            ctx.execute(f"ALTER TABLE {ctx.q(table)} DROP CONSTRAINT {check}")
+    elif ctx.dialect == "sqlite":
+        # SQLite cannot add NOT NULL to an existing column; fill it in for inserts that leave it out
+        for table in ("transaction", "payment"):
+            t = ctx.q(table)
+            ctx.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {ctx.q(f'trg_{table}_amount_paise')} AFTER INSERT ON {t} "
+                f"WHEN NEW.amount_paise IS NULL BEGIN "
+                f"UPDATE {t} SET amount_paise = CAST(ROUND(NEW.amount * 100) AS INTEGER) WHERE id = NEW.id; END"
+            )
@@ -0,0 +1,28 @@
+"""payment.payer_id / payee_id -> user.id foreign keys on databases created before the ledger (Postgres)."""
+
+VERSION = 15
+
+
+def upgrade(ctx):
+    from sqlalchemy import inspect
+    from sqlalchemy.exc import DBAPIError
+
+    if not ctx.has_table("payment"):
+        return
+    if ctx.dialect != "postgresql":
+        # SQLite cannot add a constraint to an existing table; fresh databases get them from create_all
+        print("   foreign keys on existing payment tables need Postgres; skipped")
+        return
+    have = {tuple(fk["constrained_columns"]) for fk in inspect(ctx.engine).get_foreign_keys("payment")}
+    for column in ("payer_id", "payee_id"):
+        if (column,) in have:
+            continue
+        name = ctx.q(f"fk_payment_{column}_user")
+        # NOT VALID takes only a brief lock; VALIDATE then checks existing rows without blocking writes
+        ctx.execute(f"ALTER TABLE payment ADD CONSTRAINT {name} FOREIGN KEY ({ctx.q(column)}) "
+                    f"REFERENCES {ctx.q('user')} (id) NOT VALID")
+        try:
+            ctx.execute(f"ALTER TABLE payment VALIDATE CONSTRAINT {name}")
+        except DBAPIError as e:
+            # payments of deleted users: the constraint still guards new rows; clean up and re-validate by hand
+            print(f"   ⚠️ {name} left NOT VALID, existing rows reference missing users: {e.orig}")
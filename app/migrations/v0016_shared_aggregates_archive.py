@@ -0,0 +1,25 @@
+"""Summary aggregates cover archived rows too: rebuild sharedaggregate from the hot table and every partition."""
+
+VERSION = 16
+
+
+def upgrade(ctx):
+    from sqlalchemy import text
+    from app.archive import transaction_tables
+
+    # before this version archiving subtracted shared rows from the cache
+    tables = [t for t in transaction_tables() if ctx.has_table(t)]
+    print(f"   rebuild sharedaggregate from shared transactions ({len(tables)} tables)")
+    if ctx.dry_run or not ctx.has_table("sharedaggregate"):
+        return
+    shared = " UNION ALL ".join(
+        f"SELECT user_id, date, amount_paise, paid FROM {ctx.q(t)} WHERE shared" for t in tables)
+    with ctx.engine.begin() as conn:
+        conn.execute(text("DELETE FROM sharedaggregate"))
+        rows = conn.execute(text(
+            f"INSERT INTO sharedaggregate (user_id, day, {ctx.q('count')}, paise, unpaid_paise) "
+            f"SELECT user_id, DATE(date), COUNT(*), COALESCE(SUM(amount_paise), 0), "
+            f"COALESCE(SUM(CASE WHEN paid THEN 0 ELSE amount_paise END), 0) "
+            f"FROM ({shared}) s GROUP BY user_id, DATE(date)"
+        )).rowcount
+    print(f"   {rows} rows")
@@ -1,6 +1,7 @@
-from sqlmodel import SQLModel, Field, Column, JSON, Relationship
+from sqlmodel import SQLModel, Field, Column, JSON, Relationship, Index
+from sqlalchemy import LargeBinary, event
 from typing import Optional, List
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, timezone, timedelta
 
 
 class User(SQLModel, table=True):
@@ -31,33 +32,67 @@ class User(SQLModel, table=True):
 
 
 class Transaction(SQLModel, table=True):
+    # composite indexes are also created on existing databases by app/migrations/v0001
+    __table_args__ = (
+        Index("ix_transaction_user_paid_date", "user_id", "paid", "date"),
+        Index("ix_transaction_family_shared", "family_id", "shared"),
+        Index("ix_transaction_family_sync", "family_id", "sync_seq"),
+        Index("ix_transaction_week_user", "week_paid", "user_id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     family_id: int = Field(foreign_key="family.id")
     txn_id: Optional[str] = None
-    txn_hash: str = Field(index=True, nullable=False, unique=True)
+    txn_hash: str = Field(index=True, nullable=False, unique=True)  # hex of fingerprint
+    # 16-byte digest of the canonical record, the dedup key (app/fingerprint.py)
+    fingerprint: Optional[bytes] = Field(default=None, sa_column=Column(LargeBinary(16), unique=True, index=True))
     date: datetime
-    amount: float
-    merchant: Optional[str] = None
+    amount: float  # rupees, kept in sync with amount_paise for display
+    # source of truth for sums and hashing (app/money.py); derived from amount on ORM inserts that leave it out
+    amount_paise: int = Field(default=None, nullable=False)
+    merchant: Optional[str] = None  # raw statement text, kept for display
+    merchant_id: Optional[int] = Field(default=None, foreign_key="merchant.id", index=True)
     note: Optional[str] = None
     paid: bool = False
-    week_paid: Optional[str] = None
+    week_paid: Optional[str] = None  # ISO week ("2026-W42") of the statement that settled it; NULL until closed (app/settlement.py)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     category: str = Field(default="Other")
     type: str  # debit or credit
     description: str
     shared: bool = False
     marked_for_deletion: bool = Field(default=False)
+    sync_seq: Optional[int] = None  # family change sequence of the last shared/paid change (app/family_sync.py)
 
     user: User = Relationship(back_populates="transactions")
 
 
 class Payment(SQLModel, table=True):
+    # created on existing databases by app/migrations/v0009
+    __table_args__ = (Index("ix_payment_payer_payee", "payer_id", "payee_id"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    payer_id: int
-    payee_id: int
+    payer_id: int = Field(foreign_key="user.id")
+    payee_id: int = Field(foreign_key="user.id", index=True)
     amount: float
-    txn_refs: List[int] = Field(sa_column=Column(JSON), default=[])
+    amount_paise: int = Field(default=None, nullable=False)
+    txn_refs: List[int] = Field(sa_column=Column(JSON), default=[])  # legacy copy; PaymentAllocation is authoritative
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class PaymentAllocation(SQLModel, table=True):
+    """The part of a payment that settles one transaction (see app/ledger.py)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    payment_id: int = Field(foreign_key="payment.id", index=True)
+    transaction_id: int = Field(index=True, unique=True)  # no FK: settled rows move to archive tables
+    amount_paise: int
+
+class Merchant(SQLModel, table=True):
+    """Merchant dictionary: one row per normalized merchant name (see app/merchants.py)."""
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(index=True, nullable=False, unique=True)  # normalized: upper-case, single spaces
+    display_name: str
+    category: str = Field(default="Other")
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class Category(SQLModel, table=True):
@@ -77,15 +112,52 @@ class Family(SQLModel, table=True):
     name: str = Field(index=True, nullable=False, unique=True)
     smtp_config: Optional[dict] = Field(default=None, sa_column=Column(JSON))
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    change_seq: int = 0  # last sequence number handed out for the shared-transaction feed
+    sync_floor: int = 0  # tombstones up to here were pruned; older watermarks must resync
 
     # Relationships
     members: List["User"] = Relationship(back_populates="family")
     categories: List["Category"] = Relationship(back_populates="family")
 
+class TransactionTombstone(SQLModel, table=True):
+    """A transaction that left a family's shared feed (deleted or archived), for incremental sync."""
+    __table_args__ = (Index("ix_transactiontombstone_family_seq", "family_id", "seq"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    family_id: int
+    txn_id: int  # transaction.id
+    seq: int
+    reason: str = "deleted"  # deleted | archived
+    deleted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class SharedAggregate(SQLModel, table=True):
+    """Per-child, per-day totals of shared transactions, hot and archived; the leaves of the summary rollup (app/aggregates.py)."""
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    day: date = Field(primary_key=True)
+    count: int = 0
+    paise: int = 0
+    unpaid_paise: int = 0
+
+class WeeklyStatement(SQLModel, table=True):
+    """One user's frozen totals for a closed ISO week (app/settlement.py)."""
+    __table_args__ = (Index("ix_weeklystatement_family_week", "family_id", "week"),)
+
+    user_id: int = Field(foreign_key="user.id", primary_key=True)
+    week: str = Field(primary_key=True)  # "2026-W42", the week_paid of its transactions
+    family_id: Optional[int] = None
+    week_start: date  # Monday
+    count: int = 0
+    paise: int = 0
+    shared_paise: int = 0
+    unpaid_paise: int = 0  # still owed; lowered when a settled transaction is paid
+    closed_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
 class TxnShareRequest(SQLModel):
     txn_ids: List[int]
 
 class DeletionRequest(SQLModel, table=True):
+    __table_args__ = (Index("ix_deletionrequest_status", "status"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     entity_type: str  # "user" or "family"
     entity_id: int
@@ -93,8 +165,102 @@ class DeletionRequest(SQLModel, table=True):
     approval_ids: List[int] = Field(default_factory=list, sa_column=Column(JSON))
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     executed: bool = Field(default=False)
+    # executed in the background by app/deletions.py once approved
+    status: str = Field(default="pending")  # pending | approved | running | done | failed
+    progress: Optional[dict] = Field(default=None, sa_column=Column(JSON))  # rows deleted so far, per table
+    attempts: int = 0
+    worker: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None
+    approved_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
 
 class VerificationResendLog(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     email: str
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
\ No newline at end of file
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (Index("ix_verificationresendlog_email_created", "email", "created_at"),)
+
+
+class AppMeta(SQLModel, table=True):
+    """Small key/value store for deployment-wide markers (schema version, bootstrap claims)."""
+    key: str = Field(primary_key=True)
+    value: str
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class SchemaMigration(SQLModel, table=True):
+    __tablename__ = "schema_migrations"
+    version: int = Field(primary_key=True)
+    name: str
+    applied_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    duration_ms: float = 0
+
+
+class ArchivePartition(SQLModel, table=True):
+    """One monthly cold-archive table of paid transactions (see app/archive.py)."""
+    month: str = Field(primary_key=True)  # "2025-01"
+    table_name: str
+    rows: int = 0
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class UploadSession(SQLModel, table=True):
+    """A resumable chunked statement upload; chunks are spooled to disk (see app/uploads.py)."""
+    id: str = Field(primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    filename: str
+    size: int
+    chunk_size: int
+    total_chunks: int
+    sha256: Optional[str] = None  # whole file, checked on finalize when the client sends it
+    received: int = 0  # chunks 0..received-1 are stored and acknowledged
+    chunk_hashes: List[str] = Field(default_factory=list, sa_column=Column(JSON))
+    stream_format: Optional[str] = None  # streaming parser name from app/parsing.py ("csv", "paytm_csv", ...): records are imported while chunks arrive
+    csv_header: Optional[str] = None
+    parsed_bytes: int = 0
+    imported: int = 0
+    duplicates: int = 0
+    invalid: int = 0  # records skipped because they could not be imported (bad amount, ...)
+    job_id: Optional[str] = None  # non-streamed files are imported by this ImportJob
+    status: str = Field(default="open")  # open | complete
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+
+class ImportJob(SQLModel, table=True):
+    """A queued statement import; the table is the queue (see app/jobs.py)."""
+    __table_args__ = (Index("ix_importjob_status_created", "status", "created_at"),)
+
+    id: str = Field(primary_key=True)
+    user_id: int = Field(foreign_key="user.id", index=True)
+    filename: str
+    sha256: str = Field(index=True)
+    status: str = Field(default="queued")  # queued | running | done | failed
+    rows_parsed: int = 0
+    records_done: int = 0  # records already imported; a resumed job starts here
+    imported: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    attempts: int = 0
+    error: Optional[str] = None
+    files: Optional[list] = Field(default=None, sa_column=Column(JSON))  # batches: [{name, format, rows, error}]
+    worker: Optional[str] = None
+    heartbeat_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+# ----------------------------
+# amount_paise is never left NULL (a NULL silently drops out of every paise sum)
+# ----------------------------
+@event.listens_for(Transaction, "before_insert")
+@event.listens_for(Transaction, "before_update")
+@event.listens_for(Payment, "before_insert")
+@event.listens_for(Payment, "before_update")
+def _derive_amount_paise(mapper, connection, target):
+    if target.amount_paise is None and target.amount is not None:
+        from app.money import to_paise
+        target.amount_paise = to_paise(target.amount)
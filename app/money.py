@@ -0,0 +1,34 @@
+# app/money.py
+"""
+Money as integer paise.
+
+Amounts are stored, hashed and summed as whole paise (`amount_paise`), so
+SQL SUM and the NumPy report engine add integers and dedup compares exact
+values. The float `amount` column is still written alongside for older
+readers and for display.
+"""
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+PAISE = 100
+
+
+def to_paise(value) -> int:
+    """Parse an amount in rupees (int, float, Decimal or text like "₹1,234.50") into paise."""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value * PAISE
+    if isinstance(value, str):
+        value = value.replace("₹", "").replace(",", "").strip() or "0"
+    try:
+        # str() first: Decimal(0.1) would carry the float's binary error into the rounding
+        rupees = Decimal(str(value)) if not isinstance(value, Decimal) else value
+        return int((rupees * PAISE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+    except InvalidOperation:
+        raise ValueError(f"not an amount: {value!r}")
+
+
+def rupees(paise) -> float:
+    """Paise back to a float for JSON responses (exact to the paisa for any realistic total)."""
+    return int(paise) / PAISE
@@ -0,0 +1,107 @@
+# app/parse_cache.py
+"""
+Parsed-statement cache.
+
+The same statement is often uploaded again (after a failed or confusing
+import), and pdfplumber extraction is by far the slowest part of an import.
+Parsed records are kept on local disk keyed by the file's SHA-256, one
+gzipped JSON file per statement under GPAY_PARSE_CACHE_DIR (default
+./parse_cache). A repeat upload skips parsing and goes straight to dedup and
+insert.
+
+The cache is bounded by GPAY_PARSE_CACHE_MB (default 256): hits refresh a
+file's mtime and the least recently used files are evicted first. Files are
+written atomically, so the cache can be shared by every worker process on
+the host; GPAY_PARSE_CACHE_MB=0 turns it off. Bump CACHE_VERSION when a
+parser changes what it returns.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import uuid
+from app.parsing import sniff
+
+CACHE_DIR = os.environ.get("GPAY_PARSE_CACHE_DIR", "parse_cache")
+MAX_BYTES = int(os.environ.get("GPAY_PARSE_CACHE_MB", "256")) * 1024 * 1024
+CACHE_VERSION = 1
+
+_evict_lock = threading.Lock()
+
+
+def _path(digest: str) -> str:
+    return os.path.join(CACHE_DIR, f"{digest}.v{CACHE_VERSION}.json.gz")
+
+
+def get(digest: str):
+    """(format name, records) for a file digest, or None."""
+    if MAX_BYTES <= 0:
+        return None
+    path = _path(digest)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            entry = json.load(f)
+        os.utime(path)  # LRU: eviction goes by mtime
+    except (FileNotFoundError, EOFError, OSError, ValueError):
+        return None
+    return entry["format"], entry["records"]
+
+
+def put(digest: str, fmt: str, records: list):
+    if MAX_BYTES <= 0 or not records:
+        return
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = os.path.join(CACHE_DIR, f".{uuid.uuid4().hex}.tmp")
+    with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=1) as f:
+        json.dump({"format": fmt, "records": records}, f, separators=(",", ":"))
+    os.replace(tmp, _path(digest))
+    evict()
+
+
+def evict(max_bytes: int | None = None):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    limit = MAX_BYTES if max_bytes is None else max_bytes
+    with _evict_lock:
+        entries = []
+        try:
+            with os.scandir(CACHE_DIR) as it:
+                for e in it:
+                    if e.name.endswith(".json.gz"):
+                        try:
+                            st = e.stat()
+                        except FileNotFoundError:
+                            continue  # evicted by another process meanwhile
+                        entries.append((st.st_mtime, st.st_size, e.path))
+        except FileNotFoundError:
+            return 0
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+    return removed
+
+
+def parse(content: bytes, digest: str | None = None):
+    """
+    Records of a statement file, from the cache when this exact file was
+    parsed before; returns (format name or None, records).
+    """
+    digest = digest or hashlib.sha256(content).hexdigest()
+    cached = get(digest)
+    if cached is not None:
+        return cached
+    fmt = sniff(content)
+    if fmt is None:
+        return None, []
+    records = fmt.parse(content)
+    put(digest, fmt.name, records)
+    return fmt.name, records
@@ -0,0 +1,295 @@
+# app/parsing.py
+"""
+Statement format registry.
+
+Every supported statement layout is a StatementFormat registered in FORMATS.
+sniff() looks at the first few KB of an upload (magic bytes, first
+non-blank character, CSV header) and picks exactly one format, so a big CSV
+never pays for a failed JSON parse and a PDF is never decoded as text.
+Formats return records shaped {"id", "date", "amount", "merchant"} for
+app/importer.py.
+
+CSV formats can also stream: stream() gives a CsvStream that turns bytes
+into records while an upload is still arriving (app/uploads.py).
+
+A new bank export only needs a register() call, e.g.
+
+    register(CsvFormat("mybank_csv", {"txn date", "narration", "debit"}, to_record=_mybank_record))
+"""
+
+import csv
+import io
+import json
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+from app.money import to_paise
+
+SNIFF_BYTES = 8192
+FORMATS = {}  # name -> StatementFormat
+
+
+class StatementFormat(ABC):
+    """How to recognise a statement format from its first bytes and how to read it."""
+
+    name = ""
+    priority = 0  # higher is tried first when several formats match
+    streaming = False
+
+    @abstractmethod
+    def sniff(self, head: bytes, text: str | None) -> bool:
+        ...
+
+    @abstractmethod
+    def parse(self, content: bytes) -> list:
+        ...
+
+
+def register(fmt: StatementFormat) -> StatementFormat:
+    FORMATS[fmt.name] = fmt
+    return fmt
+
+
+def get(name: str | None) -> StatementFormat | None:
+    return FORMATS.get(name) if name else None
+
+
+def _head_text(head: bytes):
+    """The sniffed bytes as text, or None for binary data."""
+    try:
+        text = head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 3:
+            return None  # invalid well before the end: not UTF-8 text
+        text = head[:e.start].decode("utf-8")  # the sample ends inside a multi-byte character
+    return text.lstrip("﻿")
+
+
+def sniff(head: bytes) -> StatementFormat | None:
+    head = head[:SNIFF_BYTES]
+    text = _head_text(head)
+    for fmt in sorted(FORMATS.values(), key=lambda f: -f.priority):
+        if fmt.sniff(head, text):
+            return fmt
+    return None
+
+
+def parse_statement(content: bytes) -> list:
+    """Records from a whole file; [] when no registered format recognises it."""
+    fmt = sniff(content)
+    if fmt is None:
+        print("⚠️ Unrecognised statement format")
+        return []
+    try:
+        return fmt.parse(content)
+    except Exception as e:
+        print(f"⚠️ Could not read {fmt.name} statement: {e}")
+        return []
+
+
+def _parse_date(value: str, formats):
+    value = (value or "").strip()
+    for f in formats:
+        try:
+            return datetime.strptime(value, f)
+        except ValueError:
+            continue
+    return None
+
+
+# ----------------------------
+# JSON
+# ----------------------------
+class JsonFormat(StatementFormat):
+    name = "json"
+
+    def sniff(self, head, text):
+        return text is not None and text.lstrip()[:1] in ("{", "[")
+
+    def parse(self, content):
+        parsed = json.loads(content.decode("utf-8-sig"))
+        if isinstance(parsed, dict) and "transactions" in parsed:
+            return parsed["transactions"]
+        if isinstance(parsed, list):
+            return parsed
+        return []
+
+
+# ----------------------------
+# GPay PDF export
+# ----------------------------
+class GPayPdfFormat(StatementFormat):
+    name = "gpay_pdf"
+
+    def sniff(self, head, text):
+        return head.lstrip()[:5] == b"%PDF-"
+
+    def parse(self, content):
+        import pdfplumber
+        pdf = pdfplumber.open(io.BytesIO(content))
+        text_data = ""
+        for page in pdf.pages:
+            t = page.extract_text()
+            if t:
+                text_data += t + "\n"
+        pdf.close()
+
+        lines = [ln.strip() for ln in text_data.split("\n") if ln.strip()]
+        date_pattern = re.compile(r"(\d{2}\w{3},\d{4})")
+
+        txns = []
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            match = date_pattern.search(line)
+            if match:
+                date_str = match.group(1)
+                try:
+                    date = datetime.strptime(date_str, "%d%b,%Y")
+                except ValueError:
+                    i += 1
+                    continue
+
+                amt_match = re.search(r"₹\s?([0-9,]+)", line)
+                if not amt_match:
+                    i += 1
+                    continue
+
+                amount = to_paise(amt_match.group(1)) / 100
+                desc = line[len(date_str):].strip()
+
+                ref_line = lines[i + 1] if i + 1 < len(lines) else ""
+                ref_match = re.search(r"UPITransactionID[: ]?(\d+)", ref_line)
+                txn_id = ref_match.group(1) if ref_match else ""
+
+                txns.append({
+                    "id": txn_id,
+                    "date": date.isoformat(),
+                    "amount": amount,
+                    "merchant": desc,
+                })
+
+                i += 3
+            else:
+                i += 1
+
+        return txns
+
+
+# ----------------------------
+# CSV
+# ----------------------------
+def complete_prefix(data: bytes) -> int:
+    """Length of the longest prefix of `data` that ends on a CSV record boundary (a newline outside quotes)."""
+    pos = data.rfind(b"\n")
+    while pos >= 0:
+        # inside quotes iff an odd number of '"' precede it (an escaped "" counts twice)
+        if data.count(b'"', 0, pos) % 2 == 0:
+            return pos + 1
+        pos = data.rfind(b"\n", 0, pos)
+    return 0
+
+
+def _header_columns(line: str):
+    return [c.strip().lower() for c in next(csv.reader([line]), [])]
+
+
+class CsvStream:
+    """
+    Incremental CSV parser. feed() takes the bytes that follow what was fed
+    before and returns (records, bytes consumed): only whole records are
+    parsed, the caller keeps the unconsumed tail and feeds it again with the
+    next chunk. The header line is remembered (and can be restored from
+    `header` when an upload resumes in another worker).
+    """
+
+    def __init__(self, header: str | None = None, to_record=None):
+        self.header = header
+        self.to_record = to_record
+
+    def feed(self, data: bytes, final: bool = False):
+        end = len(data) if final else complete_prefix(data)
+        if end == 0:
+            return [], 0
+        text = data[:end].decode("utf-8")
+        if self.header is None:
+            first, _, text = text.partition("\n")
+            self.header = first.lstrip("﻿").rstrip("\r")
+        if not text.strip():
+            return [], end
+        fields = [c.strip().lower() for c in next(csv.reader([self.header]))]
+        rows = csv.DictReader(io.StringIO(text), fieldnames=fields)
+        if self.to_record is None:
+            return list(rows), end
+        return [r for r in map(self.to_record, rows) if r is not None], end
+
+
+class CsvFormat(StatementFormat):
+    """
+    A CSV export recognised by its header. Column names are matched
+    case-insensitively; `to_record(row)` maps one row (keys lower-cased) to a
+    record, or None to skip it (e.g. credits).
+    """
+
+    streaming = True
+
+    def __init__(self, name, required, to_record=None, priority=10):
+        self.name = name
+        self.required = {c.lower() for c in required}
+        self.to_record = to_record
+        self.priority = priority
+
+    def sniff(self, head, text):
+        if text is None or "\n" not in text:
+            return False
+        first = text.split("\n", 1)[0].rstrip("\r")
+        if not first or first.lstrip()[:1] in ("{", "[") or "," not in first:
+            return False
+        return self.required <= set(_header_columns(first))
+
+    def stream(self, header: str | None = None) -> CsvStream:
+        return CsvStream(header, self.to_record)
+
+    def parse(self, content):
+        records, _ = self.stream().feed(content, final=True)
+        return records
+
+
+def _signed_debit(amount: str):
+    """'-1,250.00' -> 1250.0 for money going out; None for credits."""
+    value = (amount or "").replace("₹", "").replace(",", "").replace(" ", "")
+    if not value.startswith("-"):
+        return None
+    return to_paise(value[1:]) / 100
+
+
+def _payee(details: str):
+    return re.sub(r"^(paid to|payment to|sent to)\s+", "", (details or "").strip(), flags=re.I)
+
+
+def _paytm_record(row):
+    amount = _signed_debit(row.get("amount"))
+    dt = _parse_date(f"{row.get('date', '')} {row.get('time', '')}",
+                     ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d-%m-%Y %H:%M:%S", "%d/%m/%Y %I:%M %p"))
+    if amount is None or dt is None:
+        return None
+    return {"id": (row.get("upi ref no.") or "").strip(), "date": dt.isoformat(), "amount": amount,
+            "merchant": _payee(row.get("transaction details"))}
+
+
+def _phonepe_record(row):
+    if (row.get("type") or "").strip().upper() != "DEBIT":
+        return None
+    dt = _parse_date(row.get("date"), ("%b %d, %Y %I:%M %p", "%b %d, %Y", "%d-%m-%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S"))
+    if dt is None:
+        return None
+    return {"id": (row.get("transaction id") or "").strip(), "date": dt.isoformat(),
+            "amount": to_paise(row.get("amount")) / 100, "merchant": _payee(row.get("transaction details"))}
+
+
+# the app's own layout (id,date,amount,merchant) and any other CSV: rows are passed through as they are
+register(CsvFormat("csv", set(), priority=-1))
+register(CsvFormat("paytm_csv", {"date", "time", "transaction details", "amount", "upi ref no."}, _paytm_record))
+register(CsvFormat("phonepe_csv", {"date", "transaction details", "type", "amount"}, _phonepe_record))
+register(JsonFormat())
+register(GPayPdfFormat())
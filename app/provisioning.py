@@ -0,0 +1,203 @@
+# app/provisioning.py
+"""
+Bulk user / family member provisioning.
+
+Onboarding a school or an extended family one /auth/register or
+/family/invite call at a time costs an email lookup, an argon2 hash, a
+commit and a blocking SMTP send per person. provision() takes the whole
+list (CSV or JSON, see parse_members) and:
+
+  - validates every row and drops repeats within the list,
+  - finds the emails that already have an account with one query,
+  - hashes the passwords on a thread pool (argon2 releases the GIL),
+  - inserts every new user in one transaction,
+  - returns the verification invites for one batched send
+    (app/utils/email.send_verification_batch), which the endpoints run as
+    a background task after the response.
+
+Each row gets a result (created / exists / duplicate / invalid), so a bad
+row never sinks the rest. Rows without a password get a generated temporary
+one, returned once in the result; first_login makes the user change it.
+"""
+
+import csv
+import io
+import json
+import os
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from app.db import engine
+from app.models import User
+
+MAX_ROWS = int(os.environ.get("GPAY_PROVISION_MAX_ROWS", "1000"))
+HASH_WORKERS = int(os.environ.get("GPAY_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_email = TypeAdapter(EmailStr)
+
+
+# ----------------------------
+# Input
+# ----------------------------
+def parse_members(body: bytes, content_type: str = "") -> list:
+    """
+    Member rows from a JSON list (or {"members": [...]}) of objects / plain
+    emails, or from CSV text with a header row (email[,role][,password]).
+    """
+    text = body.decode("utf-8-sig", errors="replace").strip()
+    if not text:
+        raise HTTPException(400, "No members given")
+    if "json" in content_type or text[0] in "[{":
+        try:
+            data = json.loads(text)
+        except ValueError:
+            raise HTTPException(400, "Invalid JSON")
+        if isinstance(data, dict):
+            data = data.get("members")
+        if not isinstance(data, list):
+            raise HTTPException(400, "Expected a list of members")
+        rows = [{"email": m} if isinstance(m, str) else m for m in data]
+    else:
+        reader = csv.DictReader(io.StringIO(text))
+        if not reader.fieldnames or "email" not in [f.strip().lower() for f in reader.fieldnames]:
+            raise HTTPException(400, "CSV needs a header row with an email column")
+        rows = [{(k or "").strip().lower(): (v or "").strip() for k, v in r.items()} for r in reader]
+    if len(rows) > MAX_ROWS:
+        raise HTTPException(413, f"At most {MAX_ROWS} members per request")
+    return rows
+
+
+# ----------------------------
+# Placement rules: row -> (role, family_id, parent_id), ValueError when not allowed
+# ----------------------------
+def admin_placement(inviter):
+    """Admins and superadmins: any role, in the inviter's family; children under the inviter."""
+    from app.auth import VALID_ROLES
+
+    def place(role):
+        role = role or "user"
+        if role not in VALID_ROLES:
+            raise ValueError(f"Invalid role: {role}")
+        return role, inviter.family_id, inviter.id if role == "child" else None
+    return place
+
+
+def family_placement(inviter):
+    """Same rules as /family/invite: parents add spouses, parents and spouses add children."""
+    def place(role):
+        if role == "spouse":
+            if inviter.role != "parent":
+                raise ValueError("Only parent can invite spouse.")
+            return role, inviter.family_id, None
+        if role == "child":
+            if inviter.role not in ("parent", "spouse"):
+                raise ValueError("Only parent or spouse can invite child.")
+            return role, inviter.family_id, inviter.id
+        if role == "sibling":
+            if inviter.role != "child" or not inviter.parent_id:
+                raise ValueError("Only child can invite sibling.")
+            return role, inviter.family_id, inviter.parent_id
+        raise ValueError("Invalid role.")
+    return place
+
+
+# ----------------------------
+# Provisioning
+# ----------------------------
+def _hash_all(passwords):
+    from app.auth import hash_password
+
+    if HASH_WORKERS <= 1 or len(passwords) <= 1:
+        return [hash_password(p) for p in passwords]
+    with ThreadPoolExecutor(HASH_WORKERS, thread_name_prefix="argon2") as pool:
+        return list(pool.map(hash_password, passwords))
+
+
+def provision(rows, place, default_role: str | None = None):
+    """
+    Create users for `rows`; returns (results, invites): one result dict per
+    row, in order, and [(email, token)] for the verification emails to send.
+    """
+    from app.auth import generate_token
+
+    results = [{"row": i, "email": None, "status": "invalid"} for i in range(len(rows))]
+    todo, seen = [], set()
+    for i, row in enumerate(rows):
+        res = results[i]
+        if not isinstance(row, dict):
+            res["error"] = "Expected an object with an email"
+            continue
+        try:
+            email = str(_email.validate_python(str(row.get("email") or "").strip()))
+        except ValidationError:
+            res.update(email=row.get("email"), error="Invalid email")
+            continue
+        res["email"] = email
+        try:
+            role, family_id, parent_id = place(row.get("role") or default_role)
+        except ValueError as e:
+            res["error"] = str(e)
+            continue
+        if email.lower() in seen:
+            res.update(status="duplicate", error="Listed more than once")
+            continue
+        seen.add(email.lower())
+        password = str(row["password"]) if row.get("password") else None
+        todo.append({"row": i, "email": email, "role": role, "family_id": family_id, "parent_id": parent_id,
+                     "password": password})
+
+    # one lookup for all emails, then again only if a concurrent signup beats the insert
+    with Session(engine) as session:
+        for _ in range(3):
+            emails = [t["email"] for t in todo]
+            existing = set(session.exec(select(User.email).where(User.email.in_(emails))).all()) if emails else set()
+            for t in todo:
+                if t["email"] in existing:
+                    results[t["row"]].update(status="exists", error="Email already exists")
+            todo = [t for t in todo if t["email"] not in existing]
+            if not todo:
+                return results, []
+
+            fresh = [t for t in todo if "hash" not in t]  # a retry reuses the hashes
+            for t in fresh:
+                if not t["password"]:
+                    t["temporary_password"] = t["password"] = secrets.token_urlsafe(9)
+            for t, h in zip(fresh, _hash_all([t["password"] for t in fresh])):
+                t["hash"] = h
+
+            now = datetime.utcnow()
+            users = []
+            for t in todo:
+                t["token"] = generate_token()
+                users.append(User(email=t["email"], password_hash=t["hash"], role=t["role"],
+                                  family_id=t["family_id"], parent_id=t["parent_id"], first_login=True,
+                                  is_verified=False, verification_token=t["token"], created_at=now,
+                                  verification_expires_at=now + timedelta(days=7)))
+            session.add_all(users)
+            try:
+                session.flush()
+                ids = [u.id for u in users]
+                session.commit()
+            except IntegrityError:
+                session.rollback()
+                continue
+            for t, user_id in zip(todo, ids):
+                res = results[t["row"]]
+                res.update(status="created", user_id=user_id, role=t["role"])
+                if t.get("temporary_password"):
+                    res["temporary_password"] = t["temporary_password"]
+            print(f"👥 Provisioned {len(ids)} users ({len(rows) - len(ids)} rows skipped)")
+            return results, [(t["email"], t["token"]) for t in todo]
+    raise HTTPException(409, "Emails kept colliding with concurrent signups; retry the request")
+
+
+def summarize(results) -> dict:
+    counts = {}
+    for r in results:
+        counts[r["status"]] = counts.get(r["status"], 0) + 1
+    return {"created": counts.get("created", 0), "skipped": len(results) - counts.get("created", 0),
+            "counts": counts, "results": results}
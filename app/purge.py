@@ -0,0 +1,273 @@
+# app/purge.py
+"""
+Set-based, batched deletion of users and families with everything they own.
+
+Deleting through the ORM (session.delete(user) with cascades) loads every
+child row and transaction into memory and deletes them one by one inside a
+single long transaction. purge_users() / purge_family() instead run
+DELETE ... WHERE id IN (SELECT id ... LIMIT n) table by table, one short
+transaction per chunk of GPAY_PURGE_BATCH rows (default 1000), pausing
+GPAY_PURGE_PAUSE_MS between chunks so other writers get the lock. Dependent
+rows go first and the user / family rows last, so an interrupted purge
+leaves a consistent database and finishes when run again.
+
+A Report collects rows per table and the timing of every batch; with
+dry_run=True it only counts what would be deleted.
+
+    python -m app.purge unverified [--dry-run]
+    python -m app.purge user 12 [--dry-run]
+    python -m app.purge family 3 [--dry-run]
+"""
+
+import argparse
+import os
+import time
+from sqlalchemy import and_, delete, func, or_, select as sa_select, update
+from sqlmodel import Session, select
+from app.db import engine
+from app.models import (
+    ArchivePartition, Category, DeletionRequest, Family, ImportJob, MerchantRule, Payment, PaymentAllocation,
+    SharedAggregate, Transaction, TransactionTombstone, UploadSession, User, VerificationResendLog,
+    WeeklyStatement,
+)
+from app import family_sync
+
+BATCH = int(os.environ.get("GPAY_PURGE_BATCH", "1000"))
+PAUSE_S = float(os.environ.get("GPAY_PURGE_PAUSE_MS", "20")) / 1000
+USER_BATCH = 200  # users handled per round of table deletes
+
+
+class Report:
+    """Rows deleted (or, dry run, to delete) per table, and how long each batch took."""
+
+    def __init__(self, dry_run: bool = False, progress=None, verbose: bool = False):
+        self.dry_run = dry_run
+        self.progress = progress  # called with the report after every batch
+        self.verbose = verbose
+        self.tables = {}
+        self.batches = []
+
+    def add(self, table: str, rows: int, ms: float):
+        self.tables[table] = self.tables.get(table, 0) + rows
+        self.batches.append({"table": table, "rows": rows, "ms": round(ms, 1)})
+        if self.verbose:
+            print(f"   {table:<28} {rows:>7} rows {ms:>8.1f} ms")
+        if self.progress:
+            self.progress(self)
+
+    def summary(self) -> dict:
+        times = [b["ms"] for b in self.batches if b["rows"]]
+        return {
+            "dry_run": self.dry_run,
+            "deleted": {t: n for t, n in self.tables.items() if n},
+            "batches": len(times),
+            "total_ms": round(sum(times), 1),
+            "slowest_batch_ms": max(times, default=0),
+        }
+
+
+# ----------------------------
+# Chunked deletes
+# ----------------------------
+def _count(table, where) -> int:
+    with Session(engine) as session:
+        return session.execute(sa_select(func.count()).select_from(table).where(where)).scalar() or 0
+
+
+def _chunked(report: Report, table, where, before=None, after=None) -> int:
+    """
+    Delete rows of `table` matching `where`, BATCH rows per transaction.
+    before(session, ids) runs before a chunk is deleted (the ids are then read
+    first); after(session, n) runs after it, both in the chunk's transaction.
+    """
+    if report.dry_run:
+        n = _count(table, where)
+        report.add(table.name, n, 0)
+        return n
+    total = 0
+    while True:
+        t0 = time.perf_counter()
+        with Session(engine) as session:
+            chunk = sa_select(table.c.id).where(where).order_by(table.c.id).limit(BATCH)
+            if before is not None:
+                ids = session.execute(chunk).scalars().all()
+                if ids:
+                    before(session, ids)
+                target = table.c.id.in_(ids)
+            else:
+                target = table.c.id.in_(chunk.scalar_subquery())
+            n = session.execute(delete(table).where(target).execution_options(synchronize_session=False)).rowcount
+            if n and after is not None:
+                after(session, n)
+            session.commit()
+        if not n:
+            return total
+        total += n
+        report.add(table.name, n, (time.perf_counter() - t0) * 1000)
+        if n < BATCH:
+            return total
+        time.sleep(PAUSE_S)
+
+
+def _once(report: Report, table, where) -> int:
+    """Single-statement delete for small per-user tables (no id column, a few rows per user)."""
+    if report.dry_run:
+        n = _count(table, where)
+    else:
+        t0 = time.perf_counter()
+        with Session(engine) as session:
+            n = session.execute(delete(table).where(where)).rowcount
+            session.commit()
+    report.add(table.name, n, 0 if report.dry_run else (time.perf_counter() - t0) * 1000)
+    return n
+
+
+def _with_descendants(session, user_ids) -> list:
+    """The users plus their children, grandchildren, ... (User.parent_id), deepest first."""
+    found, levels, frontier = set(user_ids), [sorted(set(user_ids))], set(user_ids)
+    while frontier:
+        frontier = set(session.exec(select(User.id).where(User.parent_id.in_(list(frontier)))).all()) - found
+        found |= frontier
+        levels.append(sorted(frontier))
+    return [uid for level in reversed(levels) for uid in level]
+
+
+def _remove_files(paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+# ----------------------------
+# Users
+# ----------------------------
+def _purge_user_batch(report: Report, ids, keep_feed: bool):
+    from app import archive, jobs, uploads
+
+    txn = Transaction.__table__
+    payments = sa_select(Payment.id).where(or_(Payment.payer_id.in_(ids), Payment.payee_id.in_(ids)))
+    _chunked(report, PaymentAllocation.__table__, PaymentAllocation.payment_id.in_(payments))
+    _chunked(report, Payment.__table__, or_(Payment.payer_id.in_(ids), Payment.payee_id.in_(ids)))
+
+    def tombstone_shared(session, txn_ids):
+        # the family stays: other members' synced copies must learn the rows are gone
+        shared = session.execute(
+            sa_select(txn.c.family_id, txn.c.id).where(txn.c.id.in_(txn_ids), txn.c.shared == True)
+        ).all()
+        by_family = {}
+        for family_id, tid in shared:
+            by_family.setdefault(family_id, []).append(tid)
+        for family_id, tids in by_family.items():
+            family_sync.tombstone(session, family_id, tids)
+
+    _chunked(report, txn, txn.c.user_id.in_(ids), before=tombstone_shared if keep_feed else None)
+    for month in archive.partitions(refresh=True):
+        part = archive.archive_table(month)
+
+        def recount(session, n, month=month):
+            session.execute(update(ArchivePartition).where(ArchivePartition.month == month)
+                            .values(rows=ArchivePartition.rows - n))
+        _chunked(report, part, part.c.user_id.in_(ids), after=recount)
+
+    _once(report, SharedAggregate.__table__, SharedAggregate.user_id.in_(ids))
+    _once(report, WeeklyStatement.__table__, WeeklyStatement.user_id.in_(ids))
+
+    with Session(engine) as session:
+        upload_ids = session.exec(select(UploadSession.id).where(UploadSession.user_id.in_(ids))).all()
+        job_ids = session.exec(select(ImportJob.id).where(ImportJob.user_id.in_(ids))).all()
+    _once(report, UploadSession.__table__, UploadSession.user_id.in_(ids))
+    _once(report, ImportJob.__table__, ImportJob.user_id.in_(ids))
+    if not report.dry_run:
+        _remove_files([uploads.spool_path(u) for u in upload_ids] + [jobs.job_path(j) for j in job_ids])
+
+    emails = sa_select(User.email).where(User.id.in_(ids))
+    _once(report, VerificationResendLog.__table__, VerificationResendLog.email.in_(emails))
+    _once(report, DeletionRequest.__table__, DeletionRequest.requested_by_id.in_(ids))
+    _chunked(report, User.__table__, User.id.in_(ids))
+
+
+def purge_users(user_ids, report: Report | None = None, keep_feed: bool = True,
+                descendants: bool = True) -> Report:
+    """
+    Delete users, their descendants (children of children, ...) and all their
+    rows. keep_feed: tombstone their shared rows for the rest of the family.
+    descendants=False deletes only the given users; their children stay and
+    lose their parent link.
+    """
+    from app.analytics import snapshot
+
+    report = report or Report()
+    with Session(engine) as session:
+        ids = _with_descendants(session, list(user_ids)) if descendants else sorted(set(user_ids))
+        families = set(session.exec(select(User.family_id).where(User.id.in_(ids), User.family_id != None)).all())
+        if not descendants and ids and not report.dry_run:
+            session.execute(update(User).where(User.parent_id.in_(ids), User.id.not_in(ids)).values(parent_id=None))
+            session.commit()
+    for i in range(0, len(ids), USER_BATCH):
+        _purge_user_batch(report, ids[i:i + USER_BATCH], keep_feed)
+    if keep_feed and not report.dry_run:
+        for family_id in families:
+            snapshot.mark_dirty(family_id, removed=True)
+    return report
+
+
+# ----------------------------
+# Families
+# ----------------------------
+def purge_family(family_id: int, report: Report | None = None) -> Report:
+    """Delete a family, every member (and their descendants) and all family rows."""
+    from app import archive
+
+    report = report or Report()
+    with Session(engine) as session:
+        member_ids = session.exec(select(User.id).where(User.family_id == family_id)).all()
+    purge_users(member_ids, report, keep_feed=False)
+
+    # rows filed under the family by users who have since moved elsewhere (members' rows are gone
+    # already; excluding them keeps dry-run counts honest)
+    members = sa_select(User.id).where(User.family_id == family_id)
+    txn = Transaction.__table__
+    _chunked(report, txn, and_(txn.c.family_id == family_id, txn.c.user_id.not_in(members)))
+    for month in archive.partitions(refresh=True):
+        part = archive.archive_table(month)
+
+        def recount(session, n, month=month):
+            session.execute(update(ArchivePartition).where(ArchivePartition.month == month)
+                            .values(rows=ArchivePartition.rows - n))
+        _chunked(report, part, and_(part.c.family_id == family_id, part.c.user_id.not_in(members)), after=recount)
+
+    categories = sa_select(Category.id).where(Category.family_id == family_id)
+    _once(report, MerchantRule.__table__, MerchantRule.category_id.in_(categories))
+    _once(report, Category.__table__, Category.family_id == family_id)
+    _chunked(report, TransactionTombstone.__table__, TransactionTombstone.family_id == family_id)
+    _once(report, WeeklyStatement.__table__,
+          and_(WeeklyStatement.family_id == family_id, WeeklyStatement.user_id.not_in(members)))
+    _once(report, Family.__table__, Family.id == family_id)
+    return report
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Delete users / families in batches")
+    p.add_argument("what", choices=["unverified", "user", "family"])
+    p.add_argument("id", type=int, nargs="?")
+    p.add_argument("--dry-run", action="store_true")
+    args = p.parse_args(argv)
+    if args.what == "unverified":
+        from app.auth import cleanup_unverified_accounts
+        print(cleanup_unverified_accounts(dry_run=args.dry_run, verbose=True))
+        return 0
+    if args.id is None:
+        p.error(f"{args.what} needs an id")
+    report = Report(args.dry_run, verbose=True)
+    if args.what == "user":
+        purge_users([args.id], report)
+    else:
+        purge_family(args.id, report)
+    print(report.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+# app/ratelimit.py
+"""
+In-memory sliding-window rate limits for the auth endpoints.
+
+Each Limit keeps, per key (an email, a client address), the times of the
+last `max` hits in a deque, so "at most N per window" is exact and costs no
+query: abuse traffic is refused from memory before the database is touched.
+Keys are held in an LRU bounded by GPAY_RATELIMIT_KEYS (default 100000) and
+swept once their newest hit has left the window.
+
+Limits are "count/seconds" strings, overridable per limit through the
+environment (GPAY_RATE_LOGIN_IP=30/300, ...). The verification-resend limit
+is persisted: every send is logged in verificationresendlog, and a key seen
+for the first time by this process is seeded from the log (one indexed
+lookup), so restarts do not reset it. prune() drops log rows older than
+GPAY_RESEND_LOG_DAYS (default 2) and swept keys; it runs on the scheduler.
+
+Counters are per process; behind several workers the effective limit is up
+to N per worker, except for the persisted ones.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException, Request
+from sqlalchemy import delete, select as sa_select
+from sqlmodel import Session
+from app.db import engine
+from app.models import VerificationResendLog
+
+MAX_KEYS = int(os.environ.get("GPAY_RATELIMIT_KEYS", "100000"))
+ENABLED = os.environ.get("GPAY_RATELIMIT", "1") != "0"
+RESEND_LOG_DAYS = float(os.environ.get("GPAY_RESEND_LOG_DAYS", "2"))
+PRUNE_INTERVAL_S = 3600
+
+
+def _parse(spec: str):
+    count, _, seconds = spec.partition("/")
+    return int(count), float(seconds)
+
+
+class Limit:
+    """At most `max` hits per `window` seconds per key."""
+
+    def __init__(self, name: str, default: str, message: str, load=None):
+        self.name = name
+        self.max, self.window = _parse(os.environ.get(f"GPAY_RATE_{name.upper()}", default))
+        self.message = message
+        self.load = load  # load(key, since) -> hit times (epoch seconds) already recorded elsewhere
+        self._keys = OrderedDict()  # key -> deque of hit times, least recently used first
+        self._lock = threading.Lock()
+
+    def _hits(self, key, now):
+        hits = self._keys.get(key)
+        if hits is None:
+            hits = deque(maxlen=self.max)
+            if self.load is not None:
+                hits.extend(sorted(self.load(key, now - self.window))[-self.max:])
+            self._keys[key] = hits
+            while len(self._keys) > MAX_KEYS:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key)
+        return hits
+
+    def retry_after(self, key) -> float:
+        """Seconds until `key` may hit again (0: allowed now)."""
+        if not ENABLED or self.max <= 0:
+            return 0
+        now = time.time()
+        with self._lock:
+            hits = self._hits(key, now)
+            if len(hits) < self.max or hits[0] <= now - self.window:
+                return 0
+            return hits[0] + self.window - now
+
+    def check(self, key):
+        """Raise 429 if `key` is out of hits, without using one."""
+        wait = self.retry_after(key)
+        if wait > 0:
+            raise HTTPException(status_code=429, detail=self.message,
+                                headers={"Retry-After": str(int(wait) + 1)})
+
+    def add(self, key):
+        if ENABLED:
+            now = time.time()
+            with self._lock:
+                self._hits(key, now).append(now)
+
+    def hit(self, key):
+        """check() then add(): use one hit or raise 429."""
+        self.check(key)
+        self.add(key)
+
+    def reset(self, key):
+        with self._lock:
+            self._keys.pop(key, None)
+
+    def sweep(self) -> int:
+        """Forget keys whose newest hit has left the window."""
+        cutoff = time.time() - self.window
+        with self._lock:
+            idle = [k for k, hits in self._keys.items() if not hits or hits[-1] <= cutoff]
+            for k in idle:
+                del self._keys[k]
+        return len(idle)
+
+
+def client_ip(request: Request) -> str:
+    return request.client.host if request.client else "unknown"
+
+
+# ----------------------------
+# Verification resends (persisted)
+# ----------------------------
+def _resend_log(email, since):
+    since = datetime.fromtimestamp(since, timezone.utc).replace(tzinfo=None)  # the log holds naive UTC
+    with Session(engine) as session:
+        return [dt.replace(tzinfo=timezone.utc).timestamp() for dt in session.execute(
+            sa_select(VerificationResendLog.created_at)
+            .where(VerificationResendLog.email == email, VerificationResendLog.created_at >= since)
+        ).scalars().all()]
+
+
+def log_resend(session, email: str):
+    """Record a sent verification email in the caller's transaction."""
+    session.add(VerificationResendLog(email=email, created_at=datetime.utcnow()))
+
+
+# ----------------------------
+# Limits
+# ----------------------------
+RESEND_EMAIL = Limit("resend_email", "7/86400", "Too many resend attempts for today. Try tomorrow.",
+                     load=_resend_log)
+RESEND_IP = Limit("resend_ip", "30/3600", "Too many resend attempts. Try again later.")
+LOGIN_IP = Limit("login_ip", "30/300", "Too many login attempts. Try again later.")
+LOGIN_EMAIL = Limit("login_email", "10/900", "Too many failed logins for this account. Try again later.")
+SIGNUP_IP = Limit("signup_ip", "10/3600", "Too many signups from this address. Try again later.")
+
+LIMITS = (RESEND_EMAIL, RESEND_IP, LOGIN_IP, LOGIN_EMAIL, SIGNUP_IP)
+
+
+def prune():
+    """Scheduled job: expire old resend log rows and idle in-memory keys."""
+    cutoff = datetime.utcnow() - timedelta(days=RESEND_LOG_DAYS)
+    with Session(engine) as session:
+        rows = session.execute(delete(VerificationResendLog).where(VerificationResendLog.created_at < cutoff)).rowcount
+        session.commit()
+    keys = sum(limit.sweep() for limit in LIMITS)
+    if rows:
+        print(f"🧹 Expired {rows} verification resend log rows")
+    return {"log_rows": rows, "keys": keys}
@@ -0,0 +1,56 @@
+# app/scheduler.py
+"""
+Tiny in-process scheduler for maintenance jobs (archiving, cleanups, ...).
+
+Jobs are plain sync functions; they run in a worker thread so they never
+block the event loop. Started and stopped from the app lifespan.
+
+    scheduler.every("archive", 3600, archive.archive_paid)
+"""
+
+import asyncio
+import time
+import traceback
+
+JOBS = {}      # name -> (interval seconds, fn)
+_tasks = []
+last_runs = {}  # name -> {"at", "ms", "result" | "error"}
+
+
+def every(name: str, seconds: float, fn):
+    """Register `fn` to run every `seconds`. A non-positive interval disables the job."""
+    if seconds and seconds > 0:
+        JOBS[name] = (seconds, fn)
+
+
+async def _run_forever(name, interval, fn):
+    while True:
+        await asyncio.sleep(interval)
+        t0 = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(fn)
+            last_runs[name] = {"at": time.time(), "ms": round((time.perf_counter() - t0) * 1000, 1),
+                               "result": result}
+        except Exception as e:
+            traceback.print_exc()
+            last_runs[name] = {"at": time.time(), "error": str(e)}
+
+
+def start():
+    loop = asyncio.get_running_loop()
+    for name, (interval, fn) in JOBS.items():
+        _tasks.append(loop.create_task(_run_forever(name, interval, fn), name=f"job:{name}"))
+    if JOBS:
+        print("⏱️ Scheduled jobs: " + ", ".join(f"{n} every {i:g}s" for n, (i, _) in JOBS.items()))
+
+
+async def stop():
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+
+def status():
+    return {name: {"interval_s": interval, "last_run": last_runs.get(name)}
+            for name, (interval, _) in JOBS.items()}
@@ -0,0 +1,242 @@
+# app/settlement.py
+"""
+Weekly settlement: frozen pay statements per ISO week.
+
+Once an ISO week (Monday to Sunday) is over, close_weeks() settles every
+transaction dated in it into WeeklyStatement, one row per user and week
+(count, total, shared total and unpaid total in paise, plus the family),
+and stamps the transactions' week_paid with the week ("2026-W42"). Past
+weeks are then read from the statements; only the rows whose week_paid is
+still NULL -- the open week, and anything imported late for a closed week --
+are summed from the transactions (through ix_transaction_week_user).
+
+Late imports are added to their week's statement on the next run. Totals
+are frozen, the unpaid amount is not: paying or deleting a settled
+transaction adjusts its statement inside the writer's transaction (paid(),
+removed()), so a statement always says what is still owed for that week.
+The archiver only moves settled rows, so archived history stays covered.
+
+    python -m app.settlement              # close every finished week now
+    python -m app.settlement --check      # compare statements with the transactions
+"""
+
+import argparse
+import os
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import case, func, update, select as sa_select
+from sqlmodel import Session, select
+from app.db import engine, upsert_add
+from app.models import Transaction, WeeklyStatement
+from app import family_sync
+
+SETTLE_INTERVAL_S = float(os.environ.get("GPAY_SETTLEMENT_INTERVAL_S", "3600"))
+
+TOTALS = ("count", "paise", "shared_paise", "unpaid_paise")
+
+
+def week_of(dt) -> str:
+    year, week, _ = dt.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def week_start(d) -> date:
+    d = d.date() if isinstance(d, datetime) else d
+    return d - timedelta(days=d.weekday())
+
+
+def _now():
+    return datetime.utcnow()  # transaction dates are naive, like summary()'s window
+
+
+# ----------------------------
+# Closing
+# ----------------------------
+def _close_batch(session, table, cutoff, batch_size):
+    """Settle one batch of unsettled rows dated before `cutoff`; returns the rows settled (0: none left)."""
+    rows = session.execute(
+        sa_select(table.c.id, table.c.user_id, table.c.family_id, table.c.date, table.c.amount_paise,
+               table.c.shared, table.c.paid)
+        .where(table.c.week_paid == None, table.c.date < cutoff)
+        .order_by(table.c.id)
+        .limit(batch_size)
+    ).all()
+    if not rows:
+        return 0
+
+    groups = defaultdict(list)  # (week, paid) -> ids
+    totals = {}
+    for r in rows:
+        week = week_of(r.date)
+        groups[(week, r.paid)].append(r.id)
+        s = totals.setdefault((r.user_id, week), {
+            "user_id": r.user_id, "week": week, "family_id": r.family_id, "week_start": week_start(r.date),
+            "count": 0, "paise": 0, "shared_paise": 0, "unpaid_paise": 0, "closed_at": _now(),
+        })
+        paise = r.amount_paise or 0
+        s["count"] += 1
+        s["paise"] += paise
+        s["shared_paise"] += paise if r.shared else 0
+        s["unpaid_paise"] += 0 if r.paid else paise
+
+    # the paid flag is part of the condition: a row paid, deleted or settled since we read it fails the batch
+    for (week, paid), ids in groups.items():
+        stamped = session.execute(
+            update(table)
+            .where(table.c.id.in_(ids), table.c.week_paid == None, table.c.paid == paid)
+            .values(week_paid=week)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if stamped != len(ids):
+            session.rollback()
+            return -1
+    upsert_add(session, WeeklyStatement, list(totals.values()), keys=("user_id", "week"), add=TOTALS,
+               replace=("family_id",))
+    if table is Transaction.__table__:
+        family_sync.touch_many(session, rows)  # week_paid is part of the family feed
+    session.commit()
+    return len(rows)
+
+
+def close_weeks(now: datetime | None = None, tables=None, batch_size: int = 2000):
+    """Settle everything dated before the current week's Monday, one short transaction per batch."""
+    cutoff = datetime.combine(week_start(now or _now()), time.min)
+    closed = 0
+    for table in tables or [Transaction.__table__]:
+        while True:
+            with Session(engine) as session:
+                n = _close_batch(session, table, cutoff, batch_size)
+            if n == 0:
+                break
+            closed += max(n, 0)  # -1: rows changed under us, read the batch again
+    if closed:
+        print(f"🧾 Settled {closed} transactions into weekly statements before {cutoff.date()}")
+    return {"settled": closed, "cutoff": cutoff.isoformat()}
+
+
+# ----------------------------
+# Write side (call inside the writer's transaction, before commit)
+# ----------------------------
+def _adjust(session, deltas):
+    """deltas: {(user_id, week): {column: delta}} applied to existing statements."""
+    for (user_id, week), d in deltas.items():
+        session.execute(
+            update(WeeklyStatement)
+            .where(WeeklyStatement.user_id == user_id, WeeklyStatement.week == week)
+            .values({c: getattr(WeeklyStatement, c) + v for c, v in d.items()})
+        )
+
+
+def paid(session, txns):
+    """Transactions that just went from unpaid to paid; only settled ones are in a statement."""
+    deltas = defaultdict(lambda: {"unpaid_paise": 0})
+    for t in txns:
+        if t.week_paid:
+            deltas[(t.user_id, t.week_paid)]["unpaid_paise"] -= t.amount_paise or 0
+    _adjust(session, deltas)
+
+
+def removed(session, txns):
+    """Transactions deleted outright (archived ones stay in their statement)."""
+    deltas = defaultdict(lambda: dict.fromkeys(TOTALS, 0))
+    for t in txns:
+        if not t.week_paid:
+            continue
+        paise = t.amount_paise or 0
+        d = deltas[(t.user_id, t.week_paid)]
+        d["count"] -= 1
+        d["paise"] -= paise
+        d["shared_paise"] -= paise if t.shared else 0
+        d["unpaid_paise"] -= 0 if t.paid else paise
+    _adjust(session, deltas)
+
+
+# ----------------------------
+# Read side
+# ----------------------------
+def statements(session, weeks: int = 8, user_id: int | None = None, family_id: int | None = None,
+               now: datetime | None = None):
+    """
+    The last `weeks` ISO weeks for one user or a whole family, newest first:
+    [{"week", "start", "closed", "users": {user_id: {count, paise, shared_paise, unpaid_paise}}}].
+    Closed weeks come from the statements plus any late rows not settled yet.
+    """
+    current = week_start(now or _now())
+    first = current - timedelta(weeks=max(weeks, 1) - 1)
+    out = {}
+    for i in range(max(weeks, 1)):
+        start = first + timedelta(weeks=i)
+        out[week_of(start)] = {"week": week_of(start), "start": start, "closed": start < current, "users": {}}
+
+    def node(week, start, uid):
+        w = out.setdefault(week, {"week": week, "start": start, "closed": start < current, "users": {}})
+        return w["users"].setdefault(uid, dict.fromkeys(TOTALS, 0))
+
+    q = select(WeeklyStatement).where(WeeklyStatement.week >= week_of(first))
+    if user_id is not None:
+        q = q.where(WeeklyStatement.user_id == user_id)
+    if family_id is not None:
+        q = q.where(WeeklyStatement.family_id == family_id)
+    for s in session.exec(q).all():
+        n = node(s.week, s.week_start, s.user_id)
+        for c in TOTALS:
+            n[c] += getattr(s, c)
+
+    # live part: whatever close_weeks() has not settled yet
+    q = select(Transaction.user_id, Transaction.date, Transaction.amount_paise, Transaction.shared,
+               Transaction.paid).where(Transaction.week_paid == None,
+                                       Transaction.date >= datetime.combine(first, time.min))
+    if user_id is not None:
+        q = q.where(Transaction.user_id == user_id)
+    if family_id is not None:
+        q = q.where(Transaction.family_id == family_id)
+    for uid, dt, paise, shared, is_paid in session.exec(q).all():
+        n = node(week_of(dt), week_start(dt), uid)
+        paise = paise or 0
+        n["count"] += 1
+        n["paise"] += paise
+        n["shared_paise"] += paise if shared else 0
+        n["unpaid_paise"] += 0 if is_paid else paise
+
+    return sorted(out.values(), key=lambda w: w["week"], reverse=True)
+
+
+# ----------------------------
+# Maintenance
+# ----------------------------
+def check():
+    """Statements that differ from their settled transactions (hot and archived), as {(user_id, week): (stored, actual)}."""
+    from app.archive import unified_transactions
+
+    txn = unified_transactions()
+    with Session(engine) as session:
+        actual = {
+            (u, w): (c, p or 0, sp or 0, up or 0)
+            for u, w, c, p, sp, up in session.execute(
+                sa_select(txn.c.user_id, txn.c.week_paid, func.count(), func.sum(txn.c.amount_paise),
+                       func.sum(case((txn.c.shared == True, txn.c.amount_paise), else_=0)),
+                       func.sum(case((txn.c.paid == False, txn.c.amount_paise), else_=0)))
+                .where(txn.c.week_paid != None)
+                .group_by(txn.c.user_id, txn.c.week_paid)
+            ).all()
+        }
+        stored = {(s.user_id, s.week): tuple(getattr(s, c) for c in TOTALS)
+                  for s in session.exec(select(WeeklyStatement)).all()}
+    zero = (0, 0, 0, 0)
+    return {k: (stored.get(k, zero), actual.get(k, zero))
+            for k in set(actual) | set(stored) if stored.get(k, zero) != actual.get(k, zero)}
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Close finished weeks into pay statements")
+    p.add_argument("--check", action="store_true", help="only compare statements with the transactions")
+    args = p.parse_args(argv)
+    if not args.check:
+        print(close_weeks())
+    diff = check()
+    print("Statements match the transactions" if not diff else f"{len(diff)} statements differ: {diff}")
+    return 1 if diff else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
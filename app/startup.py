@@ -0,0 +1,122 @@
+# app/startup.py
+"""
+Explicit startup pipeline, run once from the app lifespan instead of at import time.
+
+Each phase is timed and the report is printed and kept on app.state so it can
+be read back from /api/admin/diagnostics/startup.
+
+    schema      create_all, skipped when the stored schema fingerprint matches the models
+    migrations  pending app/migrations (set GPAY_AUTO_MIGRATE=0 to leave it to `python -m app.migrate`)
+    bootstrap   default superadmin, once per deployment (not once per worker)
+    assets      read, hash and precompress static/ (app/assets.py)
+
+Set GPAY_DEPLOYMENT_ID (falls back to RENDER_GIT_COMMIT) so a new deploy re-runs bootstrap.
+"""
+
+import os
+import time
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlmodel import Session, select
+from app.db import engine, init_db, schema_fingerprint
+from app.meta import get_meta, set_meta, claim_meta, release_meta
+from app.models import User
+
+PHASES = []
+
+
+def phase(name):
+    def register(fn):
+        PHASES.append((name, fn))
+        return fn
+    return register
+
+
+def deployment_id():
+    return os.environ.get("GPAY_DEPLOYMENT_ID") or os.environ.get("RENDER_GIT_COMMIT") or "local"
+
+
+# ----------------------------
+# Phases
+# ----------------------------
+@phase("schema")
+def ensure_schema():
+    fingerprint = schema_fingerprint()
+    try:
+        current = get_meta("schema_version")
+    except (OperationalError, ProgrammingError):
+        current = None  # fresh database, app_meta does not exist yet
+    if current == fingerprint:
+        return f"up to date ({fingerprint}), create_all skipped"
+    init_db()
+    set_meta("schema_version", fingerprint)
+    return f"create_all ran, marker {current or '-'} → {fingerprint}"
+
+
+@phase("migrations")
+def apply_migrations():
+    from app import migrations
+    if os.environ.get("GPAY_AUTO_MIGRATE", "1") != "1":
+        waiting = [f"{v:04d}" for v, _, _ in migrations.pending()]
+        return f"auto-migrate off, pending: {', '.join(waiting) or 'none'}"
+    applied = migrations.upgrade()
+    return f"applied {', '.join(f'{v:04d}' for v in applied)}" if applied else "none pending"
+
+
+@phase("bootstrap")
+def ensure_default_superadmin():
+    key = f"bootstrap:{deployment_id()}"
+    if not claim_meta(key, str(os.getpid())):
+        return f"already done for deployment '{deployment_id()}'"
+    try:
+        return _create_default_superadmin()
+    except Exception:
+        release_meta(key)  # a failed bootstrap must run again on the next start
+        raise
+
+
+def _create_default_superadmin():
+    with Session(engine) as session:
+        superadmin_exists = session.exec(select(User).where(User.role == "superadmin")).first()
+        if superadmin_exists:
+            return "superadmin already exists"
+
+        from app.auth import hash_password
+        superadmin = User(
+            email="superadmin@example.com",
+            password_hash=hash_password("superadmin123"),
+            role="superadmin",
+            first_login=True
+        )
+        session.add(superadmin)
+        session.commit()
+    print("✅ Default superadmin created: superadmin@example.com / superadmin123")
+    return "default superadmin created"
+
+
+@phase("assets")
+def build_assets():
+    from app.assets import site
+    return site.build()
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+def run_startup(import_started: float | None = None):
+    report = []
+    if import_started is not None:
+        report.append({"phase": "imports", "ms": round((time.perf_counter() - import_started) * 1000, 1),
+                       "note": "app.main import until lifespan start"})
+    for name, fn in PHASES:
+        t0 = time.perf_counter()
+        note = fn()
+        report.append({"phase": name, "ms": round((time.perf_counter() - t0) * 1000, 1), "note": note})
+    print_report(report)
+    return report
+
+
+def print_report(report):
+    print("🚀 Startup:")
+    for r in report:
+        print(f"   {r['phase']:<11} {r['ms']:>8.1f} ms  {r['note'] or ''}")
+    print(f"   {'total':<11} {sum(r['ms'] for r in report):>8.1f} ms")
@@ -0,0 +1,306 @@
+# app/uploads.py
+"""
+Resumable chunked statement uploads.
+
+    POST /api/upload/sessions                  {filename, size, chunk_size?, sha256?}
+    PUT  /api/upload/sessions/{id}/chunks/{n}  raw bytes, X-Chunk-SHA256 header
+    GET  /api/upload/sessions/{id}             progress; next_chunk says where to resume
+    POST /api/upload/sessions/{id}/finalize
+
+Chunks must arrive in order and each is checked against its SHA-256 before
+it is written to GPAY_UPLOAD_SPOOL (default ./spool) and acknowledged. A
+retried chunk that was already stored is acknowledged again, so a client
+whose connection dropped asks for next_chunk and carries on from there.
+
+The first chunk is sniffed against the format registry (app/parsing.py).
+Streaming formats (the CSV exports) are parsed while they arrive: after
+every chunk the complete records received so far are imported, and only the
+tail of the file is left for finalize. JSON and PDF need the whole file:
+finalize hands it to a background import job (app/jobs.py) and returns its
+job_id.
+The spool lives on local disk, so all chunks of one upload must reach the
+same host.
+"""
+
+import csv
+import hashlib
+import math
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from fastapi import HTTPException
+from sqlalchemy import update
+from sqlmodel import Session, select
+from app.db import engine
+from app.models import UploadSession
+from app.importer import import_records
+from app import parsing
+from app import jobs, events
+
+SPOOL_DIR = os.environ.get("GPAY_UPLOAD_SPOOL", "spool")
+DEFAULT_CHUNK = int(os.environ.get("GPAY_UPLOAD_CHUNK_KB", "1024")) * 1024
+MIN_CHUNK = 64 * 1024
+MAX_CHUNK = 8 * 1024 * 1024
+MAX_SIZE = int(os.environ.get("GPAY_UPLOAD_MAX_MB", "50")) * 1024 * 1024
+UPLOAD_TTL_H = float(os.environ.get("GPAY_UPLOAD_TTL_H", "24"))
+STREAM_WINDOW = 4 * 1024 * 1024
+
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(upload_id):
+    with _locks_guard:
+        return _locks.setdefault(upload_id, threading.Lock())
+
+
+def spool_path(upload_id: str) -> str:
+    return os.path.join(SPOOL_DIR, f"{upload_id}.part")
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _get(session, user, upload_id):
+    up = session.get(UploadSession, upload_id)
+    if not up or up.user_id != user.id:
+        raise HTTPException(404, "Upload not found")
+    return up
+
+
+def describe(up: UploadSession) -> dict:
+    return {
+        "upload_id": up.id,
+        "filename": up.filename,
+        "size": up.size,
+        "chunk_size": up.chunk_size,
+        "total_chunks": up.total_chunks,
+        "received": up.received,
+        "next_chunk": up.received if up.received < up.total_chunks else None,
+        "status": up.status,
+        "streaming": up.stream_format is not None,
+        "imported": up.imported,
+        "duplicates": up.duplicates,
+        "invalid": up.invalid,
+        "job_id": up.job_id,
+    }
+
+
+# ----------------------------
+# Session lifecycle
+# ----------------------------
+def create(user, filename: str, size: int, chunk_size: int | None = None, sha256: str | None = None):
+    if user.family_id is None:
+        raise HTTPException(400, "Join a family before uploading statements")
+    if size <= 0 or size > MAX_SIZE:
+        raise HTTPException(400, f"File size must be between 1 byte and {MAX_SIZE // (1024 * 1024)} MB")
+    chunk_size = chunk_size or DEFAULT_CHUNK
+    if not MIN_CHUNK <= chunk_size <= MAX_CHUNK:
+        raise HTTPException(400, f"chunk_size must be between {MIN_CHUNK} and {MAX_CHUNK} bytes")
+
+    up = UploadSession(
+        id=uuid.uuid4().hex,
+        user_id=user.id,
+        filename=filename or "statement",
+        size=size,
+        chunk_size=chunk_size,
+        total_chunks=math.ceil(size / chunk_size),
+        sha256=sha256.lower() if sha256 else None,
+    )
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    open(spool_path(up.id), "wb").close()
+    with Session(engine) as session:
+        session.add(up)
+        session.commit()
+        session.refresh(up)
+        return describe(up)
+
+
+def status(user, upload_id: str):
+    with Session(engine) as session:
+        return describe(_get(session, user, upload_id))
+
+
+def put_chunk(user, upload_id: str, index: int, data: bytes, checksum: str | None):
+    digest = hashlib.sha256(data).hexdigest()
+    if checksum and checksum.lower() != digest:
+        raise HTTPException(400, "Chunk checksum mismatch")
+
+    with _lock_for(upload_id):
+        with Session(engine) as session:
+            up = _get(session, user, upload_id)
+            if up.status != "open":
+                raise HTTPException(409, "Upload is already finalized")
+            if not 0 <= index < up.total_chunks:
+                raise HTTPException(400, f"Chunk index must be between 0 and {up.total_chunks - 1}")
+            if index < up.received:
+                if up.chunk_hashes[index] == digest:
+                    return describe(up)  # a retry of a chunk we already acknowledged
+                raise HTTPException(409, f"Chunk {index} was already received with different content")
+            if index != up.received:
+                raise HTTPException(409, {"message": "Chunks must be sent in order", "next_chunk": up.received})
+            expected = min(up.chunk_size, up.size - index * up.chunk_size)
+            if len(data) != expected:
+                raise HTTPException(400, f"Chunk {index} must be {expected} bytes, got {len(data)}")
+
+            _write_at(upload_id, index * up.chunk_size, data)
+            values = {"received": index + 1, "chunk_hashes": [*up.chunk_hashes, digest], "updated_at": _now()}
+            if index == 0:
+                fmt = parsing.sniff(data)
+                if fmt is not None and fmt.streaming:
+                    values["stream_format"] = fmt.name
+            # only one request (in any worker) gets to acknowledge chunk `index`
+            acked = session.execute(
+                update(UploadSession)
+                .where(UploadSession.id == upload_id, UploadSession.received == index)
+                .values(**values)
+            ).rowcount
+            session.commit()
+            if not acked:
+                raise HTTPException(409, "Chunk was acknowledged concurrently; check the upload status")
+
+        _stream(user, upload_id)
+        return status(user, upload_id)
+
+
+def finalize(user, upload_id: str):
+    with _lock_for(upload_id):
+        with Session(engine) as session:
+            up = _get(session, user, upload_id)
+            if up.status == "complete":
+                return describe(up)
+            if up.received < up.total_chunks:
+                raise HTTPException(409, {"message": "Upload is incomplete", "next_chunk": up.received})
+            whole_sha, streaming = up.sha256, up.stream_format is not None
+
+        path = spool_path(upload_id)
+        if whole_sha and _file_sha256(path) != whole_sha:
+            raise HTTPException(400, "File checksum mismatch")
+
+        if streaming:
+            _stream(user, upload_id, final=True)
+            with Session(engine) as session:
+                streaming = session.get(UploadSession, upload_id).stream_format is not None
+        job = None
+        if not streaming:  # never was CSV, or streaming gave up part-way: hand the file to an import job
+            job = jobs.enqueue_file(user, path, up.filename, whole_sha or _file_sha256(path))
+
+        with Session(engine) as session:
+            up = _get(session, user, upload_id)
+            if job is None and up.imported + up.duplicates == 0:
+                raise HTTPException(400, "Could not parse file")
+            up.job_id = job["job_id"] if job else None
+            up.status = "complete"
+            up.updated_at = _now()
+            session.add(up)
+            session.commit()
+            session.refresh(up)
+            result = describe(up)
+
+    _remove(path)
+    with _locks_guard:
+        _locks.pop(upload_id, None)
+    if job is None:  # imported while streaming; a job announces itself when it finishes
+        events.publish(events.user_channel(user.id), "upload", result)
+        if result["imported"]:
+            events.publish(events.family_channel(user.family_id), "transactions",
+                           {"user_id": user.id, "imported": result["imported"]})
+    return result
+
+
+# ----------------------------
+# Spool / streaming import
+# ----------------------------
+def _write_at(upload_id, offset, data):
+    with open(spool_path(upload_id), "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate(offset + len(data))
+        f.flush()
+        os.fsync(f.fileno())  # acknowledged means on disk
+
+
+def _file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _add_counts(upload_id, result, **values):
+    with Session(engine) as session:
+        session.execute(
+            update(UploadSession).where(UploadSession.id == upload_id).values(
+                imported=UploadSession.imported + result["imported"],
+                duplicates=UploadSession.duplicates + result["duplicates"],
+                invalid=UploadSession.invalid + result.get("invalid", 0),
+                updated_at=_now(),
+                **values,
+            )
+        )
+        session.commit()
+
+
+def _stream(user, upload_id, final=False):
+    """Import the complete CSV records between parsed_bytes and the end of the acknowledged chunks."""
+    with Session(engine) as session:
+        up = session.get(UploadSession, upload_id)
+        fmt = parsing.get(up.stream_format)
+        if fmt is None or not fmt.streaming:
+            return
+        start, header = up.parsed_bytes, up.csv_header
+        end = min(up.received * up.chunk_size, up.size)
+
+    stream = fmt.stream(header)
+    window = STREAM_WINDOW
+    with open(spool_path(upload_id), "rb") as f:
+        while start < end:
+            f.seek(start)
+            data = f.read(min(window, end - start))
+            last = final and start + len(data) == end
+            try:
+                records, used = stream.feed(data, final=last)
+            except (UnicodeDecodeError, ValueError, csv.Error) as e:
+                # not the CSV it looked like: leave the rest to the whole-file parsers on finalize
+                print(f"⚠️ Upload {upload_id}: streaming parse stopped ({e})")
+                _add_counts(upload_id, {"imported": 0, "duplicates": 0}, stream_format=None)
+                return
+            if used == 0:
+                if start + len(data) < end:
+                    window *= 2  # one record longer than the window
+                    continue
+                break
+            # bad records (an amount like "N/A") are skipped and counted, so the offset always advances
+            result = import_records(user, records) if records else {"imported": 0, "duplicates": 0}
+            start += used
+            _add_counts(upload_id, result, parsed_bytes=start, csv_header=stream.header)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def expire_stale(ttl_hours: float | None = None):
+    """Scheduled job: drop open uploads idle for longer than GPAY_UPLOAD_TTL_H, with their spool files."""
+    ttl = UPLOAD_TTL_H if ttl_hours is None else ttl_hours
+    cutoff = (_now() - timedelta(hours=ttl)).replace(tzinfo=None)
+    with Session(engine) as session:
+        stale = session.exec(
+            select(UploadSession).where(UploadSession.status == "open", UploadSession.updated_at < cutoff)
+        ).all()
+        for up in stale:
+            _remove(spool_path(up.id))
+            session.delete(up)
+        session.commit()
+    with _locks_guard:
+        for up in stale:
+            _locks.pop(up.id, None)
+    if stale:
+        print(f"🧹 Expired {len(stale)} abandoned uploads")
+    return {"expired": len(stale)}
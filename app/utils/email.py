@@ -1,13 +1,59 @@
 # app/utils/email.py
 
+import os
+import smtplib, ssl
+from email.message import EmailMessage
 from sqlmodel import Session
 from app.db import engine
 from app.models import Family
 from app.settings import DEFAULT_SMTP
 
+MAIL_BATCH = int(os.environ.get("GPAY_MAIL_BATCH", "50"))  # messages per SMTP connection
+
 def get_family_smtp(family_id: int) -> dict:
     with Session(engine) as session:
         family = session.get(Family, family_id)
         if family and family.smtp_config:
             return family.smtp_config
         return DEFAULT_SMTP
+
+def verification_message(email: str, token: str, smtp_cfg: dict) -> EmailMessage:
+    msg = EmailMessage()
+    msg["Subject"] = "Verify your FamilyApp account"
+    msg["From"] = smtp_cfg['EMAIL_USER']
+    msg["To"] = email
+    APP_HOST_URL = os.environ.get('APP_HOST_URL', 'http://localhost:8000')
+    verify_url = f"{APP_HOST_URL}/auth/verify?token={token}"
+    msg.set_content(f"Welcome! Please verify your account: {verify_url}")
+    return msg
+
+def send_verification_batch(invites, smtp_cfg: dict) -> dict:
+    """
+    Send verification emails for [(email, token)], MAIL_BATCH messages per SMTP
+    login instead of one connection each. Meant for background tasks: failures
+    are logged and counted, never raised.
+    """
+    sent, failed = 0, []
+    invites = list(invites)
+    for i in range(0, len(invites), MAIL_BATCH):
+        pending = list(invites[i:i + MAIL_BATCH])
+        try:
+            context = ssl.create_default_context()
+            with smtplib.SMTP_SSL(smtp_cfg['EMAIL_HOST'], smtp_cfg['EMAIL_PORT'], context=context) as server:
+                server.login(smtp_cfg['EMAIL_USER'], smtp_cfg['EMAIL_PASS'])
+                while pending:
+                    email, token = pending[0]
+                    try:
+                        server.send_message(verification_message(email, token, smtp_cfg))
+                        sent += 1
+                    except smtplib.SMTPRecipientsRefused as e:
+                        print(f"Email to {email} refused: {e}")
+                        failed.append(email)
+                    pending.pop(0)
+        except Exception as e:
+            # connection or login trouble: what is left of this batch is not sent
+            print(f"Email batch sending failed: {e}")
+            failed.extend(email for email, _ in pending)
+    if failed:
+        print(f"📧 {sent} verification emails sent, {len(failed)} failed")
+    return {"sent": sent, "failed": failed}